@@ -8,17 +8,145 @@ class Settings:
     # AWS credentials
     AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID", "")
     AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY", "")
+    AWS_SESSION_TOKEN = os.getenv("AWS_SESSION_TOKEN", "")
     AWS_DEFAULT_REGION = os.getenv("AWS_DEFAULT_REGION", "us-east-1")
+    # Regions instances may be created in and that inventory sweeps cover (default: AWS_DEFAULT_REGION)
+    AWS_REGIONS = [r for r in os.getenv("AWS_REGIONS", "").split(",") if r] or [AWS_DEFAULT_REGION]
+    # How many regions an inventory sweep describes at once
+    REGION_FANOUT_WORKERS = int(os.getenv("REGION_FANOUT_WORKERS", "8"))
+
+    # Backend selection ("awscli" or "ec2api")
+    DEFAULT_BACKEND = os.getenv("DEFAULT_BACKEND", "awscli")
+    EC2_KEY_NAME = os.getenv("EC2_KEY_NAME", "my_ec2_keypair")
+
+    # In-process EC2 API backend (set EC2_ENDPOINT_URL to target a local stand-in)
+    EC2_ENDPOINT_URL = os.getenv("EC2_ENDPOINT_URL", "")
+    EC2_API_MAX_CONNECTIONS = int(os.getenv("EC2_API_MAX_CONNECTIONS", "20"))
+    EC2_API_TIMEOUT = float(os.getenv("EC2_API_TIMEOUT", "30"))
+
+    # Shared instance waiter: one batched describe for every pending IP or state wait,
+    # polled with per-wait exponential backoff
+    WAITER_INITIAL_INTERVAL = float(os.getenv("WAITER_INITIAL_INTERVAL", "1"))
+    WAITER_MAX_INTERVAL = float(os.getenv("WAITER_MAX_INTERVAL", "15"))
+    WAITER_STATE_TIMEOUT = float(os.getenv("WAITER_STATE_TIMEOUT", "300"))
+    WAITER_IP_TIMEOUT = float(os.getenv("WAITER_IP_TIMEOUT", "60"))
+    WAITER_BATCH_SIZE = int(os.getenv("WAITER_BATCH_SIZE", "200"))
 
     # SMTP email notifications
     SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
     SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
     SMTP_USER = os.getenv("SMTP_USER", "")
     SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
+    SMTP_FROM = os.getenv("SMTP_FROM", "")  # defaults to SMTP_USER
+    SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+    SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+    SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", "60"))
+    SMTP_MAX_RETRIES = int(os.getenv("SMTP_MAX_RETRIES", "5"))
+    SMTP_RETRY_BACKOFF = float(os.getenv("SMTP_RETRY_BACKOFF", "1"))
+    SMTP_RETRY_BACKOFF_MAX = float(os.getenv("SMTP_RETRY_BACKOFF_MAX", "60"))
     NOTIFICATION_EMAIL = os.getenv("NOTIFICATION_EMAIL", "")
+    NOTIFICATION_QUEUE_SIZE = int(os.getenv("NOTIFICATION_QUEUE_SIZE", "1000"))
+    NOTIFICATION_BATCH_SIZE = int(os.getenv("NOTIFICATION_BATCH_SIZE", "100"))
+    NOTIFICATION_FLUSH_TIMEOUT = float(os.getenv("NOTIFICATION_FLUSH_TIMEOUT", "10"))
+    # Merge events from this many seconds into one digest email (0 sends one email per event)
+    NOTIFICATION_DIGEST_SECONDS = float(os.getenv("NOTIFICATION_DIGEST_SECONDS", "0"))
+
+    # AWS CLI script execution
+    AWS_CLI_MAX_CONCURRENCY = int(os.getenv("AWS_CLI_MAX_CONCURRENCY", "8"))
+    AWS_CLI_TIMEOUT = int(os.getenv("AWS_CLI_TIMEOUT", "300"))
+    AWS_CLI_SCRIPT_TIMEOUTS = {
+        "create_instance.sh": int(os.getenv("AWS_CLI_CREATE_TIMEOUT", "180")),
+        "list_instances.sh": int(os.getenv("AWS_CLI_LIST_TIMEOUT", "60")),
+        "start_instance.sh": int(os.getenv("AWS_CLI_START_TIMEOUT", "300")),
+        "stop_instance.sh": int(os.getenv("AWS_CLI_STOP_TIMEOUT", "300")),
+        "destroy_instance.sh": int(os.getenv("AWS_CLI_DESTROY_TIMEOUT", "60")),
+        # Waiter polls retry on their own schedule, so a hung one should give its slot back quickly
+        "describe_instances.sh": int(os.getenv("AWS_CLI_DESCRIBE_TIMEOUT", "20")),
+        # AMI catalog refresh; a failed region keeps its previous entries until the next refresh
+        "describe_images.sh": int(os.getenv("AWS_CLI_DESCRIBE_IMAGES_TIMEOUT", "60")),
+    }
+
+    # EC2 call budgets per action and region: token refill per second and burst size
+    # (a rate of 0 leaves the action unbudgeted). Keep them at or below the account's EC2 API limits.
+    EC2_RATE_LIMITS = {
+        "describe": (float(os.getenv("EC2_DESCRIBE_RATE", "20")), int(os.getenv("EC2_DESCRIBE_BURST", "50"))),
+        "run": (float(os.getenv("EC2_RUN_RATE", "2")), int(os.getenv("EC2_RUN_BURST", "5"))),
+        "start": (float(os.getenv("EC2_START_RATE", "2")), int(os.getenv("EC2_START_BURST", "5"))),
+        "stop": (float(os.getenv("EC2_STOP_RATE", "2")), int(os.getenv("EC2_STOP_BURST", "5"))),
+        "terminate": (float(os.getenv("EC2_TERMINATE_RATE", "5")), int(os.getenv("EC2_TERMINATE_BURST", "10"))),
+    }
+    # Longest a call may queue for its budget before it is rejected with 503
+    EC2_THROTTLE_MAX_WAIT = float(os.getenv("EC2_THROTTLE_MAX_WAIT", "30"))
+    # Retries of calls AWS answers with RequestLimitExceeded, with full-jitter exponential backoff
+    EC2_THROTTLE_RETRIES = int(os.getenv("EC2_THROTTLE_RETRIES", "5"))
+    EC2_THROTTLE_BACKOFF = float(os.getenv("EC2_THROTTLE_BACKOFF", "0.5"))
+    EC2_THROTTLE_BACKOFF_MAX = float(os.getenv("EC2_THROTTLE_BACKOFF_MAX", "20"))
+
+    # Circuit breaker per backend and region: consecutive failures or timeouts that open it,
+    # how long it stays open before probing, and how many probe calls half-open lets through
+    BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+    BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+    BREAKER_HALF_OPEN_TRIALS = int(os.getenv("BREAKER_HALF_OPEN_TRIALS", "1"))
+    # A call cancelled (e.g. by a client disconnect) after running this long counts as a failure
+    BREAKER_HUNG_CALL_SECONDS = float(os.getenv("BREAKER_HUNG_CALL_SECONDS", "60"))
+
+    # GET /instances page size
+    LIST_DEFAULT_LIMIT = int(os.getenv("LIST_DEFAULT_LIMIT", "100"))
+    LIST_MAX_LIMIT = int(os.getenv("LIST_MAX_LIMIT", "1000"))
+    EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "500"))
+
+    # Page size for paginated describe-instances listing
+    LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", "500"))
+
+    # Cache for single-instance describe lookups
+    INSTANCE_CACHE_TTL_SECONDS = float(os.getenv("INSTANCE_CACHE_TTL_SECONDS", "10"))
+    INSTANCE_CACHE_MAX_SIZE = int(os.getenv("INSTANCE_CACHE_MAX_SIZE", "1024"))
+
+    # Asynchronous jobs (?async_mode=true)
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+    JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "1000"))
+
+    # How long POST /instances replays a stored response for an Idempotency-Key
+    IDEMPOTENCY_KEY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "24"))
+
+    # GET /instances/watch: change events kept for resuming, and idle keepalive interval
+    WATCH_BUFFER_SIZE = int(os.getenv("WATCH_BUFFER_SIZE", "10000"))
+    WATCH_KEEPALIVE_SECONDS = float(os.getenv("WATCH_KEEPALIVE_SECONDS", "15"))
+
+    # Background reconciliation of instance state against AWS (0 disables)
+    RECONCILE_INTERVAL_SECONDS = float(os.getenv("RECONCILE_INTERVAL_SECONDS", "60"))
+
+    # How often /metrics probes event-loop lag (0 disables)
+    EVENT_LOOP_LAG_INTERVAL = float(os.getenv("EVENT_LOOP_LAG_INTERVAL", "0.5"))
+
+    # Log the span tree of requests at least this slow (0, the default, turns request tracing off)
+    SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "0"))
+    # Sampling profiler: "off", "header" (requests sending X-Profile: 1) or "all"; any client can send the header
+    PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS", "off")
+    PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_SECONDS", "0.005"))
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "./data/profiles")
 
     # Database
     DATABASE_URL = os.getenv("DATABASE_URL", "./data/instances.db")
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+    DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+    DB_CACHED_STATEMENTS = int(os.getenv("DB_CACHED_STATEMENTS", "256"))
+    DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "8192"))
+    # In-process write-through cache of instance records (0 disables)
+    DB_RECORD_CACHE_SIZE = int(os.getenv("DB_RECORD_CACHE_SIZE", "4096"))
+
+    # Free-tier catalog: a JSON snapshot of eligible instance types and AMIs per region,
+    # seeded from the constants below when the file does not exist yet
+    AMI_CATALOG_FILE = os.getenv("AMI_CATALOG_FILE", "./data/ami_catalog.json")
+    # Background refresh from describe-images (0 disables; needs AWS credentials)
+    AMI_CATALOG_REFRESH_SECONDS = float(os.getenv("AMI_CATALOG_REFRESH_SECONDS", "0"))
+    # Regions to refresh (default: every region in the snapshot)
+    AMI_CATALOG_REGIONS = [r for r in os.getenv("AMI_CATALOG_REGIONS", "").split(",") if r]
+    AMI_CATALOG_OWNERS = os.getenv("AMI_CATALOG_OWNERS", "amazon,099720109477")
+    AMI_CATALOG_NAME_PATTERNS = os.getenv(
+        "AMI_CATALOG_NAME_PATTERNS",
+        "amzn2-ami-hvm-*-gp2,al2023-ami-2023.*,ubuntu/images/hvm-ssd/ubuntu-*-server-*",
+    )
 
     # Free tier constants
     ALLOWED_INSTANCE_TYPES = ["t3.micro", "t4g.micro"]
@@ -48,17 +176,5 @@ class Settings:
         ],
     }
 
-    @classmethod
-    def validate_free_tier(cls, instance_type: str, ami: str, region: str = None) -> bool:
-        """Validate if instance_type and AMI are free tier eligible."""
-        if instance_type not in cls.ALLOWED_INSTANCE_TYPES:
-            return False
-
-        if region is None:
-            region = cls.AWS_DEFAULT_REGION
-
-        allowed_amis = cls.FREE_TIER_AMIS.get(region, [])
-        return ami in allowed_amis
-
 
 settings = Settings()
@@ -1,6 +1,20 @@
 from fastapi import FastAPI
-from app.routers import instances
+from fastapi.responses import PlainTextResponse
+from app.routers import instances, jobs
+from app.services.ami_catalog import ami_catalog
+from app.services.backends import BACKENDS
+from app.services.breaker import CLOSED, HALF_OPEN, OPEN, circuit_breakers
 from app.services.db import db
+from app.services.ec2_api import ec2_api_backend
+from app.services.events import instance_events
+from app.services.idempotency import idempotency_keys
+from app.services.jobs import job_manager
+from app.services.metrics import CONTENT_TYPE, Gauge, MetricsMiddleware, loop_lag_monitor, registry
+from app.services.notifications import notifier
+from app.services.reconciler import reconciler
+from app.services.throttle import aws_scheduler
+from app.services.tracing import TracingMiddleware
+import asyncio
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -11,6 +25,56 @@ app = FastAPI(
     description="FastAPI REST API for provisioning and managing AWS EC2 instances",
     version="1.0.0",
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+
+registry.register(Gauge(
+    "db_record_cache", "Instance record cache size and lifetime hits/misses.", ("stat",),
+    function=lambda: {k: v for k, v in db.record_cache_stats().items() if k != "maxsize"},
+))
+registry.register(Gauge(
+    "jobs", "Job workers, and jobs queued or running.", ("stat",),
+    function=job_manager.stats,
+))
+registry.register(Gauge(
+    "instance_waiter", "Shared instance waiters: active waits, instances pending and lifetime describe polls.",
+    ("backend", "region", "stat"),
+    function=lambda: {
+        (name, region, stat): value
+        for name, backend in BACKENDS.items()
+        for region, waiter in list(backend.waiters.items())
+        for stat, value in waiter.stats().items()
+    },
+))
+registry.register(Gauge(
+    "ec2_rate_limiter",
+    "EC2 call budgets: lifetime calls/throttled/rejected, calls waiting for a token and tokens left.",
+    ("action", "region", "stat"),
+    function=aws_scheduler.stats,
+))
+registry.register(Gauge(
+    "circuit_breaker",
+    "Backend circuit breakers: state (0 closed, 1 half-open, 2 open), consecutive failures and lifetime trips.",
+    ("backend", "region", "stat"),
+    function=lambda: {
+        (backend, region, stat): value
+        for backend, regions in circuit_breakers.stats().items()
+        for region, breaker in regions.items()
+        for stat, value in (
+            ("state", {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}[breaker["state"]]),
+            ("consecutive_failures", breaker["consecutive_failures"]),
+            ("trips", breaker["trips"]),
+        )
+    },
+))
+registry.register(Gauge(
+    "instance_events", "Change feed for GET /instances/watch: last sequence number and events buffered.", ("stat",),
+    function=instance_events.stats,
+))
+registry.register(Gauge(
+    "notifications", "Notifications queued, and lifetime sent/failed/dropped.", ("stat",),
+    function=notifier.stats,
+))
 
 
 @app.on_event("startup")
@@ -19,6 +83,28 @@ async def startup_event():
     logger.info("Initializing database...")
     db._ensure_db_exists()
     logger.info("Database initialized")
+    pruned = idempotency_keys.prune()
+    if pruned:
+        logger.info(f"Pruned {pruned} expired or interrupted idempotency keys")
+    instance_events.start()
+    await ami_catalog.start()
+    notifier.start()
+    await job_manager.start()
+    await reconciler.start()
+    await loop_lag_monitor.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background workers and release pooled backend connections."""
+    instance_events.stop()
+    await loop_lag_monitor.stop()
+    await reconciler.stop()
+    await job_manager.stop()
+    await ami_catalog.stop()
+    await asyncio.get_running_loop().run_in_executor(None, notifier.stop)
+    await ec2_api_backend.close()
+    db.close()
 
 
 @app.get("/health")
@@ -27,5 +113,30 @@ async def health():
     return {"status": "ok"}
 
 
+@app.get("/health/cache")
+async def cache_stats():
+    """Hit/miss counters for the in-process instance record cache."""
+    return {"records": db.record_cache_stats()}
+
+
+@app.get("/health/catalog")
+async def catalog_stats():
+    """Where the free-tier catalog came from, and what it allows per region."""
+    return ami_catalog.stats()
+
+
+@app.get("/health/backends")
+async def backend_health():
+    """Circuit breaker state per backend and region; rows from open ones are served as stale."""
+    return {"breakers": circuit_breakers.stats()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics: route, script, database and SMTP latency, loop lag, worker usage."""
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
+
+
 # Include routers
 app.include_router(instances.router)
+app.include_router(jobs.router)
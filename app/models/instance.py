@@ -1,14 +1,72 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import AbstractSet, Any, Dict, List, Optional, Tuple
 from datetime import datetime
 
 
+# InstanceResponse fields, in response order
+INSTANCE_FIELDS = (
+    "id", "name", "public_ip", "ssh_string", "state", "ami", "instance_type",
+    "region", "security_group_id", "backend_used", "created_at", "updated_at",
+)
+TIMESTAMP_FIELDS = ("created_at", "updated_at")
+
+
+def ssh_string_for(public_ip: str) -> str:
+    """Build the SSH command shown for an instance with the given public IP."""
+    return f"ssh -i ~/.ssh/your-key.pem ec2-user@{public_ip}" if public_ip else ""
+
+
+def _isoformat(value: Any) -> Optional[str]:
+    if not value:
+        return None
+    if isinstance(value, str):
+        # SQLite stores "YYYY-MM-DD HH:MM:SS[.ffffff]"; respond in ISO 8601 like InstanceResponse
+        return value.replace(" ", "T", 1)
+    return value.isoformat()
+
+
+def instance_payload(row: Any, stale_keys: AbstractSet[Tuple[str, str]] = frozenset()) -> Dict[str, Any]:
+    """Convert an instance row (tuple in INSTANCE_FIELDS order, dict or sqlite3.Row) to JSON-ready data.
+
+    Rows whose (backend_used, region) is in stale_keys are marked stale: AWS cannot be
+    reached to confirm them, so they show the last state that was recorded.
+    """
+    if isinstance(row, tuple):
+        payload = dict(zip(INSTANCE_FIELDS, row))
+    elif isinstance(row, dict):
+        payload = {field: row.get(field, "") for field in INSTANCE_FIELDS}
+    else:
+        payload = {field: row[field] for field in INSTANCE_FIELDS}
+    for field in TIMESTAMP_FIELDS:
+        payload[field] = _isoformat(payload[field])
+    payload["stale"] = bool(stale_keys) and (payload["backend_used"], payload["region"]) in stale_keys
+    return payload
+
+
 class InstanceCreateRequest(BaseModel):
     name: str = Field(..., min_length=1, description="Instance name")
     ami: str = Field(..., min_length=1, description="AMI ID")
     instance_type: str = Field(..., min_length=1, description="Instance type")
     storage_gb: int = Field(..., ge=1, description="Storage size in GB")
     create_security_group: bool = Field(default=False, description="Auto-create security group for SSH/HTTP/HTTPS")
+    region: Optional[str] = Field(default=None, description="AWS region (default: AWS_DEFAULT_REGION)")
+
+
+class InstanceBulkCreateRequest(BaseModel):
+    name_template: str = Field(
+        ..., min_length=1, description="Instance name template; '{index}' is replaced by 1..count"
+    )
+    count: int = Field(..., ge=1, le=100, description="Number of instances to launch")
+    ami: str = Field(..., min_length=1, description="AMI ID")
+    instance_type: str = Field(..., min_length=1, description="Instance type")
+    storage_gb: int = Field(..., ge=1, description="Storage size in GB")
+    create_security_group: bool = Field(default=False, description="Auto-create security group for SSH/HTTP/HTTPS")
+    region: Optional[str] = Field(default=None, description="AWS region (default: AWS_DEFAULT_REGION)")
+
+    def names(self) -> List[str]:
+        """Render one instance name per index from the template."""
+        template = self.name_template if "{index}" in self.name_template else self.name_template + "-{index}"
+        return [template.replace("{index}", str(i)) for i in range(1, self.count + 1)]
 
 
 class InstanceResponse(BaseModel):
@@ -19,10 +77,13 @@ class InstanceResponse(BaseModel):
     state: str
     ami: str
     instance_type: str
+    region: Optional[str] = None
     security_group_id: Optional[str] = ""
     backend_used: str
     created_at: datetime
     updated_at: Optional[datetime] = None
+    # True while the instance's backend is unreachable and this is the last recorded state
+    stale: bool = False
 
     class Config:
         from_attributes = True
@@ -30,3 +91,31 @@ class InstanceResponse(BaseModel):
 
 class InstanceListResponse(BaseModel):
     instances: List[InstanceResponse]
+    next_cursor: Optional[str] = None
+
+
+class BatchInstanceRequest(BaseModel):
+    instance_ids: List[str] = Field(..., min_length=1, max_length=1000, description="Instance IDs to act on")
+
+
+class BatchInstanceResult(BaseModel):
+    id: str
+    success: bool
+    state: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BatchInstanceResponse(BaseModel):
+    action: str
+    results: List[BatchInstanceResult]
+
+
+class JobResponse(BaseModel):
+    id: str
+    operation: str
+    status: str
+    instance_id: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
@@ -0,0 +1,26 @@
+import json
+from typing import Any
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - stdlib fallback
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """Encode plain JSON data (dicts, lists, strings, numbers) to compact UTF-8 bytes."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response for content that is already JSON-ready.
+
+    Returning it from a handler skips response_model validation and
+    jsonable_encoder; the response_model is then only used for the OpenAPI schema.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
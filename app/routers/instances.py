@@ -1,64 +1,208 @@
-from fastapi import APIRouter, BackgroundTasks, Query, HTTPException, status
-from app.models.instance import InstanceCreateRequest, InstanceResponse, InstanceListResponse
+from fastapi import APIRouter, Header, Query, HTTPException, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from app.models.instance import (
+    INSTANCE_FIELDS,
+    instance_payload,
+    ssh_string_for,
+    InstanceCreateRequest,
+    InstanceBulkCreateRequest,
+    InstanceResponse,
+    InstanceListResponse,
+    BatchInstanceRequest,
+    BatchInstanceResult,
+    BatchInstanceResponse,
+    JobResponse,
+)
 from app.config import settings
+from app.responses import FastJSONResponse, dumps
+from app.services.ami_catalog import ami_catalog
 from app.services.db import db
-from app.services.aws_cli import aws_cli_backend
+from app.services.events import instance_events
+from app.services.idempotency import client_token, idempotency_keys, request_fingerprint
+from app.services.backends import BACKENDS, resolve_backend
+from app.services.breaker import BreakerOpenError, circuit_breakers
+from app.services.jobs import job_manager
 from app.services.notifications import send_notification
-from datetime import datetime
-from typing import Optional
+from app.services.regions import iter_regions, resolve_region
+from app.services.throttle import ThrottledError
+from app.services.tracing import span
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Literal, Optional, Tuple, Union
+from functools import partial
+import asyncio
+import base64
+import json
+import logging
+import math
+import zlib
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/instances", tags=["instances"])
 
+# How often a pending backend call checks whether its client is still connected
+DISCONNECT_POLL_INTERVAL = 1.0
+
+# Awaits a backend call on behalf of a handler or a job: (call, action) -> result
+BackendRunner = Callable[[Awaitable[Any], str], Awaitable[Any]]
+
 
 def validate_free_tier(instance_type: str, ami: str, region: str = None) -> bool:
     """Validate if instance meets free tier requirements."""
-    return settings.validate_free_tier(instance_type, ami, region)
-
+    return ami_catalog.is_eligible(instance_type, ami, region)
 
-def get_backend(backend_param: Optional[str] = None):
-    """Get the AWS CLI backend (only backend available)."""
-    return aws_cli_backend
 
+def _require_free_tier(instance_type: str, ami: str, region: str = None):
+    """Reject configurations that are not free tier eligible in the region."""
+    if not ami_catalog.covers(region):
+        covered = [name for name in settings.AWS_REGIONS if ami_catalog.covers(name)]
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=(
+                f"Region '{region}' has no free tier AMI catalog entries, so instances cannot be created there. "
+                f"Regions with catalog entries: {', '.join(covered) or 'none'}"
+            ),
+        )
 
-@router.post("", response_model=InstanceResponse, status_code=status.HTTP_201_CREATED)
-async def create_instance(
-    request: InstanceCreateRequest,
-    background_tasks: BackgroundTasks,
-):
-    """Create a new EC2 instance."""
-    # Validate free tier
-    if not validate_free_tier(request.instance_type, request.ami):
+    with span("validate_free_tier"):
+        eligible = validate_free_tier(instance_type, ami, region)
+    if not eligible:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=(
-                f"Instance type '{request.instance_type}' or AMI '{request.ami}' "
-                "not allowed. Only t3.micro and t4g.micro instance types are "
+                f"Instance type '{instance_type}' or AMI '{ami}' "
+                f"not allowed. Only {' and '.join(ami_catalog.instance_types(region))} instance types are "
                 "free tier eligible."
             ),
         )
 
-    # Get backend (AWS CLI only)
-    service = get_backend()
 
-    # Create instance
+def get_region(region_param: Optional[str] = None) -> str:
+    """Get the requested region, falling back to AWS_DEFAULT_REGION."""
     try:
-        result = service.create(
-            request.name,
-            request.ami,
-            request.instance_type,
-            request.storage_gb,
+        return resolve_region(region_param)
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown region '{region_param}'. Configured regions: {', '.join(settings.AWS_REGIONS)}",
         )
-        instance_id = result["id"].strip().split('\n')[-1]
-        public_ip = result.get("public_ip", "").strip()
 
+
+def get_backend(backend_param: Optional[str] = None):
+    """Get the requested backend, falling back to the configured default."""
+    try:
+        return resolve_backend(backend_param)
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown backend '{backend_param}'. Available backends: {', '.join(BACKENDS)}",
+        )
+
+
+def _require_available(service, region: str = None):
+    """Fail fast with 503 while the backend's circuit breaker for the region is open."""
+    try:
+        circuit_breakers.get(service.name, region or settings.AWS_DEFAULT_REGION).check()
+    except BreakerOpenError as e:
+        raise _unavailable(e, "reach AWS")
+
+
+async def _await_connected(request: Request, call: Awaitable[Any], action: str) -> Any:
+    """Await a backend call, cancelling it if the client disconnects."""
+    task = asyncio.ensure_future(call)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                logger.warning(f"Client disconnected, cancelling: {action}")
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                raise HTTPException(status_code=499, detail="Client closed request")
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+def _unavailable(e: Union[ThrottledError, BreakerOpenError], action: str) -> HTTPException:
+    """503 with Retry-After for a call the EC2 budget could not fit in, or an open circuit breaker refused."""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=f"Failed to {action}: {str(e)}",
+        headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+    )
+
+
+async def _call_backend(request: Request, call: Awaitable[Any], action: str) -> Any:
+    """Await a backend call, turning backend failures into HTTP 500 (or 503 when throttled or unavailable) responses."""
+    try:
+        with span("backend", action=action):
+            return await _await_connected(request, call, action)
+    except HTTPException:
+        raise
+    except (ThrottledError, BreakerOpenError) as e:
+        raise _unavailable(e, action)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to {action}: {str(e)}",
+        )
+
+
+async def _run_in_job(call: Awaitable[Any], action: str) -> Any:
+    """Await a backend call from a job worker, where there is no client to watch."""
+    try:
+        return await call
+    except Exception as e:
+        raise RuntimeError(f"Failed to {action}: {str(e)}")
+
+
+async def _run_detached(call: Awaitable[Any], action: str) -> Any:
+    """Await a backend call that should finish even if the client goes away, e.g. one other requests wait on."""
+    try:
+        with span("backend", action=action):
+            return await call
+    except (ThrottledError, BreakerOpenError) as e:
+        raise _unavailable(e, action)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to create instance: {str(e)}",
+            detail=f"Failed to {action}: {str(e)}",
         )
 
+
+def _accepted(job: Dict[str, Any]) -> JSONResponse:
+    """Answer 202 Accepted with the job record and where to poll it."""
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content=jsonable_encoder(JobResponse(**job)),
+        headers={"Location": f"/jobs/{job['id']}"},
+    )
+
+
+async def _create(request: InstanceCreateRequest, service, region: str, run: BackendRunner,
+                  token: str = None, idempotency_key: str = None) -> Dict[str, Any]:
+    """Create an instance through the backend and store its record.
+
+    With idempotency_key, the key's 201 response is stored in the same transaction as the record.
+    """
+    result = await run(
+        service.create(
+            request.name,
+            request.ami,
+            request.instance_type,
+            request.storage_gb,
+            region=region,
+            client_token=token,
+        ),
+        "create instance",
+    )
+    instance_id = result["id"].strip().split('\n')[-1]
+    public_ip = result.get("public_ip", "").strip()
+
     # Build SSH string
-    ssh_string = f"ssh -i ~/.ssh/your-key.pem ec2-user@{public_ip}" if public_ip else ""
+    ssh_string = ssh_string_for(public_ip)
 
     # Store in database
     instance_data = {
@@ -66,81 +210,511 @@ async def create_instance(
         "name": request.name,
         "public_ip": public_ip,
         "ssh_string": ssh_string,
-        "state": "running",
+        "state": result.get("state", "pending"),
         "ami": request.ami,
         "instance_type": request.instance_type,
-        "backend_used": "awscli",
+        "region": region,
+        "backend_used": service.name,
     }
 
-    db.create_instance_record(instance_data)
-
-    # Send notification in background
-    background_tasks.add_task(send_notification, "create", instance_data)
-
-    return InstanceResponse(
-        id=instance_id,
-        name=request.name,
-        public_ip=public_ip,
-        ssh_string=ssh_string,
-        state="running",
-        ami=request.ami,
-        instance_type=request.instance_type,
-        backend_used="awscli",
-        created_at=datetime.utcnow(),
+    if idempotency_key is None:
+        db.create_instance_record(instance_data)
+    else:
+        db.create_instance_record(
+            instance_data, idempotency_key, lambda: (status.HTTP_201_CREATED, instance_payload(instance_data)),
+        )
+    return instance_data
+
+
+@router.post(
+    "",
+    response_model=InstanceResponse,
+    status_code=status.HTTP_201_CREATED,
+    responses={202: {"model": JobResponse}},
+)
+async def create_instance(
+    request: InstanceCreateRequest,
+    http_request: Request,
+    backend: Optional[str] = Query(None),
+    async_mode: bool = Query(False),
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+):
+    """Create a new EC2 instance."""
+    region = get_region(request.region)
+
+    # Validate free tier
+    _require_free_tier(request.instance_type, request.ami, region)
+
+    # Get backend
+    service = get_backend(backend)
+    _require_available(service, region)
+
+    request_hash = token = None
+    if idempotency_key is not None:
+        request_hash = request_fingerprint(request=request.model_dump(), backend=service.name, async_mode=async_mode)
+        token = client_token(idempotency_key, request_hash)
+
+    if async_mode:
+        async def job():
+            instance_data = await _create(request, service, region, _run_in_job, token)
+            send_notification("create", instance_data)
+            return instance_payload(instance_data)
+
+        if idempotency_key is None:
+            return _accepted(job_manager.submit("create", job))
+
+        async def submit():
+            submitted = job_manager.submit("create", job)
+            return status.HTTP_202_ACCEPTED, jsonable_encoder(JobResponse(**submitted)), None
+
+        return await _create_once(idempotency_key, request_hash, submit)
+
+    async def create(run: BackendRunner):
+        instance_data = await _create(request, service, region, run, token, idempotency_key)
+
+        # Queue notification
+        send_notification("create", instance_data)
+
+        return status.HTTP_201_CREATED, instance_payload(instance_data), instance_data["id"]
+
+    if idempotency_key is None:
+        status_code, body, _ = await create(partial(_call_backend, http_request))
+        return FastJSONResponse(body, status_code=status_code)
+
+    return await _create_once(idempotency_key, request_hash, partial(create, _run_detached))
+
+
+async def _create_once(key: str, request_hash: str, operation) -> JSONResponse:
+    """Run a keyed create at most once, replaying its stored 201 or 202 response to repeats."""
+    status_code, body, replayed = await idempotency_keys.run(key, request_hash, operation)
+
+    headers = {"Idempotent-Replayed": "true"} if replayed else {}
+    if status_code == status.HTTP_202_ACCEPTED:
+        headers["Location"] = f"/jobs/{body['id']}"
+    return FastJSONResponse(body, status_code=status_code, headers=headers)
+
+
+async def _bulk_create(request: InstanceBulkCreateRequest, service, region: str,
+                       run: BackendRunner) -> List[Dict[str, Any]]:
+    """Create several instances through the backend and store their records."""
+    results = await run(
+        service.create_many(
+            request.names(),
+            request.ami,
+            request.instance_type,
+            request.storage_gb,
+            region=region,
+        ),
+        "create instances",
+    )
+
+    # Store in database
+    instances = []
+    for result in results:
+        public_ip = result.get("public_ip", "").strip()
+        instances.append({
+            "id": result["id"],
+            "name": result["name"],
+            "public_ip": public_ip,
+            "ssh_string": ssh_string_for(public_ip),
+            "state": result.get("state", "pending"),
+            "ami": request.ami,
+            "instance_type": request.instance_type,
+            "region": region,
+            "backend_used": service.name,
+        })
+
+    db.create_instance_records(instances)
+    return instances
+
+
+@router.post(
+    "/bulk",
+    response_model=InstanceListResponse,
+    status_code=status.HTTP_201_CREATED,
+    responses={202: {"model": JobResponse}},
+)
+async def bulk_create_instances(
+    request: InstanceBulkCreateRequest,
+    http_request: Request,
+    backend: Optional[str] = Query(None),
+    async_mode: bool = Query(False),
+):
+    """Create several EC2 instances with a single run-instances call."""
+    region = get_region(request.region)
+
+    # Validate free tier once for the whole batch
+    _require_free_tier(request.instance_type, request.ami, region)
+
+    # Get backend
+    service = get_backend(backend)
+    _require_available(service, region)
+
+    if async_mode:
+        async def job():
+            instances = await _bulk_create(request, service, region, _run_in_job)
+            for instance_data in instances:
+                send_notification("create", instance_data)
+            return {"instances": [instance_payload(instance_data) for instance_data in instances], "next_cursor": None}
+
+        return _accepted(job_manager.submit("bulk_create", job))
+
+    # Create instances
+    instances = await _bulk_create(request, service, region, partial(_call_backend, http_request))
+
+    # Queue notifications
+    for instance_data in instances:
+        send_notification("create", instance_data)
+
+    return FastJSONResponse(
+        {"instances": [instance_payload(instance_data) for instance_data in instances], "next_cursor": None},
+        status_code=status.HTTP_201_CREATED,
+    )
+
+
+def _encode_cursor(created_at: Any, instance_id: str) -> str:
+    key = json.dumps([str(created_at), instance_id])
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        created_at, instance_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return str(created_at), str(instance_id)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def _etag(variant: str = "") -> str:
+    """Strong ETag for instance reads: changes whenever any instance row or a breaker's stale state does."""
+    tag = f"{db.change_seq}{variant}"
+    stale_keys = circuit_breakers.stale_keys()
+    if stale_keys:
+        tag += f"-s{zlib.crc32(repr(sorted(stale_keys)).encode()):08x}"
+    return f'"{tag}"'
+
+
+def _not_modified(request: Request, etag: str) -> Optional[Response]:
+    """A 304 response if If-None-Match already names etag, else None."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return None
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored
+    candidates = {candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")}
+    if etag in candidates:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return None
+
+
+def _ndjson_export(chunks: Iterator[List[Any]]) -> Iterator[bytes]:
+    """Encode row chunks as NDJSON, one chunk of lines at a time."""
+    for rows in chunks:
+        stale_keys = circuit_breakers.stale_keys()
+        yield b"".join(dumps(instance_payload(row, stale_keys)) + b"\n" for row in rows)
+
+
+@router.get(
+    "",
+    response_model=InstanceListResponse,
+    responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}}},
+)
+async def list_instances(
+    request: Request,
+    backend: Optional[str] = Query(None, description="Only instances created through this backend"),
+    state: Optional[str] = Query(None),
+    name_prefix: Optional[str] = Query(None, min_length=1),
+    instance_type: Optional[str] = Query(None),
+    region: Optional[str] = Query(None),
+    limit: int = Query(settings.LIST_DEFAULT_LIMIT, ge=1, le=settings.LIST_MAX_LIMIT),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+):
+    """List instances newest first, one page at a time.
+
+    With Accept: application/x-ndjson, stream every matching instance as one
+    JSON object per line instead (limit is ignored; cursor still applies).
+
+    Responses carry an ETag; a matching If-None-Match gets 304 without reading any rows.
+    """
+    after = _decode_cursor(cursor) if cursor else None
+    ndjson = NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+    # Taken before reading rows, so a write racing the read can only make the tag older than the body
+    etag = _etag("-ndjson" if ndjson else "")
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+
+    if ndjson:
+        chunks = db.iter_instances(
+            state=state,
+            name_prefix=name_prefix,
+            instance_type=instance_type,
+            backend_used=backend,
+            region=region,
+            after=after,
+            chunk_size=settings.EXPORT_CHUNK_SIZE,
+        )
+        return StreamingResponse(_ndjson_export(chunks), media_type=NDJSON_MEDIA_TYPE, headers={"ETag": etag})
+
+    rows = db.list_instance_rows(
+        state=state,
+        name_prefix=name_prefix,
+        instance_type=instance_type,
+        backend_used=backend,
+        region=region,
+        after=after,
+        limit=limit + 1,
+    )
+
+    # The extra row only tells us whether another page exists
+    next_cursor = None
+    if len(rows) > limit:
+        last = dict(zip(INSTANCE_FIELDS, rows[limit - 1]))
+        next_cursor = _encode_cursor(last["created_at"], last["id"])
+
+    stale_keys = circuit_breakers.stale_keys()
+    return FastJSONResponse({
+        "instances": [instance_payload(row, stale_keys) for row in rows[:limit]],
+        "next_cursor": next_cursor,
+    }, headers={"ETag": etag})
+
+
+async def _ndjson_inventory(instances: AsyncIterator[Dict[str, Any]], failed: Dict[str, str]) -> AsyncIterator[bytes]:
+    async for instance in instances:
+        yield dumps(instance) + b"\n"
+    # Last, once every region has finished, so a partial inventory never looks complete
+    for region, error in sorted(failed.items()):
+        yield dumps({"region": region, "error": error}) + b"\n"
+
+
+# Registered before the /{instance_id} routes so "inventory" is never taken for an instance ID
+@router.get("/inventory", responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}}})
+async def instance_inventory(
+    backend: Optional[str] = Query(None),
+    region: Optional[List[str]] = Query(None, description="Regions to describe; all of AWS_REGIONS by default"),
+    state: Optional[List[str]] = Query(None),
+):
+    """Stream the live EC2 inventory of every configured region as NDJSON.
+
+    Regions are described concurrently and lines are written as pages arrive;
+    a region that fails ends the stream with a {"region", "error"} line rather
+    than failing the whole response.
+    """
+    regions = list(dict.fromkeys(get_region(name) for name in region)) if region else None
+    failed: Dict[str, str] = {}
+    instances = iter_regions(get_backend(backend), regions=regions, states=state, failed=failed)
+    return StreamingResponse(_ndjson_inventory(instances, failed), media_type=NDJSON_MEDIA_TYPE)
+
+
+SSE_MEDIA_TYPE = "text/event-stream"
+
+
+def _sse(event: str, data: Any, seq: int = None) -> bytes:
+    head = f"id: {seq}\n" if seq is not None else ""
+    return f"{head}event: {event}\n".encode() + b"data: " + dumps(data) + b"\n\n"
+
+
+def _event_data(kind: str, record: Dict[str, Any]) -> Dict[str, Any]:
+    if kind == "created":
+        return instance_payload(record)
+    if record.get("updated_at"):
+        record = {**record, "updated_at": record["updated_at"].replace(" ", "T", 1)}
+    return record
+
+
+async def _watch(request: Request, instance_ids: Optional[set], last_seq: Optional[int],
+                 until_state: Optional[str] = None) -> AsyncIterator[bytes]:
+    """Stream change events after last_seq (or from now) until the client goes away or until_state is seen."""
+    yield f"retry: {int(settings.WATCH_KEEPALIVE_SECONDS * 1000)}\n\n".encode()
+
+    if last_seq is None or last_seq > instance_events.seq:
+        resumed = last_seq is not None
+        last_seq = instance_events.seq
+        if resumed:
+            # A sequence this server never issued, e.g. from before a restart
+            yield _sse("reset", {"seq": last_seq}, last_seq)
+        elif instance_ids:
+            # Current records first, so a client waiting for a state it has already reached returns at once
+            for record in db.get_instances(sorted(instance_ids)).values():
+                yield _sse("snapshot", instance_payload(record, circuit_breakers.stale_keys()), last_seq)
+                if until_state and record["state"] == until_state:
+                    return
+
+    while not instance_events.closed:
+        events = instance_events.since(last_seq)
+        if events is None:
+            # Fell behind the buffer: the client should re-list, then carry on from here
+            last_seq = instance_events.seq
+            yield _sse("reset", {"seq": last_seq}, last_seq)
+            continue
+        for seq, kind, record in events:
+            last_seq = seq
+            if instance_ids is None or record["id"] in instance_ids:
+                yield _sse(kind, _event_data(kind, record), seq)
+                if until_state and record.get("state") == until_state:
+                    return
+
+        if await request.is_disconnected():
+            break
+        try:
+            await instance_events.wait(last_seq, settings.WATCH_KEEPALIVE_SECONDS)
+        except asyncio.TimeoutError:
+            yield b": keepalive\n\n"
+
+
+# Registered before the /{instance_id} routes so "watch" is never taken for an instance ID
+@router.get("/watch", responses={200: {"content": {SSE_MEDIA_TYPE: {}}}})
+async def watch_instances(
+    request: Request,
+    instance_ids: Optional[List[str]] = Query(None, alias="id", description="Only events for these instance IDs"),
+    after: Optional[int] = Query(None, ge=0, description="Resume after this sequence number"),
+    until_state: Optional[str] = Query(None, description="End the stream once an event reports this state"),
+    last_event_id: Optional[int] = Header(None, ge=0),
+):
+    """Stream instance created/updated/deleted events as Server-Sent Events.
+
+    Each event's id is its sequence number; reconnecting with Last-Event-ID (or
+    ?after=) resumes from there. With an id filter and no resume point, the current
+    records are sent first as snapshot events. With until_state, the stream ends
+    after the first event that reports that state.
+    """
+    last_seq = last_event_id if last_event_id is not None else after
+    return StreamingResponse(
+        _watch(request, set(instance_ids) if instance_ids else None, last_seq, until_state),
+        media_type=SSE_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
-@router.get("", response_model=InstanceListResponse)
-async def list_instances(backend: Optional[str] = Query(None)):
-    """List all instances."""
-    instances = db.list_instances()
-
-    return InstanceListResponse(
-        instances=[
-            InstanceResponse(
-                id=inst["id"],
-                name=inst["name"],
-                public_ip=inst["public_ip"],
-                ssh_string=inst["ssh_string"],
-                state=inst["state"],
-                ami=inst["ami"],
-                instance_type=inst["instance_type"],
-                backend_used=inst["backend_used"],
-                created_at=inst["created_at"],
+# Registered before the /{instance_id} routes so "batch" is never taken for an instance ID
+@router.post("/batch/{action}", response_model=BatchInstanceResponse)
+async def batch_instances(
+    action: Literal["start", "stop", "destroy"],
+    batch: BatchInstanceRequest,
+    request: Request,
+    backend: Optional[str] = Query(None),
+):
+    """Start, stop or destroy many instances with a single AWS call."""
+    instance_ids = list(dict.fromkeys(batch.instance_ids))
+    instances = db.get_instances(instance_ids)
+
+    results = {
+        instance_id: BatchInstanceResult(id=instance_id, success=False, error=f"Instance not found: {instance_id}")
+        for instance_id in instance_ids
+        if instance_id not in instances
+    }
+    found_ids = [instance_id for instance_id in instance_ids if instance_id in instances]
+
+    if found_ids:
+        service = get_backend(backend)
+        call = {
+            "start": service.start_many,
+            "stop": service.stop_many,
+            "destroy": service.destroy_many,
+        }[action]
+
+        # One AWS call per region, all regions at once
+        by_region: Dict[str, List[str]] = {}
+        for instance_id in found_ids:
+            region = instances[instance_id].get("region") or settings.AWS_DEFAULT_REGION
+            by_region.setdefault(region, []).append(instance_id)
+
+        # Fail fast in regions whose circuit breaker is open; the whole batch gets 503 only if all of them are
+        unavailable: Dict[str, HTTPException] = {}
+        for region in by_region:
+            try:
+                _require_available(service, region)
+            except HTTPException as e:
+                unavailable[region] = e
+        if len(unavailable) == len(by_region):
+            raise next(iter(unavailable.values()))
+        for region, e in unavailable.items():
+            for instance_id in by_region.pop(region):
+                results[instance_id] = BatchInstanceResult(id=instance_id, success=False, error=e.detail)
+
+        with span("backend", action=f"{action} instances"):
+            calls = (call(ids, region=region) for region, ids in by_region.items())
+            outcomes = await _await_connected(
+                request, asyncio.gather(*calls, return_exceptions=True), f"{action} instances",
             )
-            for inst in instances
-        ]
+
+        succeeded: List[str] = []
+        state = None
+        for ids, outcome in zip(by_region.values(), outcomes):
+            if isinstance(outcome, Exception):
+                for instance_id in ids:
+                    results[instance_id] = BatchInstanceResult(
+                        id=instance_id,
+                        success=False,
+                        error=f"Failed to {action} instance: {str(outcome)}",
+                    )
+            else:
+                state = outcome[0]["state"]
+                succeeded.extend(ids)
+
+        if succeeded:
+            if action == "destroy":
+                db.delete_instance_records(succeeded)
+                updated = instances
+                for instance_id in succeeded:
+                    updated[instance_id]["state"] = state
+            else:
+                updated = db.update_instances_state(succeeded, state)
+
+            for instance_id in succeeded:
+                results[instance_id] = BatchInstanceResult(id=instance_id, success=True, state=state)
+                send_notification(action, updated[instance_id])
+
+    return BatchInstanceResponse(
+        action=action,
+        results=[results[instance_id] for instance_id in instance_ids],
     )
 
 
 @router.get("/{instance_id}", response_model=InstanceResponse)
-async def get_instance(instance_id: str):
-    """Get details of a specific instance."""
+async def get_instance(instance_id: str, request: Request):
+    """Get details of a specific instance; a matching If-None-Match gets 304."""
+    etag = _etag()
     instance = db.get_instance(instance_id)
 
+    # Before the ETag check: the tag is shared by every record, so it matches for deleted IDs too
     if not instance:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Instance not found: {instance_id}",
         )
 
-    return InstanceResponse(
-        id=instance["id"],
-        name=instance["name"],
-        public_ip=instance["public_ip"],
-        ssh_string=instance["ssh_string"],
-        state=instance["state"],
-        ami=instance["ami"],
-        instance_type=instance["instance_type"],
-        backend_used=instance["backend_used"],
-        created_at=instance["created_at"],
-    )
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+
+    return FastJSONResponse(instance_payload(instance, circuit_breakers.stale_keys()), headers={"ETag": etag})
 
 
-@router.post("/{instance_id}/start", response_model=InstanceResponse)
+async def _start(instance: Dict[str, Any], service, run: BackendRunner) -> Dict[str, Any]:
+    """Start an instance through the backend and record its new state."""
+    await run(service.start(instance["id"], region=instance.get("region")), "start instance")
+
+    # Update state
+    return db.update_instance_state(instance["id"], "running")
+
+
+@router.post(
+    "/{instance_id}/start",
+    response_model=InstanceResponse,
+    responses={202: {"model": JobResponse}},
+)
 async def start_instance(
     instance_id: str,
-    background_tasks: BackgroundTasks,
+    request: Request,
+    backend: Optional[str] = Query(None),
+    async_mode: bool = Query(False),
 ):
     """Start a stopped instance."""
     # Check if instance exists
@@ -151,42 +725,45 @@ async def start_instance(
             detail=f"Instance not found: {instance_id}",
         )
 
-    # Get backend (AWS CLI only)
-    service = get_backend()
+    # Get backend
+    service = get_backend(backend)
+    _require_available(service, instance.get("region"))
 
-    # Start instance
-    try:
-        service.start(instance_id)
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to start instance: {str(e)}",
-        )
+    if async_mode:
+        async def job():
+            updated = await _start(instance, service, _run_in_job)
+            send_notification("start", updated)
+            return instance_payload(updated)
 
-    # Update state
-    db.update_instance_state(instance_id, "running")
-    updated = db.get_instance(instance_id)
+        return _accepted(job_manager.submit("start", job, instance_id))
+
+    # Start instance
+    updated = await _start(instance, service, partial(_call_backend, request))
 
     # Send notification
-    background_tasks.add_task(send_notification, "start", updated)
-
-    return InstanceResponse(
-        id=updated["id"],
-        name=updated["name"],
-        public_ip=updated["public_ip"],
-        ssh_string=updated["ssh_string"],
-        state=updated["state"],
-        ami=updated["ami"],
-        instance_type=updated["instance_type"],
-        backend_used=updated["backend_used"],
-        created_at=updated["created_at"],
-    )
+    send_notification("start", updated)
+
+    return FastJSONResponse(instance_payload(updated))
 
 
-@router.post("/{instance_id}/stop", response_model=InstanceResponse)
+async def _stop(instance: Dict[str, Any], service, run: BackendRunner) -> Dict[str, Any]:
+    """Stop an instance through the backend and record its new state."""
+    await run(service.stop(instance["id"], region=instance.get("region")), "stop instance")
+
+    # Update state
+    return db.update_instance_state(instance["id"], "stopped")
+
+
+@router.post(
+    "/{instance_id}/stop",
+    response_model=InstanceResponse,
+    responses={202: {"model": JobResponse}},
+)
 async def stop_instance(
     instance_id: str,
-    background_tasks: BackgroundTasks,
+    request: Request,
+    backend: Optional[str] = Query(None),
+    async_mode: bool = Query(False),
 ):
     """Stop a running instance."""
     # Check if instance exists
@@ -197,42 +774,32 @@ async def stop_instance(
             detail=f"Instance not found: {instance_id}",
         )
 
-    # Get backend (AWS CLI only)
-    service = get_backend()
+    # Get backend
+    service = get_backend(backend)
+    _require_available(service, instance.get("region"))
 
-    # Stop instance
-    try:
-        service.stop(instance_id)
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to stop instance: {str(e)}",
-        )
+    if async_mode:
+        async def job():
+            updated = await _stop(instance, service, _run_in_job)
+            send_notification("stop", updated)
+            return instance_payload(updated)
 
-    # Update state
-    db.update_instance_state(instance_id, "stopped")
-    updated = db.get_instance(instance_id)
+        return _accepted(job_manager.submit("stop", job, instance_id))
+
+    # Stop instance
+    updated = await _stop(instance, service, partial(_call_backend, request))
 
     # Send notification
-    background_tasks.add_task(send_notification, "stop", updated)
-
-    return InstanceResponse(
-        id=updated["id"],
-        name=updated["name"],
-        public_ip=updated["public_ip"],
-        ssh_string=updated["ssh_string"],
-        state=updated["state"],
-        ami=updated["ami"],
-        instance_type=updated["instance_type"],
-        backend_used=updated["backend_used"],
-        created_at=updated["created_at"],
-    )
+    send_notification("stop", updated)
+
+    return FastJSONResponse(instance_payload(updated))
 
 
 @router.delete("/{instance_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def destroy_instance(
     instance_id: str,
-    background_tasks: BackgroundTasks,
+    request: Request,
+    backend: Optional[str] = Query(None),
 ):
     """Destroy/terminate an instance."""
     # Check if instance exists
@@ -243,24 +810,18 @@ async def destroy_instance(
             detail=f"Instance not found: {instance_id}",
         )
 
-    # Get backend (AWS CLI only)
-    service = get_backend()
+    # Get backend
+    service = get_backend(backend)
+    _require_available(service, instance.get("region"))
 
     # Destroy instance
-    try:
-        service.destroy(instance_id)
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to destroy instance: {str(e)}",
-        )
+    await _call_backend(request, service.destroy(instance_id, region=instance.get("region")), "destroy instance")
 
     # Update state
-    db.update_instance_state(instance_id, "terminated")
-    updated = db.get_instance(instance_id)
+    updated = db.update_instance_state(instance_id, "terminated")
 
     # Send notification
-    background_tasks.add_task(send_notification, "destroy", updated)
+    send_notification("destroy", updated)
 
     # Delete from database
     db.delete_instance_record(instance_id)
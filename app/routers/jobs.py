@@ -0,0 +1,19 @@
+from fastapi import APIRouter, HTTPException, status
+from app.models.instance import JobResponse
+from app.services.db import db
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """Get the progress and outcome of an asynchronous job."""
+    job = db.get_job(job_id)
+
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job not found: {job_id}",
+        )
+
+    return JobResponse(**job)
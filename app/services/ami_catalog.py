@@ -0,0 +1,194 @@
+import asyncio
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional
+from app.config import settings
+from app.services.aws_cli import aws_cli_backend
+import logging
+
+logger = logging.getLogger(__name__)
+
+EMPTY: FrozenSet[str] = frozenset()
+
+
+class CatalogSnapshot:
+    """Immutable per-region sets of free-tier instance types and AMIs."""
+
+    def __init__(self, regions: Dict[str, Dict[str, Iterable[str]]], source: str, loaded_at: datetime = None):
+        self.instance_types: Dict[str, FrozenSet[str]] = {
+            region: frozenset(entry.get("instance_types") or ()) for region, entry in regions.items()
+        }
+        self.amis: Dict[str, FrozenSet[str]] = {
+            region: frozenset(entry.get("amis") or ()) for region, entry in regions.items()
+        }
+        self.source = source
+        self.loaded_at = loaded_at or datetime.utcnow()
+
+    @classmethod
+    def from_settings(cls) -> "CatalogSnapshot":
+        """The built-in seed: ALLOWED_INSTANCE_TYPES in every FREE_TIER_AMIS region."""
+        return cls(
+            {
+                region: {"instance_types": settings.ALLOWED_INSTANCE_TYPES, "amis": amis}
+                for region, amis in settings.FREE_TIER_AMIS.items()
+            },
+            source="built-in",
+        )
+
+    @classmethod
+    def from_file(cls, path: str) -> "CatalogSnapshot":
+        with open(path) as f:
+            data = json.load(f)
+        loaded_at = datetime.fromisoformat(data["updated_at"]) if data.get("updated_at") else None
+        return cls(data["regions"], source=path, loaded_at=loaded_at)
+
+    def regions(self) -> List[str]:
+        return sorted(self.amis)
+
+    def is_eligible(self, instance_type: str, ami: str, region: str) -> bool:
+        return instance_type in self.instance_types.get(region, EMPTY) and ami in self.amis.get(region, EMPTY)
+
+    def covers(self, region: str) -> bool:
+        """Whether the region has any eligible instance type and AMI, so creates there can pass validation."""
+        return bool(self.instance_types.get(region)) and bool(self.amis.get(region))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "updated_at": self.loaded_at.isoformat(),
+            "regions": {
+                region: {
+                    "instance_types": sorted(self.instance_types[region]),
+                    "amis": sorted(self.amis[region]),
+                }
+                for region in self.regions()
+            },
+        }
+
+
+class AmiCatalog:
+    """
+    Free-tier validation against an in-memory snapshot that requests never wait on.
+
+    The snapshot comes from AMI_CATALOG_FILE, or the built-in settings when the file
+    does not exist. With AMI_CATALOG_REFRESH_SECONDS set, a background task rebuilds it
+    from describe-instance-types/describe-images, swaps it in with one assignment and
+    writes it back to the file for the next start.
+    """
+
+    def __init__(self, path: str = None, interval: float = None):
+        self.path = settings.AMI_CATALOG_FILE if path is None else path
+        self.interval = settings.AMI_CATALOG_REFRESH_SECONDS if interval is None else interval
+        self.snapshot = CatalogSnapshot.from_settings()
+        self._task: Optional[asyncio.Task] = None
+
+    def load(self):
+        """Load the snapshot file if there is one, keeping the current snapshot otherwise."""
+        if not self.path or not os.path.exists(self.path):
+            logger.info(f"AMI catalog using {self.snapshot.source} snapshot")
+            return
+        try:
+            self.snapshot = CatalogSnapshot.from_file(self.path)
+        except Exception as e:
+            logger.error(f"Failed to load AMI catalog {self.path}: {str(e)}")
+            return
+        logger.info(f"AMI catalog loaded from {self.path} ({len(self.snapshot.regions())} regions)")
+
+    def is_eligible(self, instance_type: str, ami: str, region: str = None) -> bool:
+        return self.snapshot.is_eligible(instance_type, ami, region or settings.AWS_DEFAULT_REGION)
+
+    def instance_types(self, region: str = None) -> List[str]:
+        return sorted(self.snapshot.instance_types.get(region or settings.AWS_DEFAULT_REGION, EMPTY))
+
+    def covers(self, region: str = None) -> bool:
+        return self.snapshot.covers(region or settings.AWS_DEFAULT_REGION)
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self.snapshot
+        return {
+            "source": snapshot.source,
+            "updated_at": snapshot.loaded_at.isoformat(),
+            "regions": {
+                region: {
+                    "instance_types": sorted(snapshot.instance_types[region]),
+                    "amis": len(snapshot.amis[region]),
+                }
+                for region in snapshot.regions()
+            },
+        }
+
+    async def start(self):
+        """Load the snapshot and start the refresh loop (disabled when the interval is 0)."""
+        self.load()
+        uncovered = [region for region in settings.AWS_REGIONS if not self.covers(region)]
+        if uncovered:
+            logger.warning(f"AMI catalog has no free tier entries for {', '.join(uncovered)}; creates there get 400")
+        if self.interval <= 0:
+            return
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"AMI catalog refreshing every {self.interval}s")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"AMI catalog refresh failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    async def refresh(self) -> CatalogSnapshot:
+        """Rebuild the snapshot from AWS; regions that fail to describe keep their current entries."""
+        current = self.snapshot
+        regions = settings.AMI_CATALOG_REGIONS or current.regions()
+        patterns = [pattern for pattern in settings.AMI_CATALOG_NAME_PATTERNS.split(",") if pattern]
+
+        described = await asyncio.gather(
+            *(aws_cli_backend.describe_free_tier(region, settings.AMI_CATALOG_OWNERS, patterns) for region in regions),
+            return_exceptions=True,
+        )
+
+        entries = {
+            region: {"instance_types": current.instance_types[region], "amis": current.amis[region]}
+            for region in current.regions()
+        }
+        refreshed = 0
+        for region, result in zip(regions, described):
+            if isinstance(result, Exception):
+                logger.warning(f"AMI catalog refresh for {region} failed: {str(result)}")
+            elif not result["amis"] or not result["instance_types"]:
+                logger.warning(f"AMI catalog refresh for {region} returned no images or types; keeping previous")
+            else:
+                entries[region] = result
+                refreshed += 1
+
+        if not refreshed:
+            return current
+
+        snapshot = CatalogSnapshot(entries, source="describe-images")
+        # Readers hold a reference to whole snapshots, so a single assignment swaps atomically
+        self.snapshot = snapshot
+        logger.info(f"AMI catalog refreshed {refreshed}/{len(regions)} regions")
+        if self.path:
+            self._write(snapshot)
+        return snapshot
+
+    def _write(self, snapshot: CatalogSnapshot):
+        """Write the snapshot file through a temporary file, so readers never see half of it."""
+        try:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(snapshot.to_dict(), f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"Failed to write AMI catalog {self.path}: {str(e)}")
+
+
+ami_catalog = AmiCatalog()
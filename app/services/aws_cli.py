@@ -1,18 +1,103 @@
-import subprocess
+import asyncio
 import json
 import os
-from typing import Dict, Any, List
+import signal
+import time
+import uuid
+from typing import Dict, Any, AsyncIterator, List, Optional
+from app.config import settings
+from app.services.breaker import AwsError, circuit_breakers, parse_cli_error_code
+from app.services.cache import TTLCache
+from app.services.metrics import SCRIPT_SECONDS, SUBPROCESSES_IN_FLIGHT, SUBPROCESSES_WAITING
+from app.services.throttle import aws_scheduler
+from app.services.tracing import span
+from app.services.waiter import InstanceWaiter
 import logging
 
 logger = logging.getLogger(__name__)
 
+# The EC2 action budget each script's calls are scheduled under
+SCRIPT_ACTIONS = {
+    "create_instance.sh": "run",
+    "start_instance.sh": "start",
+    "stop_instance.sh": "stop",
+    "destroy_instance.sh": "terminate",
+    "describe_instances.sh": "describe",
+    "list_instances.sh": "describe",
+    "describe_images.sh": "describe",
+}
+
+# Scripts behind a breaker of their own, so their failures never make instance calls fail fast
+SCRIPT_BREAKERS = {
+    "describe_images.sh": "catalog",
+}
+
 
 class AwsCliBackend:
-    def __init__(self, scripts_dir: str = "aws_cli_bash_scripts"):
+    name = "awscli"
+
+    def __init__(self, scripts_dir: str = "aws_cli_bash_scripts", max_concurrency: int = None):
         self.scripts_dir = scripts_dir
+        if max_concurrency is None:
+            max_concurrency = settings.AWS_CLI_MAX_CONCURRENCY
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._instance_cache = TTLCache(
+            maxsize=settings.INSTANCE_CACHE_MAX_SIZE,
+            ttl=settings.INSTANCE_CACHE_TTL_SECONDS,
+        )
+        self.waiters: Dict[str, InstanceWaiter] = {}
+
+    def waiter(self, region: str = None) -> InstanceWaiter:
+        """The shared waiter for one region, whose describe calls all target that region."""
+        region = region or settings.AWS_DEFAULT_REGION
+        if region not in self.waiters:
+            self.waiters[region] = InstanceWaiter(
+                lambda instance_ids: self.describe_instances(instance_ids, region=region),
+                f"{self.name}/{region}",
+            )
+        return self.waiters[region]
+
+    def _script_timeout(self, script_name: str) -> int:
+        """Return the execution timeout in seconds for a script."""
+        return settings.AWS_CLI_SCRIPT_TIMEOUTS.get(script_name, settings.AWS_CLI_TIMEOUT)
 
-    def _run_script(self, script_name: str, args: List[str] = None) -> Dict[str, Any]:
-        """Run a bash script and return parsed output."""
+    @staticmethod
+    async def _stream_stderr(script_name: str, stream: asyncio.StreamReader, lines: List[str]):
+        """Log stderr line by line as the script produces it."""
+        while True:
+            line = await stream.readline()
+            if not line:
+                break
+            text = line.decode(errors="replace").rstrip()
+            lines.append(text)
+            logger.info(f"[{script_name}] {text}")
+
+    @staticmethod
+    async def _kill(proc: asyncio.subprocess.Process):
+        """Kill the script and every aws CLI process it spawned."""
+        if proc.returncode is not None:
+            return
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await proc.wait()
+
+    async def _run_script(self, script_name: str, args: List[str] = None, timeout: Optional[float] = None,
+                          region: str = None, env: Dict[str, str] = None) -> Dict[str, Any]:
+        """Run a bash script behind the region's circuit breaker and within its EC2 action budget."""
+        region = region or settings.AWS_DEFAULT_REGION
+        breaker = f"{self.name}-{SCRIPT_BREAKERS[script_name]}" if script_name in SCRIPT_BREAKERS else self.name
+        with span("aws_cli", script=script_name, region=region):
+            return await circuit_breakers.call(breaker, region, lambda: aws_scheduler.call(
+                SCRIPT_ACTIONS.get(script_name, script_name),
+                region,
+                lambda: self._exec_script(script_name, args, timeout, region, env),
+            ))
+
+    async def _exec_script(self, script_name: str, args: List[str] = None, timeout: Optional[float] = None,
+                           region: str = None, env: Dict[str, str] = None) -> Dict[str, Any]:
+        """Run a bash script against a region without blocking the event loop and return parsed output."""
         script_path = os.path.join(self.scripts_dir, script_name)
 
         if not os.path.exists(script_path):
@@ -22,90 +107,240 @@ class AwsCliBackend:
         if args:
             cmd.extend(args)
 
+        if timeout is None:
+            timeout = self._script_timeout(script_name)
+
+        # The aws CLI in the script picks the region up from the environment
+        env = {**os.environ, **(env or {}), "AWS_REGION": region, "AWS_DEFAULT_REGION": region}
+
+        SUBPROCESSES_WAITING.inc()
         try:
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=300,
-            )
+            with span("aws_cli.slot"):
+                await self._semaphore.acquire()
+        finally:
+            SUBPROCESSES_WAITING.dec()
 
-            if result.returncode != 0:
-                logger.error(f"Script error: {result.stderr}")
-                raise RuntimeError(f"Script failed: {result.stderr}")
+        outcome = "error"
+        start = time.perf_counter()
+        try:
+            with span("aws_cli.spawn"):
+                proc = await asyncio.create_subprocess_exec(
+                    *cmd,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    start_new_session=True,
+                    env=env,
+                )
+            SUBPROCESSES_IN_FLIGHT.inc()
+            stderr_lines: List[str] = []
 
-            return {"output": result.stdout.strip(), "error": None}
+            async def communicate() -> bytes:
+                stdout, _ = await asyncio.gather(
+                    proc.stdout.read(),
+                    self._stream_stderr(script_name, proc.stderr, stderr_lines),
+                )
+                await proc.wait()
+                return stdout
 
-        except subprocess.TimeoutExpired:
-            raise RuntimeError("Script execution timed out")
-        except Exception as e:
-            logger.error(f"Failed to execute script: {str(e)}")
-            raise
+            try:
+                with span("aws_cli.run"):
+                    stdout = await asyncio.wait_for(communicate(), timeout=timeout)
+            except asyncio.TimeoutError:
+                outcome = "timeout"
+                await self._kill(proc)
+                logger.error(f"Script timed out after {timeout}s: {script_name}")
+                raise RuntimeError("Script execution timed out")
+            except asyncio.CancelledError:
+                outcome = "cancelled"
+                await self._kill(proc)
+                logger.warning(f"Script cancelled: {script_name}")
+                raise
+            finally:
+                SUBPROCESSES_IN_FLIGHT.dec()
 
-    def create(self, name: str, ami: str, instance_type: str, storage_gb: int) -> Dict[str, str]:
+            stderr = "\n".join(stderr_lines)
+            if proc.returncode != 0:
+                logger.error(f"Script error: {stderr}")
+                raise AwsError(f"Script failed: {stderr}", code=parse_cli_error_code(stderr))
+
+            outcome = "ok"
+            return {"output": stdout.decode(errors="replace").strip(), "error": None}
+        finally:
+            self._semaphore.release()
+            SCRIPT_SECONDS.observe(time.perf_counter() - start, script=script_name, outcome=outcome)
+
+    async def create(self, name: str, ami: str, instance_type: str, storage_gb: int,
+                     region: str = None, client_token: str = None) -> Dict[str, str]:
         """Create an EC2 instance via AWS CLI."""
-        result = self._run_script("create_instance.sh", [name, ami, instance_type, str(storage_gb)])
+        return (await self.create_many([name], ami, instance_type, storage_gb, region=region,
+                                       client_token=client_token))[0]
+
+    async def create_many(self, names: List[str], ami: str, instance_type: str,
+                          storage_gb: int, region: str = None, client_token: str = None) -> List[Dict[str, str]]:
+        """Create one instance per name with a single run-instances call."""
+        # The client token makes a retried run-instances return the first call's instances
+        result = await self._run_script(
+            "create_instance.sh", [names[0], ami, instance_type, str(storage_gb), *names[1:]], region=region,
+            env={"CLIENT_TOKEN": client_token or uuid.uuid4().hex},
+        )
         output = result["output"]
 
-        # Parse output: expected format "instance_id|public_ip"
+        # Parse output: expected format "instance_id|public_ip|state", one line per instance
         try:
-            parts = output.split("|")
-            instance_id = parts[0].strip()
-            public_ip = parts[1].strip() if len(parts) > 1 else ""
-            return {"id": instance_id, "public_ip": public_ip}
+            instances = []
+            for line in output.splitlines():
+                if "|" not in line:
+                    continue
+                parts = [part.strip() for part in line.split("|")]
+                instances.append({
+                    "id": parts[0],
+                    "public_ip": "" if parts[1] == "None" else parts[1],
+                    "state": parts[2] if len(parts) > 2 else "pending",
+                })
         except Exception as e:
             logger.error(f"Failed to parse create output: {output}")
             raise RuntimeError(f"Failed to parse instance creation response: {str(e)}")
 
-    def list_instances(self) -> List[Dict[str, str]]:
-        """List all EC2 instances."""
-        result = self._run_script("list_instances.sh")
-        output = result["output"]
+        if len(instances) != len(names):
+            logger.error(f"Failed to parse create output: {output}")
+            raise RuntimeError(f"Expected {len(names)} instances, AWS returned {len(instances)}")
 
-        # Parse AWS CLI JSON output
-        try:
-            # AWS CLI describe-instances returns JSON
-            data = json.loads(output)
-            instances = []
+        for instance, name in zip(instances, names):
+            instance["name"] = name
 
-            for reservation in data.get("Reservations", []):
-                for instance in reservation.get("Instances", []):
-                    instances.append({
-                        "id": instance.get("InstanceId", ""),
-                        "state": instance.get("State", {}).get("Name", ""),
-                        "public_ip": instance.get("PublicIpAddress", ""),
-                        "instance_type": instance.get("InstanceType", ""),
-                        "ami": instance.get("ImageId", ""),
-                        "launch_time": instance.get("LaunchTime", ""),
-                    })
-
-            return instances
+        # Resolve public IPs through the shared waiter, batched with every other pending create
+        missing = [instance["id"] for instance in instances if not instance["public_ip"]]
+        if missing:
+            latest = await self.waiter(region).wait_for_public_ip(missing)
+            for instance in instances:
+                if instance["id"] in latest:
+                    instance["public_ip"] = latest[instance["id"]]["public_ip"]
+                    instance["state"] = latest[instance["id"]]["state"]
+        return instances
+
+    @staticmethod
+    def _parse_instances(rows: List[List[Any]]) -> List[Dict[str, str]]:
+        """Convert [InstanceId, State, PublicIp, InstanceType, ImageId, LaunchTime] rows."""
+        instances = []
+        for instance_id, state, public_ip, instance_type, ami, launch_time in rows:
+            instances.append({
+                "id": instance_id or "",
+                "state": state or "",
+                "public_ip": public_ip or "",
+                "instance_type": instance_type or "",
+                "ami": ami or "",
+                "launch_time": launch_time or "",
+            })
+        return instances
+
+    async def iter_instances(self, states: List[str] = None, tags: Dict[str, str] = None,
+                             page_size: int = None, region: str = None) -> AsyncIterator[Dict[str, str]]:
+        """Yield EC2 instances page by page, with state and tag filters applied by AWS."""
+        args = []
+        for state in states or []:
+            args.extend(["--state", state])
+        for key, value in (tags or {}).items():
+            args.extend(["--tag", f"{key}={value}"])
+        args.extend(["--page-size", str(page_size or settings.LIST_PAGE_SIZE)])
+
+        token = None
+        while True:
+            result = await self._run_script(
+                "list_instances.sh", args + (["--starting-token", token] if token else []), region=region,
+            )
+            output = result["output"]
+            try:
+                page = json.loads(output)
+                instances = self._parse_instances(page.get("Instances") or [])
+            except Exception as e:
+                logger.error(f"Failed to parse list output: {output[:500]}")
+                raise RuntimeError(f"Failed to parse instances list: {str(e)}")
+
+            for instance in instances:
+                yield instance
+
+            token = page.get("NextToken")
+            if not token:
+                break
+
+    async def list_instances(self, states: List[str] = None, tags: Dict[str, str] = None,
+                             region: str = None) -> List[Dict[str, str]]:
+        """List all EC2 instances in a region."""
+        return [instance async for instance in self.iter_instances(states, tags, region=region)]
+
+    async def describe_instances(self, instance_ids: List[str], region: str = None) -> List[Dict[str, str]]:
+        """Describe only the given instances with one targeted describe-instances call."""
+        result = await self._run_script("describe_instances.sh", instance_ids, region=region)
+        output = result["output"]
+        try:
+            return self._parse_instances(json.loads(output) if output else [])
         except Exception as e:
-            logger.error(f"Failed to parse list output: {output}")
+            logger.error(f"Failed to parse describe output: {output[:500]}")
             raise RuntimeError(f"Failed to parse instances list: {str(e)}")
 
-    def get_instance(self, instance_id: str) -> Dict[str, str]:
-        """Get details of a specific instance."""
-        instances = self.list_instances()
+    async def describe_free_tier(self, region: str, owners: str, name_patterns: List[str]) -> Dict[str, List[str]]:
+        """Return {"instance_types": [...], "amis": [...]} eligible for the free tier in one region."""
+        result = await self._run_script("describe_images.sh", [region, owners, *name_patterns], region=region)
+        output = result["output"]
+        try:
+            described = json.loads(output)
+            return {"instance_types": described["instance_types"] or [], "amis": described["amis"] or []}
+        except Exception as e:
+            logger.error(f"Failed to parse describe-images output: {output[:500]}")
+            raise RuntimeError(f"Failed to parse free tier catalog: {str(e)}")
+
+    async def _describe_one(self, instance_id: str, region: str = None) -> Dict[str, str]:
+        instances = await self.describe_instances([instance_id], region=region)
         for inst in instances:
             if inst["id"] == instance_id:
                 return inst
         raise RuntimeError(f"Instance not found: {instance_id}")
 
-    def start(self, instance_id: str) -> Dict[str, str]:
+    async def get_instance(self, instance_id: str, region: str = None) -> Dict[str, str]:
+        """Get details of a specific instance, served from a short-lived cache."""
+        return await self._instance_cache.get_or_load(instance_id, lambda: self._describe_one(instance_id, region))
+
+    def _invalidate(self, instance_ids: List[str]):
+        for instance_id in instance_ids:
+            self._instance_cache.invalidate(instance_id)
+
+    async def start(self, instance_id: str, region: str = None) -> Dict[str, str]:
         """Start a stopped EC2 instance."""
-        self._run_script("start_instance.sh", [instance_id])
-        return {"state": "running", "id": instance_id}
+        return (await self.start_many([instance_id], region=region))[0]
 
-    def stop(self, instance_id: str) -> Dict[str, str]:
+    async def stop(self, instance_id: str, region: str = None) -> Dict[str, str]:
         """Stop a running EC2 instance."""
-        self._run_script("stop_instance.sh", [instance_id])
-        return {"state": "stopped", "id": instance_id}
+        return (await self.stop_many([instance_id], region=region))[0]
 
-    def destroy(self, instance_id: str) -> Dict[str, str]:
+    async def destroy(self, instance_id: str, region: str = None) -> Dict[str, str]:
         """Terminate an EC2 instance."""
-        self._run_script("destroy_instance.sh", [instance_id])
-        return {"state": "terminated", "id": instance_id}
+        return (await self.destroy_many([instance_id], region=region))[0]
+
+    async def start_many(self, instance_ids: List[str], region: str = None) -> List[Dict[str, str]]:
+        """Start several instances with one start-instances call, then wait on the shared waiter."""
+        try:
+            await self._run_script("start_instance.sh", instance_ids, region=region)
+            await self.waiter(region).wait_for_state(instance_ids, "running")
+        finally:
+            self._invalidate(instance_ids)
+        return [{"state": "running", "id": instance_id} for instance_id in instance_ids]
+
+    async def stop_many(self, instance_ids: List[str], region: str = None) -> List[Dict[str, str]]:
+        """Stop several instances with one stop-instances call, then wait on the shared waiter."""
+        try:
+            await self._run_script("stop_instance.sh", instance_ids, region=region)
+            await self.waiter(region).wait_for_state(instance_ids, "stopped")
+        finally:
+            self._invalidate(instance_ids)
+        return [{"state": "stopped", "id": instance_id} for instance_id in instance_ids]
+
+    async def destroy_many(self, instance_ids: List[str], region: str = None) -> List[Dict[str, str]]:
+        """Terminate several instances with one terminate-instances call."""
+        try:
+            await self._run_script("destroy_instance.sh", instance_ids, region=region)
+        finally:
+            self._invalidate(instance_ids)
+        return [{"state": "terminated", "id": instance_id} for instance_id in instance_ids]
 
 
 aws_cli_backend = AwsCliBackend()
@@ -0,0 +1,14 @@
+from typing import Dict, Optional
+from app.config import settings
+from app.services.aws_cli import aws_cli_backend
+from app.services.ec2_api import ec2_api_backend
+
+BACKENDS: Dict[str, object] = {
+    aws_cli_backend.name: aws_cli_backend,
+    ec2_api_backend.name: ec2_api_backend,
+}
+
+
+def resolve_backend(name: Optional[str] = None):
+    """Return the named backend, or the configured default; raise KeyError if unknown."""
+    return BACKENDS[name or settings.DEFAULT_BACKEND]
@@ -0,0 +1,193 @@
+import asyncio
+import re
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple, TypeVar
+from app.config import settings
+from app.services.throttle import ThrottledError
+import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Errors AWS returns for a bad request rather than an unhealthy backend; they prove AWS is reachable.
+# Matched against the code before any ".Suffix", e.g. InvalidInstanceID.NotFound
+CLIENT_ERROR_CODES = frozenset({
+    "InvalidInstanceID", "IncorrectInstanceState", "InvalidParameter", "InvalidParameterValue",
+    "InvalidParameterCombination", "InvalidAMIID", "MissingParameter", "InvalidGroup",
+    "InvalidKeyPair", "DryRunOperation",
+})
+
+# How the aws CLI reports an API error on stderr
+_CLI_ERROR_CODE = re.compile(r"An error occurred \(([A-Za-z0-9.]+)\)")
+
+
+class AwsError(RuntimeError):
+    """A call AWS answered with an error; code is the EC2 error code, e.g. InvalidInstanceID.NotFound."""
+
+    def __init__(self, message: str, code: Optional[str] = None):
+        super().__init__(message)
+        self.code = code
+
+
+def parse_cli_error_code(stderr: str) -> Optional[str]:
+    """The error code from aws CLI output, or None if it did not report an API error."""
+    match = _CLI_ERROR_CODE.search(stderr)
+    return match.group(1) if match else None
+
+
+class BreakerOpenError(RuntimeError):
+    """A backend call rejected without trying, because its circuit breaker is open."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker for one backend in one region.
+
+    Closed: calls go through, and BREAKER_FAILURE_THRESHOLD failures or timeouts in a
+    row open it. Open: calls fail at once for BREAKER_RESET_SECONDS. Half-open: up to
+    BREAKER_HALF_OPEN_TRIALS calls go through as probes; a success closes the breaker,
+    a failure opens it again.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        self.failures = 0
+        self.trials = 0
+        self.trips = 0
+        self.opened_at: Optional[float] = None
+        self.opened_since: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+
+    def _retry_after(self) -> float:
+        return max(0.0, self.opened_at + settings.BREAKER_RESET_SECONDS - time.monotonic())
+
+    def check(self):
+        """Raise BreakerOpenError while open, without taking a half-open probe slot."""
+        if self.state == OPEN and self._retry_after() > 0:
+            raise BreakerOpenError(
+                f"{self.name} is unavailable after repeated failures ({self.last_error}); "
+                f"retry in {self._retry_after():.0f}s",
+                retry_after=self._retry_after(),
+            )
+
+    def before_call(self):
+        """Let the call through, or raise BreakerOpenError."""
+        self.check()
+        if self.state == OPEN:
+            self.state = HALF_OPEN
+            self.trials = 0
+            logger.info(f"Circuit breaker {self.name} half-open, probing")
+        if self.state == HALF_OPEN:
+            if self.trials >= settings.BREAKER_HALF_OPEN_TRIALS:
+                raise BreakerOpenError(f"{self.name} is being probed for recovery; retry shortly", retry_after=1)
+            self.trials += 1
+
+    def record_success(self):
+        if self.state != CLOSED:
+            logger.info(f"Circuit breaker {self.name} closed")
+        self.state = CLOSED
+        self.failures = 0
+        self.trials = 0
+        self.opened_at = None
+        self.opened_since = None
+
+    def record_failure(self, error: Exception):
+        self.failures += 1
+        self.last_error = str(error)[:200]
+        if self.state == HALF_OPEN or self.failures >= settings.BREAKER_FAILURE_THRESHOLD:
+            if self.state != OPEN:
+                self.trips += 1
+                logger.error(f"Circuit breaker {self.name} open after {self.failures} failures: {self.last_error}")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self.opened_since = self.opened_since or datetime.utcnow()
+
+    def record_neutral(self):
+        """A call that says nothing about backend health (cancelled, or rejected by our own budget)."""
+        if self.state == HALF_OPEN:
+            self.trials = max(0, self.trials - 1)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "trips": self.trips,
+            "open_since": self.opened_since.isoformat() if self.opened_since else None,
+            "retry_at": (
+                (datetime.utcnow() + timedelta(seconds=self._retry_after())).isoformat()
+                if self.state == OPEN else None
+            ),
+            "last_error": self.last_error,
+        }
+
+
+def _is_backend_failure(error: Exception) -> bool:
+    code = getattr(error, "code", None)
+    return not code or code.split(".", 1)[0] not in CLIENT_ERROR_CODES
+
+
+class CircuitBreakers:
+    """One CircuitBreaker per (backend, region), created on first use."""
+
+    def __init__(self):
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+
+    def get(self, backend: str, region: str) -> CircuitBreaker:
+        key = (backend, region)
+        if key not in self._breakers:
+            self._breakers[key] = CircuitBreaker(f"{backend}/{region}")
+        return self._breakers[key]
+
+    async def call(self, backend: str, region: str, operation: Callable[[], Awaitable[T]]) -> T:
+        """Run operation unless the breaker is open, and record how it went.
+
+        A call cancelled after BREAKER_HUNG_CALL_SECONDS counts as a failure: clients give up on
+        a hung AWS call long before the script timeout would record one.
+        """
+        breaker = self.get(backend, region)
+        breaker.before_call()
+        started = time.monotonic()
+        try:
+            result = await operation()
+        except asyncio.CancelledError:
+            elapsed = time.monotonic() - started
+            if elapsed >= settings.BREAKER_HUNG_CALL_SECONDS:
+                breaker.record_failure(TimeoutError(f"call cancelled after hanging for {elapsed:.0f}s"))
+            else:
+                breaker.record_neutral()
+            raise
+        except ThrottledError:
+            breaker.record_neutral()
+            raise
+        except Exception as e:
+            if _is_backend_failure(e):
+                breaker.record_failure(e)
+            else:
+                breaker.record_success()
+            raise
+        breaker.record_success()
+        return result
+
+    def stale_keys(self) -> Set[Tuple[str, str]]:
+        """(backend, region) pairs whose breaker is not closed, so their stored rows may be out of date."""
+        return {key for key, breaker in list(self._breakers.items()) if breaker.state != CLOSED}
+
+    def stats(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        stats: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for (backend, region), breaker in sorted(self._breakers.items()):
+            stats.setdefault(backend, {})[region] = breaker.stats()
+        return stats
+
+
+circuit_breakers = CircuitBreakers()
@@ -1,16 +1,54 @@
 import sqlite3
+import json
 import os
+import queue
+import threading
+import uuid
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, Callable, Iterator, List, Dict, Any, Tuple
 from app.config import settings
+from app.models.instance import INSTANCE_FIELDS
+from app.services.cache import MISSING, TTLCache
+from app.services.metrics import DB_SECONDS, timed
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Column list that yields rows in InstanceResponse field order
+INSTANCE_COLUMNS = ", ".join(INSTANCE_FIELDS)
+
+# Called after every committed instance change with ("created" | "updated" | "deleted", records,
+# change sequence number of the first record; the rest follow consecutively). Updated records
+# carry only the id and the columns that changed, deleted ones only the id.
+ChangeListener = Callable[[str, List[Dict[str, Any]], int], None]
+
+# Builds the (status_code, body) an Idempotency-Key replays, from records that are about to commit
+IdempotentResponse = Callable[[], Tuple[int, Any]]
+
+# instances table columns, in the order _instance_row produces them
+TABLE_COLUMNS = (
+    "id", "name", "public_ip", "ami", "instance_type", "state", "ssh_string",
+    "security_group_id", "backend_used", "region", "created_at", "updated_at",
+)
 
 
 class Database:
-    def __init__(self, db_path: str = None):
+    def __init__(self, db_path: str = None, record_cache_size: int = None):
         if db_path is None:
             db_path = settings.DATABASE_URL
+        if record_cache_size is None:
+            record_cache_size = settings.DB_RECORD_CACHE_SIZE
         self.db_path = db_path
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=settings.DB_POOL_SIZE)
+        # Write-through instance records keyed by ID; None marks a deleted record
+        self._records = TTLCache(maxsize=record_cache_size)
+        self._records_lock = threading.Lock()
+        self._records_version = 0
+        self._listeners: List[ChangeListener] = []
+        # Bumped once per instance record inserted, updated or deleted; persisted in the meta table
+        self.change_seq = 0
         self._ensure_db_exists()
 
     def _ensure_db_exists(self):
@@ -22,6 +60,9 @@ class Database:
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
 
+        # WAL lets readers proceed while a writer commits; the setting persists in the file
+        cursor.execute("PRAGMA journal_mode = WAL")
+
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS instances (
                 id TEXT PRIMARY KEY,
@@ -34,30 +75,200 @@ class Database:
                 security_group_id TEXT,
                 backend_used TEXT,
                 created_at TIMESTAMP,
+                updated_at TIMESTAMP,
+                region TEXT
+            )
+        """)
+
+        # Databases created before multi-region support: records so far are all in the default region
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(instances)")}
+        if "region" not in columns:
+            cursor.execute("ALTER TABLE instances ADD COLUMN region TEXT")
+            cursor.execute("UPDATE instances SET region = ?", (settings.AWS_DEFAULT_REGION,))
+
+        # Indexes backing GET /instances keyset pagination and its filters
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_instances_created
+            ON instances (created_at DESC, id DESC)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_instances_state
+            ON instances (state, created_at DESC, id DESC)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_instances_type
+            ON instances (instance_type, created_at DESC, id DESC)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_instances_backend
+            ON instances (backend_used, created_at DESC, id DESC)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_instances_region
+            ON instances (region, created_at DESC, id DESC)
+        """)
+        # Combined filters Jenkins and the inventory views use together
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_instances_state_type
+            ON instances (state, instance_type, created_at DESC, id DESC)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_instances_region_state
+            ON instances (region, state, created_at DESC, id DESC)
+        """)
+        # name_prefix is a range, so a name-first index would still sort every match; walking the
+        # sort order and checking name inside the index stops after one page instead
+        cursor.execute("DROP INDEX IF EXISTS idx_instances_name")
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_instances_created_name
+            ON instances (created_at DESC, id DESC, name)
+        """)
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                operation TEXT NOT NULL,
+                status TEXT NOT NULL,
+                instance_id TEXT,
+                result TEXT,
+                error TEXT,
+                created_at TIMESTAMP,
+                updated_at TIMESTAMP
+            )
+        """)
+
+        # Counters that must survive restarts, e.g. the instance change sequence behind ETags
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        """)
+        cursor.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('change_seq', 0)")
+        self.change_seq = cursor.execute("SELECT value FROM meta WHERE key = 'change_seq'").fetchone()[0]
+
+        # Idempotency-Key -> stored POST /instances response, stored with the records it created
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS idempotency_keys (
+                key TEXT PRIMARY KEY,
+                request_hash TEXT NOT NULL,
+                status TEXT NOT NULL,
+                status_code INTEGER,
+                response TEXT,
+                instance_id TEXT,
+                created_at TIMESTAMP,
                 updated_at TIMESTAMP
             )
         """)
         conn.commit()
         conn.close()
 
-    def _get_connection(self):
-        """Get a database connection."""
-        conn = sqlite3.connect(self.db_path)
+    def _open_connection(self) -> sqlite3.Connection:
+        """Open a tuned connection for the pool."""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=settings.DB_BUSY_TIMEOUT_MS / 1000,
+            cached_statements=settings.DB_CACHED_STATEMENTS,
+            check_same_thread=False,
+        )
         conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {settings.DB_BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute(f"PRAGMA cache_size = -{settings.DB_CACHE_SIZE_KB}")
         return conn
 
-    def create_instance_record(self, instance_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Create a new instance record."""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a pooled connection; it goes back to the pool afterwards."""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._open_connection()
 
-        now = datetime.utcnow()
-        cursor.execute("""
-            INSERT INTO instances
-            (id, name, public_ip, ami, instance_type, state, ssh_string,
-             security_group_id, backend_used, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            try:
+                self._pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def close(self):
+        """Close every pooled connection."""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def record_cache_stats(self) -> Dict[str, int]:
+        """Hit/miss counters and size of the instance record cache."""
+        with self._records_lock:
+            return self._records.stats()
+
+    def _cached_records(self, instance_ids: List[str]) -> Tuple[Dict[str, Optional[Dict[str, Any]]], int]:
+        """Return cached records (copies) by ID and the cache version to pass to _fill_records."""
+        with self._records_lock:
+            found = {}
+            for instance_id in instance_ids:
+                record = self._records.get(instance_id)
+                if record is not MISSING:
+                    found[instance_id] = dict(record) if record else None
+            return found, self._records_version
+
+    def _fill_records(self, records: Dict[str, Optional[Dict[str, Any]]], version: int):
+        """Cache records read from disk, unless a write has happened since the read began."""
+        with self._records_lock:
+            if version == self._records_version:
+                for instance_id, record in records.items():
+                    self._records.set(instance_id, record)
+
+    def _write_records(self, records: Dict[str, Optional[Dict[str, Any]]]):
+        """Write committed records (None for deleted ones) through to the cache."""
+        with self._records_lock:
+            self._records_version += 1
+            for instance_id, record in records.items():
+                self._records.set(instance_id, record)
+
+    def _patch_records(self, changes: Dict[str, Dict[str, Any]]):
+        """Apply committed column changes to cached records; uncached IDs are left to the next read."""
+        with self._records_lock:
+            self._records_version += 1
+            for instance_id, change in changes.items():
+                record = self._records.peek(instance_id)
+                if record is not MISSING and record is not None:
+                    self._records.set(instance_id, {**record, **change})
+
+    def add_listener(self, listener: ChangeListener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: ChangeListener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    @staticmethod
+    def _bump_change_seq(cursor: sqlite3.Cursor, count: int) -> int:
+        """Advance the change sequence by count inside the caller's transaction; return the new value."""
+        return cursor.execute(
+            "UPDATE meta SET value = value + ? WHERE key = 'change_seq' RETURNING value", (count,)
+        ).fetchone()[0]
+
+    def _notify(self, kind: str, records: List[Dict[str, Any]], seq: int):
+        """Publish committed changes; seq is the value _bump_change_seq returned for them."""
+        self.change_seq = max(self.change_seq, seq)
+        for listener in self._listeners:
+            try:
+                listener(kind, records, seq - len(records) + 1)
+            except Exception as e:
+                logger.error(f"Instance change listener failed: {str(e)}")
+
+    @staticmethod
+    def _instance_row(instance_data: Dict[str, Any], now: datetime) -> tuple:
+        return (
             instance_data["id"],
             instance_data["name"],
             instance_data.get("public_ip", ""),
@@ -67,68 +278,444 @@ class Database:
             instance_data.get("ssh_string", ""),
             instance_data.get("security_group_id", ""),
             instance_data.get("backend_used", ""),
+            instance_data.get("region") or settings.AWS_DEFAULT_REGION,
             now,
             now,
-        ))
-        conn.commit()
-        conn.close()
+        )
+
+    @timed(DB_SECONDS, span_prefix="db")
+    def create_instance_record(self, instance_data: Dict[str, Any], idempotency_key: str = None,
+                               response: IdempotentResponse = None) -> Dict[str, Any]:
+        """Create a new instance record."""
+        self.create_instance_records([instance_data], idempotency_key, response)
         return instance_data
 
+    @timed(DB_SECONDS, span_prefix="db")
+    def create_instance_records(self, instances: List[Dict[str, Any]], idempotency_key: str = None,
+                                response: IdempotentResponse = None) -> List[Dict[str, Any]]:
+        """Create several instance records with one multi-row insert.
+
+        With idempotency_key, the (status_code, body) that response() builds from the stored
+        records completes the key in the same transaction.
+        """
+        with self._connection() as conn:
+            cursor = conn.cursor()
+
+            now = datetime.utcnow()
+            rows = [self._instance_row(instance_data, now) for instance_data in instances]
+            cursor.executemany("""
+                INSERT INTO instances
+                (id, name, public_ip, ami, instance_type, state, ssh_string,
+                 security_group_id, backend_used, region, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            seq = self._bump_change_seq(cursor, len(rows))
+            for instance_data, row in zip(instances, rows):
+                instance_data["region"] = row[9]
+                instance_data["created_at"] = instance_data["updated_at"] = now
+            if idempotency_key is not None:
+                status_code, body = response()
+                self._complete_idempotency_key(cursor, idempotency_key, status_code, body, rows[0][0])
+            conn.commit()
+
+        # Cache the rows as SQLite returns them, timestamps as text
+        records = {
+            row[0]: dict(zip(TABLE_COLUMNS, row[:-2] + (str(now), str(now))))
+            for row in rows
+        }
+        self._write_records(records)
+        self._notify("created", [dict(record) for record in records.values()], seq)
+        return instances
+
+    @timed(DB_SECONDS, span_prefix="db")
     def get_instance(self, instance_id: str) -> Optional[Dict[str, Any]]:
         """Get a single instance by ID."""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        cached, version = self._cached_records([instance_id])
+        if instance_id in cached:
+            return cached[instance_id]
 
-        cursor.execute("SELECT * FROM instances WHERE id = ?", (instance_id,))
-        row = cursor.fetchone()
-        conn.close()
+        with self._connection() as conn:
+            cursor = conn.cursor()
 
-        if row:
-            return dict(row)
-        return None
+            cursor.execute("SELECT * FROM instances WHERE id = ?", (instance_id,))
+            row = cursor.fetchone()
 
-    def list_instances(self) -> List[Dict[str, Any]]:
-        """List all instances."""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        record = dict(row) if row else None
+        self._fill_records({instance_id: record}, version)
+        return dict(record) if record else None
 
-        cursor.execute("SELECT * FROM instances ORDER BY created_at DESC")
-        rows = cursor.fetchall()
-        conn.close()
+    @timed(DB_SECONDS, span_prefix="db")
+    def get_instances(self, instance_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get several instances by ID in one query, keyed by ID."""
+        cached, version = self._cached_records(instance_ids)
+        missing = [instance_id for instance_id in instance_ids if instance_id not in cached]
+        found = {instance_id: record for instance_id, record in cached.items() if record}
+        if not missing:
+            return found
+
+        with self._connection() as conn:
+            cursor = conn.cursor()
+
+            placeholders = ", ".join("?" for _ in missing)
+            cursor.execute(f"SELECT * FROM instances WHERE id IN ({placeholders})", missing)
+            rows = cursor.fetchall()
+
+        loaded = dict.fromkeys(missing)
+        loaded.update((row["id"], dict(row)) for row in rows)
+        self._fill_records(loaded, version)
+        found.update((instance_id, dict(record)) for instance_id, record in loaded.items() if record)
+        return found
+
+    @staticmethod
+    def _list_query(state: str = None, name_prefix: str = None, instance_type: str = None,
+                    backend_used: str = None, after: Tuple[str, str] = None,
+                    limit: int = None, columns: str = "*", region: str = None) -> Tuple[str, List[Any]]:
+        """Build the filtered, newest-first keyset query over instances."""
+        clauses = []
+        params: List[Any] = []
+
+        if state:
+            clauses.append("state = ?")
+            params.append(state)
+        if instance_type:
+            clauses.append("instance_type = ?")
+            params.append(instance_type)
+        if backend_used:
+            clauses.append("backend_used = ?")
+            params.append(backend_used)
+        if region:
+            clauses.append("region = ?")
+            params.append(region)
+        if name_prefix:
+            # A range instead of LIKE, checked against the name held in idx_instances_created_name
+            clauses.append("name >= ? AND name < ?")
+            params.extend([name_prefix, name_prefix[:-1] + chr(ord(name_prefix[-1]) + 1)])
+        if after:
+            clauses.append("(created_at, id) < (?, ?)")
+            params.extend(after)
+
+        sql = f"SELECT {columns} FROM instances"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY created_at DESC, id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return sql, params
+
+    @timed(DB_SECONDS, span_prefix="db")
+    def list_instances(self, state: str = None, name_prefix: str = None, instance_type: str = None,
+                       backend_used: str = None, after: Tuple[str, str] = None,
+                       limit: int = None, region: str = None) -> List[Dict[str, Any]]:
+        """List instances newest first, optionally filtered and paged after a (created_at, id) key."""
+        sql, params = self._list_query(state, name_prefix, instance_type, backend_used, after, limit,
+                                       region=region)
+        with self._connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
 
         return [dict(row) for row in rows]
 
+    @timed(DB_SECONDS, span_prefix="db")
+    def list_instance_rows(self, state: str = None, name_prefix: str = None, instance_type: str = None,
+                           backend_used: str = None, after: Tuple[str, str] = None,
+                           limit: int = None, region: str = None) -> List[tuple]:
+        """Like list_instances, but as plain tuples in INSTANCE_FIELDS order for the response path."""
+        sql, params = self._list_query(state, name_prefix, instance_type, backend_used, after, limit,
+                                       columns=INSTANCE_COLUMNS, region=region)
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def iter_instances(self, state: str = None, name_prefix: str = None, instance_type: str = None,
+                       backend_used: str = None, after: Tuple[str, str] = None,
+                       chunk_size: int = 500, region: str = None) -> Iterator[List[tuple]]:
+        """Yield matching instance rows (tuples in INSTANCE_FIELDS order) in chunks straight from the cursor."""
+        sql, params = self._list_query(state, name_prefix, instance_type, backend_used, after,
+                                       columns=INSTANCE_COLUMNS, region=region)
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute(sql, params)
+            try:
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield rows
+            finally:
+                cursor.close()
+
+    @timed(DB_SECONDS, span_prefix="db")
     def update_instance_state(self, instance_id: str, state: str, public_ip: str = None) -> Optional[Dict[str, Any]]:
         """Update instance state and optionally public IP."""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        with self._connection() as conn:
+            cursor = conn.cursor()
+
+            now = datetime.utcnow()
+            if public_ip:
+                cursor.execute("""
+                    UPDATE instances SET state = ?, public_ip = ?, updated_at = ? WHERE id = ?
+                """, (state, public_ip, now, instance_id))
+            else:
+                cursor.execute("""
+                    UPDATE instances SET state = ?, updated_at = ? WHERE id = ?
+                """, (state, now, instance_id))
 
-        now = datetime.utcnow()
+            seq = self._bump_change_seq(cursor, 1)
+            conn.commit()
+
+        change = {"state": state, "updated_at": str(now)}
         if public_ip:
-            cursor.execute("""
-                UPDATE instances SET state = ?, public_ip = ?, updated_at = ? WHERE id = ?
-            """, (state, public_ip, now, instance_id))
-        else:
-            cursor.execute("""
+            change["public_ip"] = public_ip
+        self._patch_records({instance_id: change})
+        self._notify("updated", [{"id": instance_id, **change}], seq)
+        return self.get_instance(instance_id)
+
+    @timed(DB_SECONDS, span_prefix="db")
+    def update_instances_state(self, instance_ids: List[str], state: str) -> Dict[str, Dict[str, Any]]:
+        """Update the state of several instances in a single transaction."""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+
+            now = datetime.utcnow()
+            cursor.executemany("""
                 UPDATE instances SET state = ?, updated_at = ? WHERE id = ?
-            """, (state, now, instance_id))
+            """, [(state, now, instance_id) for instance_id in instance_ids])
 
-        conn.commit()
-        conn.close()
+            seq = self._bump_change_seq(cursor, len(instance_ids))
+            conn.commit()
 
-        return self.get_instance(instance_id)
+        change = {"state": state, "updated_at": str(now)}
+        self._patch_records({instance_id: change for instance_id in instance_ids})
+        self._notify("updated", [{"id": instance_id, **change} for instance_id in instance_ids], seq)
+        return self.get_instances(instance_ids)
+
+    @timed(DB_SECONDS, span_prefix="db")
+    def apply_instance_changes(self, changes: List[Dict[str, Any]]) -> int:
+        """Apply reconciled state/public IP changes in a single transaction; return how many applied.
+
+        Each change only applies if the row still has its expected_state and expected_public_ip,
+        so a start, stop or create committed while the sweep described AWS is not overwritten.
+        """
+        with self._connection() as conn:
+            cursor = conn.cursor()
+
+            now = datetime.utcnow()
+            applied = []
+            for change in changes:
+                cursor.execute("""
+                    UPDATE instances SET state = ?, public_ip = ?, ssh_string = ?, updated_at = ?
+                    WHERE id = ? AND state = ? AND COALESCE(public_ip, '') = ?
+                """, (
+                    change["state"], change["public_ip"], change["ssh_string"], now,
+                    change["id"], change["expected_state"], change["expected_public_ip"],
+                ))
+                if cursor.rowcount:
+                    applied.append(change)
+
+            if not applied:
+                conn.rollback()
+                return 0
+            seq = self._bump_change_seq(cursor, len(applied))
+            conn.commit()
 
+        patches = {
+            change["id"]: {
+                "state": change["state"],
+                "public_ip": change["public_ip"],
+                "ssh_string": change["ssh_string"],
+                "updated_at": str(now),
+            }
+            for change in applied
+        }
+        self._patch_records(patches)
+        self._notify("updated", [{"id": instance_id, **patch} for instance_id, patch in patches.items()], seq)
+        return len(applied)
+
+    @timed(DB_SECONDS, span_prefix="db")
     def delete_instance_record(self, instance_id: str) -> bool:
         """Delete an instance record."""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        with self._connection() as conn:
+            cursor = conn.cursor()
 
-        cursor.execute("DELETE FROM instances WHERE id = ?", (instance_id,))
-        conn.commit()
-        conn.close()
+            cursor.execute("DELETE FROM instances WHERE id = ?", (instance_id,))
+            seq = self._bump_change_seq(cursor, 1)
+            conn.commit()
+
+        self._write_records({instance_id: None})
+        self._notify("deleted", [{"id": instance_id}], seq)
+        return True
+
+    @timed(DB_SECONDS, span_prefix="db")
+    def delete_instance_records(self, instance_ids: List[str]) -> bool:
+        """Delete several instance records in a single transaction."""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.executemany("DELETE FROM instances WHERE id = ?", [(instance_id,) for instance_id in instance_ids])
+            seq = self._bump_change_seq(cursor, len(instance_ids))
+            conn.commit()
 
+        self._write_records(dict.fromkeys(instance_ids))
+        self._notify("deleted", [{"id": instance_id} for instance_id in instance_ids], seq)
         return True
 
+    @staticmethod
+    def _job_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    @timed(DB_SECONDS, span_prefix="db")
+    def create_job(self, operation: str, instance_id: str = None) -> Dict[str, Any]:
+        """Create a queued job record."""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+
+            job_id = uuid.uuid4().hex
+            now = datetime.utcnow()
+            cursor.execute("""
+                INSERT INTO jobs (id, operation, status, instance_id, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (job_id, operation, "queued", instance_id, now, now))
+            conn.commit()
+
+            cursor.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+
+        return self._job_dict(row)
+
+    @timed(DB_SECONDS, span_prefix="db")
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a single job by ID."""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+
+        if row:
+            return self._job_dict(row)
+        return None
+
+    @timed(DB_SECONDS, span_prefix="db")
+    def update_job(self, job_id: str, status: str, result: Any = None, error: str = None,
+                   instance_id: str = None) -> None:
+        """Record job progress, its result or its error."""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute("""
+                UPDATE jobs
+                SET status = ?, result = COALESCE(?, result), error = COALESCE(?, error),
+                    instance_id = COALESCE(?, instance_id), updated_at = ?
+                WHERE id = ?
+            """, (
+                status,
+                json.dumps(result) if result is not None else None,
+                error,
+                instance_id,
+                datetime.utcnow(),
+                job_id,
+            ))
+            conn.commit()
+
+    @timed(DB_SECONDS, span_prefix="db")
+    def fail_unfinished_jobs(self, error: str) -> int:
+        """Mark queued or running jobs as failed, e.g. after a restart lost their workers."""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute("""
+                UPDATE jobs SET status = 'failed', error = ?, updated_at = ?
+                WHERE status IN ('queued', 'running')
+            """, (error, datetime.utcnow()))
+            count = cursor.rowcount
+            conn.commit()
+
+        return count
+
+    @staticmethod
+    def _idempotency_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        record = dict(row)
+        record["response"] = json.loads(record["response"]) if record["response"] else None
+        return record
+
+    @timed(DB_SECONDS, span_prefix="db")
+    def claim_idempotency_key(self, key: str, request_hash: str, expires_before: datetime) -> Optional[Dict[str, Any]]:
+        """
+        Claim a key for a new request.
+
+        Returns None if the caller now owns the key, otherwise the existing record.
+        Completed records created before expires_before are discarded and the key claimed afresh.
+        """
+        with self._connection() as conn:
+            cursor = conn.cursor()
+
+            now = datetime.utcnow()
+            cursor.execute("""
+                DELETE FROM idempotency_keys
+                WHERE key = ? AND status = 'completed' AND created_at < ?
+            """, (key, expires_before))
+            cursor.execute("""
+                INSERT OR IGNORE INTO idempotency_keys (key, request_hash, status, created_at, updated_at)
+                VALUES (?, ?, 'pending', ?, ?)
+            """, (key, request_hash, now, now))
+            claimed = cursor.rowcount == 1
+            conn.commit()
+
+            if claimed:
+                return None
+            cursor.execute("SELECT * FROM idempotency_keys WHERE key = ?", (key,))
+            row = cursor.fetchone()
+
+        return self._idempotency_dict(row)
+
+    @staticmethod
+    def _complete_idempotency_key(cursor: sqlite3.Cursor, key: str, status_code: int, response: Any,
+                                  instance_id: Optional[str]):
+        # A key already completed together with its records keeps that response
+        cursor.execute("""
+            UPDATE idempotency_keys
+            SET status = 'completed', status_code = ?, response = ?, instance_id = ?, updated_at = ?
+            WHERE key = ? AND status = 'pending'
+        """, (status_code, json.dumps(response), instance_id, datetime.utcnow(), key))
+
+    @timed(DB_SECONDS, span_prefix="db")
+    def complete_idempotency_key(self, key: str, status_code: int, response: Any, instance_id: str = None):
+        """Store the response that replays of this key will receive."""
+        with self._connection() as conn:
+            self._complete_idempotency_key(conn.cursor(), key, status_code, response, instance_id)
+            conn.commit()
+
+    @timed(DB_SECONDS, span_prefix="db")
+    def release_idempotency_key(self, key: str):
+        """Forget a pending key whose request failed, so the client can retry with it."""
+        with self._connection() as conn:
+            conn.execute("DELETE FROM idempotency_keys WHERE key = ? AND status = 'pending'", (key,))
+            conn.commit()
+
+    @timed(DB_SECONDS, span_prefix="db")
+    def prune_idempotency_keys(self, expires_before: datetime) -> int:
+        """Drop expired keys and pending keys whose request was interrupted by a restart."""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute("""
+                DELETE FROM idempotency_keys
+                WHERE status = 'pending' OR created_at < ?
+            """, (expires_before,))
+            count = cursor.rowcount
+            conn.commit()
+
+        return count
+
 
 # Global database instance
 db = Database()
@@ -0,0 +1,317 @@
+import hashlib
+import hmac
+import uuid
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from typing import Dict, Any, AsyncIterator, List, Optional
+from urllib.parse import urlencode, urlparse
+import httpx
+from app.config import settings
+from app.services.breaker import AwsError, circuit_breakers
+from app.services.throttle import aws_scheduler
+from app.services.tracing import span
+from app.services.waiter import InstanceWaiter
+import logging
+
+logger = logging.getLogger(__name__)
+
+EC2_API_VERSION = "2016-11-15"
+CONTENT_TYPE = "application/x-www-form-urlencoded; charset=utf-8"
+
+# The EC2 action budget each API action is scheduled under
+API_ACTIONS = {
+    "DescribeInstances": "describe",
+    "RunInstances": "run",
+    "StartInstances": "start",
+    "StopInstances": "stop",
+    "TerminateInstances": "terminate",
+}
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _hmac(key: bytes, msg: str) -> bytes:
+    return hmac.new(key, msg.encode("utf-8"), hashlib.sha256).digest()
+
+
+def _strip_namespaces(root: ET.Element) -> ET.Element:
+    """Drop XML namespaces so EC2 responses can be queried with plain tag names."""
+    for elem in root.iter():
+        if "}" in elem.tag:
+            elem.tag = elem.tag.split("}", 1)[1]
+    return root
+
+
+class Ec2ApiBackend:
+    """EC2 backend that calls the EC2 Query API in-process over a pooled HTTP client."""
+
+    name = "ec2api"
+
+    def __init__(self, region: str = None, endpoint_url: str = None):
+        self.region = region or settings.AWS_DEFAULT_REGION
+        # A fixed endpoint (e.g. a local stand-in) serves every region
+        self._endpoint_url = endpoint_url or settings.EC2_ENDPOINT_URL
+        self._client: Optional[httpx.AsyncClient] = None
+        self.waiters: Dict[str, InstanceWaiter] = {}
+
+    def endpoint_url(self, region: str) -> str:
+        return self._endpoint_url or f"https://ec2.{region}.amazonaws.com"
+
+    def waiter(self, region: str = None) -> InstanceWaiter:
+        """The shared waiter for one region, whose describe calls all target that region."""
+        region = region or self.region
+        if region not in self.waiters:
+            self.waiters[region] = InstanceWaiter(
+                lambda instance_ids: self.describe_instances(instance_ids, region=region),
+                f"{self.name}/{region}",
+            )
+        return self.waiters[region]
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Return the shared keep-alive HTTP client, creating it on first use."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=settings.EC2_API_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=settings.EC2_API_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.EC2_API_MAX_CONNECTIONS,
+                    keepalive_expiry=60,
+                ),
+            )
+        return self._client
+
+    async def close(self):
+        """Close pooled connections."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _sign(self, body: bytes, region: str) -> Dict[str, str]:
+        """Build SigV4 headers for a Query API POST request to one region."""
+        if not settings.AWS_ACCESS_KEY_ID or not settings.AWS_SECRET_ACCESS_KEY:
+            raise RuntimeError("AWS credentials not configured for the ec2api backend")
+
+        url = urlparse(self.endpoint_url(region))
+        now = datetime.now(timezone.utc)
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        datestamp = now.strftime("%Y%m%d")
+
+        headers = {
+            "content-type": CONTENT_TYPE,
+            "host": url.netloc,
+            "x-amz-date": amz_date,
+        }
+        if settings.AWS_SESSION_TOKEN:
+            headers["x-amz-security-token"] = settings.AWS_SESSION_TOKEN
+
+        signed_headers = ";".join(sorted(headers))
+        canonical_headers = "".join(f"{k}:{headers[k]}\n" for k in sorted(headers))
+        canonical_request = "\n".join([
+            "POST",
+            url.path or "/",
+            "",
+            canonical_headers,
+            signed_headers,
+            _sha256(body),
+        ])
+
+        scope = f"{datestamp}/{region}/ec2/aws4_request"
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256",
+            amz_date,
+            scope,
+            _sha256(canonical_request.encode("utf-8")),
+        ])
+
+        key = _hmac(f"AWS4{settings.AWS_SECRET_ACCESS_KEY}".encode("utf-8"), datestamp)
+        key = _hmac(key, region)
+        key = _hmac(key, "ec2")
+        key = _hmac(key, "aws4_request")
+        signature = hmac.new(key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+
+        headers["authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={settings.AWS_ACCESS_KEY_ID}/{scope}, "
+            f"SignedHeaders={signed_headers}, Signature={signature}"
+        )
+        del headers["host"]
+        return headers
+
+    async def _call(self, action: str, params: Dict[str, Any] = None, region: str = None) -> ET.Element:
+        """Call an EC2 API action behind the region's circuit breaker and within its budget."""
+        region = region or self.region
+        with span("ec2_api", action=action, region=region):
+            return await circuit_breakers.call(self.name, region, lambda: aws_scheduler.call(
+                API_ACTIONS.get(action, action), region, lambda: self._send(action, params, region),
+            ))
+
+    async def _send(self, action: str, params: Dict[str, Any], region: str) -> ET.Element:
+        """Call an EC2 API action in a region and return the parsed XML response."""
+        query = {"Action": action, "Version": EC2_API_VERSION}
+        if params:
+            query.update({k: str(v) for k, v in params.items()})
+        body = urlencode(query).encode("utf-8")
+
+        response = await self._get_client().post(
+            self.endpoint_url(region), content=body, headers=self._sign(body, region),
+        )
+        try:
+            root = _strip_namespaces(ET.fromstring(response.content))
+        except ET.ParseError:
+            raise RuntimeError(f"EC2 API {action} returned unparseable response (HTTP {response.status_code})")
+
+        if response.status_code >= 400:
+            code = root.findtext(".//Error/Code") or str(response.status_code)
+            message = root.findtext(".//Error/Message") or response.text
+            logger.error(f"EC2 API error on {action}: {code}: {message}")
+            raise AwsError(f"EC2 API {action} failed: {code}: {message}", code=code)
+
+        return root
+
+    @staticmethod
+    def _id_params(instance_ids: List[str]) -> Dict[str, str]:
+        return {f"InstanceId.{i}": instance_id for i, instance_id in enumerate(instance_ids, 1)}
+
+    @staticmethod
+    def _parse_instance(item: ET.Element) -> Dict[str, str]:
+        return {
+            "id": item.findtext("instanceId", ""),
+            "state": item.findtext("instanceState/name", ""),
+            "public_ip": item.findtext("ipAddress", ""),
+            "instance_type": item.findtext("instanceType", ""),
+            "ami": item.findtext("imageId", ""),
+            "launch_time": item.findtext("launchTime", ""),
+        }
+
+    async def _describe(self, params: Dict[str, Any] = None, region: str = None) -> List[Dict[str, str]]:
+        root = await self._call("DescribeInstances", params, region)
+        return [
+            self._parse_instance(item)
+            for item in root.findall("./reservationSet/item/instancesSet/item")
+        ]
+
+    async def describe_instances(self, instance_ids: List[str], region: str = None) -> List[Dict[str, str]]:
+        """Describe only the given instances with one DescribeInstances call."""
+        return await self._describe(self._id_params(instance_ids), region)
+
+    async def create(self, name: str, ami: str, instance_type: str, storage_gb: int,
+                     region: str = None, client_token: str = None) -> Dict[str, str]:
+        """Create an EC2 instance via the EC2 API."""
+        return (await self.create_many([name], ami, instance_type, storage_gb, region=region,
+                                       client_token=client_token))[0]
+
+    async def create_many(self, names: List[str], ami: str, instance_type: str,
+                          storage_gb: int, region: str = None, client_token: str = None) -> List[Dict[str, str]]:
+        """Create one instance per name with a single RunInstances call."""
+        root = await self._call("RunInstances", {
+            "ImageId": ami,
+            "InstanceType": instance_type,
+            "MinCount": len(names),
+            "MaxCount": len(names),
+            # Makes a retried RunInstances return the first call's instances
+            "ClientToken": client_token or uuid.uuid4().hex,
+            "KeyName": settings.EC2_KEY_NAME,
+            "BlockDeviceMapping.1.DeviceName": "/dev/xvda",
+            "BlockDeviceMapping.1.Ebs.VolumeSize": storage_gb,
+            "BlockDeviceMapping.1.Ebs.VolumeType": "gp2",
+            "TagSpecification.1.ResourceType": "instance",
+            "TagSpecification.1.Tag.1.Key": "Name",
+            "TagSpecification.1.Tag.1.Value": names[0],
+        }, region)
+        instances = [
+            {
+                "id": item.findtext("instanceId", ""),
+                "public_ip": item.findtext("ipAddress", ""),
+                "state": item.findtext("instanceState/name", "pending"),
+                "name": name,
+            }
+            for item, name in zip(root.findall("./instancesSet/item"), names)
+        ]
+
+        # Every instance was tagged with the first name at launch; rename the rest
+        for instance in instances[1:]:
+            await self._call("CreateTags", {
+                "ResourceId.1": instance["id"],
+                "Tag.1.Key": "Name",
+                "Tag.1.Value": instance["name"],
+            }, region)
+
+        # Resolve public IPs through the shared waiter, batched with every other pending create
+        missing = [instance["id"] for instance in instances if not instance["public_ip"]]
+        if missing:
+            latest = await self.waiter(region).wait_for_public_ip(missing)
+            for instance in instances:
+                if instance["id"] in latest:
+                    instance["public_ip"] = latest[instance["id"]]["public_ip"]
+                    instance["state"] = latest[instance["id"]]["state"]
+
+        return instances
+
+    async def iter_instances(self, states: List[str] = None, tags: Dict[str, str] = None,
+                             page_size: int = None, region: str = None) -> AsyncIterator[Dict[str, str]]:
+        """Yield EC2 instances page by page, with state and tag filters applied by AWS."""
+        params: Dict[str, Any] = {"MaxResults": page_size or settings.LIST_PAGE_SIZE}
+        filters = []
+        if states:
+            filters.append(("instance-state-name", states))
+        for key, value in (tags or {}).items():
+            filters.append((f"tag:{key}", [value]))
+        for i, (name, values) in enumerate(filters, 1):
+            params[f"Filter.{i}.Name"] = name
+            for j, value in enumerate(values, 1):
+                params[f"Filter.{i}.Value.{j}"] = value
+
+        while True:
+            root = await self._call("DescribeInstances", params, region)
+            for item in root.iterfind("./reservationSet/item/instancesSet/item"):
+                yield self._parse_instance(item)
+
+            token = root.findtext("nextToken")
+            if not token:
+                break
+            params["NextToken"] = token
+
+    async def list_instances(self, states: List[str] = None, tags: Dict[str, str] = None,
+                             region: str = None) -> List[Dict[str, str]]:
+        """List all EC2 instances in a region."""
+        return [instance async for instance in self.iter_instances(states, tags, region=region)]
+
+    async def get_instance(self, instance_id: str, region: str = None) -> Dict[str, str]:
+        """Get details of a specific instance."""
+        instances = await self._describe(self._id_params([instance_id]), region)
+        if not instances:
+            raise RuntimeError(f"Instance not found: {instance_id}")
+        return instances[0]
+
+    async def start(self, instance_id: str, region: str = None) -> Dict[str, str]:
+        """Start a stopped EC2 instance."""
+        return (await self.start_many([instance_id], region=region))[0]
+
+    async def stop(self, instance_id: str, region: str = None) -> Dict[str, str]:
+        """Stop a running EC2 instance."""
+        return (await self.stop_many([instance_id], region=region))[0]
+
+    async def destroy(self, instance_id: str, region: str = None) -> Dict[str, str]:
+        """Terminate an EC2 instance."""
+        return (await self.destroy_many([instance_id], region=region))[0]
+
+    async def start_many(self, instance_ids: List[str], region: str = None) -> List[Dict[str, str]]:
+        """Start several instances with one StartInstances call and one shared waiter."""
+        await self._call("StartInstances", self._id_params(instance_ids), region)
+        await self.waiter(region).wait_for_state(instance_ids, "running")
+        return [{"state": "running", "id": instance_id} for instance_id in instance_ids]
+
+    async def stop_many(self, instance_ids: List[str], region: str = None) -> List[Dict[str, str]]:
+        """Stop several instances with one StopInstances call and one shared waiter."""
+        await self._call("StopInstances", self._id_params(instance_ids), region)
+        await self.waiter(region).wait_for_state(instance_ids, "stopped")
+        return [{"state": "stopped", "id": instance_id} for instance_id in instance_ids]
+
+    async def destroy_many(self, instance_ids: List[str], region: str = None) -> List[Dict[str, str]]:
+        """Terminate several instances with one TerminateInstances call."""
+        await self._call("TerminateInstances", self._id_params(instance_ids), region)
+        return [{"state": "terminated", "id": instance_id} for instance_id in instance_ids]
+
+
+ec2_api_backend = Ec2ApiBackend()
@@ -0,0 +1,112 @@
+import asyncio
+import signal
+import threading
+from collections import deque
+from itertools import islice
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from app.config import settings
+from app.services.db import db
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (sequence number, "created" | "updated" | "deleted", record or changed fields, always with "id")
+Event = Tuple[int, str, Dict[str, Any]]
+
+
+class InstanceEvents:
+    """
+    Numbered feed of instance record changes, for GET /instances/watch.
+
+    Database reports every committed insert, update and delete; each record becomes one
+    event numbered by the database change sequence, so positions stay valid across
+    restarts and match the ETags on GET /instances. The last WATCH_BUFFER_SIZE events are kept so
+    watchers can resume after a reconnect. Publishing only appends and wakes the
+    watchers; each watcher reads the buffer from its own position, so a slow one never
+    holds up the others.
+    """
+
+    def __init__(self, buffer_size: int = None):
+        self._events: Deque[Event] = deque(maxlen=buffer_size or settings.WATCH_BUFFER_SIZE)
+        self.seq = 0
+        self.closed = False
+        self._changed = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+
+    def start(self):
+        """Start receiving changes from the database."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self.seq = max(self.seq, db.change_seq)
+        self.closed = False
+        db.add_listener(self.publish)
+        self._close_on_exit_signals()
+
+    def stop(self):
+        """Stop receiving changes and end every open watch stream."""
+        db.remove_listener(self.publish)
+        self.close()
+
+    def close(self):
+        self.closed = True
+        self._wake()
+
+    def _close_on_exit_signals(self):
+        """End watch streams as soon as the server is told to exit.
+
+        uvicorn waits for open connections to finish before it runs shutdown handlers,
+        so streams that only ended in stop() would hold up every shutdown.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            previous = signal.getsignal(sig)
+
+            def handler(signum, frame, previous=previous):
+                self._loop.call_soon_threadsafe(self.close)
+                if callable(previous):
+                    previous(signum, frame)
+                elif previous == signal.SIG_DFL:
+                    signal.signal(signum, signal.SIG_DFL)
+                    signal.raise_signal(signum)
+
+            signal.signal(sig, handler)
+
+    def publish(self, kind: str, records: List[Dict[str, Any]], first_seq: int):
+        if self._loop is not None and threading.get_ident() != self._loop_thread:
+            self._loop.call_soon_threadsafe(self.publish, kind, records, first_seq)
+            return
+        for seq, record in enumerate(records, first_seq):
+            if self._events and seq <= self._events[-1][0]:
+                continue
+            self._events.append((seq, kind, record))
+            self.seq = seq
+        if records:
+            self._wake()
+
+    def _wake(self):
+        # Swap in a fresh event, so every watcher waiting on the old one wakes exactly once
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def since(self, seq: int) -> Optional[List[Event]]:
+        """Events after seq, or None if some of them have already left the buffer."""
+        if seq >= self.seq:
+            return []
+        first = self._events[0][0] if self._events else self.seq + 1
+        if seq + 1 < first:
+            return None
+        return list(islice(self._events, seq + 1 - first, None))
+
+    async def wait(self, seq: int, timeout: float):
+        """Wait until there are events after seq; raise asyncio.TimeoutError after timeout."""
+        if self.seq > seq or self.closed:
+            return
+        await asyncio.wait_for(self._changed.wait(), timeout)
+
+    def stats(self) -> Dict[str, int]:
+        return {"seq": self.seq, "buffered": len(self._events)}
+
+
+instance_events = InstanceEvents()
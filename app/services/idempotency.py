@@ -0,0 +1,102 @@
+import asyncio
+import hashlib
+import json
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from fastapi import HTTPException, status
+from app.config import settings
+from app.services.db import db
+import logging
+
+logger = logging.getLogger(__name__)
+
+# An operation returns (status_code, response body, instance_id or None)
+Operation = Callable[[], Awaitable[Tuple[int, Any, Optional[str]]]]
+
+
+def request_fingerprint(**parts: Any) -> str:
+    """Hash what identifies a request, so a key reused with a different request is caught."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def client_token(key: str, request_hash: str) -> str:
+    """EC2 ClientToken for a keyed request: a retry launches nothing new, even after a crash lost the key."""
+    # 64 hex characters, the longest token EC2 accepts
+    return hashlib.sha256(f"{key}:{request_hash}".encode()).hexdigest()
+
+
+class IdempotencyKeys:
+    """
+    Runs each Idempotency-Key's operation once and replays its stored response.
+
+    Requests arriving while the first one is still running in this process wait
+    for it instead of starting their own; completed responses come from the
+    idempotency_keys table.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, Tuple[str, asyncio.Task]] = {}
+
+    @staticmethod
+    def _expires_before() -> datetime:
+        return datetime.utcnow() - timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+
+    def prune(self) -> int:
+        """Drop expired keys and keys left pending by a restart."""
+        return db.prune_idempotency_keys(self._expires_before())
+
+    async def run(self, key: str, request_hash: str, operation: Operation) -> Tuple[int, Any, bool]:
+        """Return (status_code, body, replayed) for the request, running operation only if the key is new."""
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            inflight_hash, task = inflight
+            self._check_same_request(key, inflight_hash, request_hash)
+            logger.info(f"Waiting for in-flight request with Idempotency-Key {key}")
+            status_code, body = await asyncio.shield(task)
+            return status_code, body, True
+
+        existing = db.claim_idempotency_key(key, request_hash, self._expires_before())
+        if existing is not None:
+            self._check_same_request(key, existing["request_hash"], request_hash)
+            if existing["status"] != "completed":
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f"A request with Idempotency-Key '{key}' is still in progress",
+                )
+            return existing["status_code"], existing["response"], True
+
+        # Run detached from this request, so waiters still get the result if its client goes away
+        task = asyncio.ensure_future(self._execute(key, operation))
+        self._inflight[key] = (request_hash, task)
+        task.add_done_callback(partial(self._finished, key))
+        status_code, body = await asyncio.shield(task)
+        return status_code, body, False
+
+    @staticmethod
+    def _check_same_request(key: str, stored_hash: str, request_hash: str):
+        if stored_hash != request_hash:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Idempotency-Key '{key}' was already used with a different request",
+            )
+
+    async def _execute(self, key: str, operation: Operation) -> Tuple[int, Any]:
+        try:
+            status_code, body, instance_id = await operation()
+        except BaseException:
+            # Nothing to replay; let the client retry with the same key
+            db.release_idempotency_key(key)
+            raise
+        db.complete_idempotency_key(key, status_code, body, instance_id)
+        return status_code, body
+
+    def _finished(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key, (None, None))[1] is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the error as retrieved even if every waiter has gone
+            task.exception()
+
+
+idempotency_keys = IdempotencyKeys()
@@ -0,0 +1,77 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from fastapi import HTTPException
+from app.config import settings
+from app.services.db import db
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class JobManager:
+    """Runs long lifecycle operations on a pool of asyncio workers, tracked in the jobs table."""
+
+    def __init__(self, workers: int = None):
+        self.workers = workers or settings.JOB_WORKERS
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._running = 0
+
+    async def start(self):
+        """Start the worker pool."""
+        interrupted = db.fail_unfinished_jobs("Interrupted by server restart")
+        if interrupted:
+            logger.warning(f"Marked {interrupted} unfinished jobs as failed")
+
+        self._queue = asyncio.Queue(maxsize=settings.JOB_QUEUE_SIZE)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"Started {self.workers} job workers")
+
+    async def stop(self):
+        """Cancel the worker pool."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, operation: str, run: Callable[[], Awaitable[Any]],
+               instance_id: str = None) -> Dict[str, Any]:
+        """Queue an operation and return its job record without waiting for it."""
+        if self._queue is None:
+            raise RuntimeError("Job workers are not running")
+        if self._queue.full():
+            raise HTTPException(status_code=503, detail="Job queue is full, retry later")
+
+        job = db.create_job(operation, instance_id)
+        self._queue.put_nowait((job["id"], run))
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": len(self._tasks),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": self._running,
+        }
+
+    async def _worker(self, worker_id: int):
+        while True:
+            job_id, run = await self._queue.get()
+            self._running += 1
+            try:
+                db.update_job(job_id, "running")
+                result = await run()
+                instance_id = result.get("id") if isinstance(result, dict) else None
+                db.update_job(job_id, "succeeded", result=result, instance_id=instance_id)
+            except asyncio.CancelledError:
+                db.update_job(job_id, "failed", error="Cancelled during shutdown")
+                raise
+            except Exception as e:
+                error = e.detail if isinstance(e, HTTPException) else str(e)
+                logger.error(f"Job {job_id} failed: {error}")
+                db.update_job(job_id, "failed", error=error)
+            finally:
+                self._running -= 1
+                self._queue.task_done()
+
+
+job_manager = JobManager()
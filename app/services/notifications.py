@@ -1,33 +1,28 @@
+import queue
 import smtplib
+import threading
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 from app.config import settings
+from app.services.metrics import SMTP_SEND_SECONDS
+from app.services.tracing import span
 import logging
 
 logger = logging.getLogger(__name__)
 
+# (event, instance_data, queued_at)
+Notification = Tuple[str, Dict[str, Any], datetime]
 
-def send_notification(event: str, instance_data: Dict[str, Any]) -> bool:
-    """
-    Send email notification for instance lifecycle events.
-
-    Args:
-        event: Event type (create, start, stop, destroy)
-        instance_data: Instance information
 
-    Returns:
-        bool: True if sent successfully, False otherwise
-    """
-    if not settings.NOTIFICATION_EMAIL or not settings.SMTP_USER:
-        logger.warning("Email notifications not configured")
-        return False
+def notifications_configured() -> bool:
+    return bool(settings.NOTIFICATION_EMAIL and (settings.SMTP_FROM or settings.SMTP_USER))
 
-    try:
-        subject = f"EC2 Instance {event.upper()}: {instance_data.get('name', 'unknown')}"
 
-        body = f"""
+def _event_body(event: str, instance_data: Dict[str, Any], timestamp: datetime) -> str:
+    return f"""
 Instance {event.upper()} Event
 
 Instance ID: {instance_data.get('id', 'N/A')}
@@ -37,28 +32,192 @@ Public IP: {instance_data.get('public_ip', 'N/A')}
 Instance Type: {instance_data.get('instance_type', 'N/A')}
 AMI: {instance_data.get('ami', 'N/A')}
 Backend Used: {instance_data.get('backend_used', 'N/A')}
-Timestamp: {datetime.utcnow().isoformat()}
+Timestamp: {timestamp.isoformat()}
 
 SSH Command:
 {instance_data.get('ssh_string', 'N/A')}
 """
 
-        msg = MIMEMultipart()
-        msg["From"] = settings.SMTP_USER
-        msg["To"] = settings.NOTIFICATION_EMAIL
-        msg["Subject"] = subject
 
-        msg.attach(MIMEText(body, "plain"))
+def build_message(notifications: List[Notification]) -> MIMEMultipart:
+    """Build one email for a single event, or a digest email for several."""
+    if len(notifications) == 1:
+        event, instance_data, timestamp = notifications[0]
+        subject = f"EC2 Instance {event.upper()}: {instance_data.get('name', 'unknown')}"
+        body = _event_body(event, instance_data, timestamp)
+    else:
+        counts: Dict[str, int] = {}
+        for event, _, _ in notifications:
+            counts[event] = counts.get(event, 0) + 1
+        summary = ", ".join(f"{count} {event}" for event, count in counts.items())
+        subject = f"EC2 Instance digest: {summary}"
+        body = "".join(
+            _event_body(event, instance_data, timestamp)
+            for event, instance_data, timestamp in notifications
+        )
+
+    msg = MIMEMultipart()
+    msg["From"] = settings.SMTP_FROM or settings.SMTP_USER
+    msg["To"] = settings.NOTIFICATION_EMAIL
+    msg["Subject"] = subject
+
+    msg.attach(MIMEText(body, "plain"))
+    return msg
+
+
+class Notifier:
+    """Delivers queued notifications from one worker thread over a persistent SMTP session."""
+
+    def __init__(self, queue_size: int = None, digest_seconds: float = None):
+        self.digest_seconds = settings.NOTIFICATION_DIGEST_SECONDS if digest_seconds is None else digest_seconds
+        self._queue: "queue.Queue[Notification]" = queue.Queue(maxsize=queue_size or settings.NOTIFICATION_QUEUE_SIZE)
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def start(self):
+        """Start the delivery thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="notifier", daemon=True)
+        self._thread.start()
+        mode = f"digest every {self.digest_seconds}s" if self.digest_seconds > 0 else "one email per event"
+        logger.info(f"Notification worker started ({mode})")
+
+    def stop(self, timeout: float = None):
+        """Flush what is queued (up to the timeout), then close the SMTP session."""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join(settings.NOTIFICATION_FLUSH_TIMEOUT if timeout is None else timeout)
+        if self._thread.is_alive():
+            logger.warning(f"Notification worker did not finish; {self._queue.qsize()} notifications dropped")
+        self._thread = None
+
+    def enqueue(self, event: str, instance_data: Dict[str, Any]) -> bool:
+        """Queue a notification without blocking; drop it if the queue is full."""
+        try:
+            self._queue.put_nowait((event, dict(instance_data), datetime.utcnow()))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logger.error(f"Notification queue full, dropping {event} event for {instance_data.get('id')}")
+            return False
+
+    def stats(self) -> Dict[str, int]:
+        return {"queued": self._queue.qsize(), "sent": self.sent, "failed": self.failed, "dropped": self.dropped}
 
-        server = smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT)
-        server.starttls()
-        server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-        server.send_message(msg)
-        server.quit()
+    def _run(self):
+        idle_since = time.monotonic()
+        while True:
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                if self._stopping.is_set():
+                    break
+                if self._smtp is not None and time.monotonic() - idle_since > settings.SMTP_IDLE_TIMEOUT:
+                    # Let an idle session go rather than have the server drop it under us
+                    self._disconnect()
+                continue
 
-        logger.info(f"Notification sent for event: {event}")
-        return True
+            batch = [first] + self._collect()
+            if self.digest_seconds > 0:
+                self._deliver(batch)
+            else:
+                for notification in batch:
+                    self._deliver([notification])
+            idle_since = time.monotonic()
 
-    except Exception as e:
-        logger.error(f"Failed to send notification: {str(e)}")
-        return False
+        self._disconnect()
+
+    def _collect(self) -> List[Notification]:
+        """Take what else is queued; in digest mode, wait out the window for more."""
+        batch = []
+        deadline = time.monotonic() + self.digest_seconds
+        while len(batch) < settings.NOTIFICATION_BATCH_SIZE:
+            timeout = deadline - time.monotonic()
+            try:
+                if timeout > 0 and not self._stopping.is_set():
+                    batch.append(self._queue.get(timeout=min(timeout, 0.5)))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                if timeout <= 0 or self._stopping.is_set():
+                    break
+        return batch
+
+    def _connect(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT)
+        try:
+            if settings.SMTP_STARTTLS:
+                smtp.starttls()
+            if settings.SMTP_USER and settings.SMTP_PASSWORD:
+                smtp.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+        except Exception:
+            smtp.close()
+            raise
+        logger.info(f"Connected to SMTP server {settings.SMTP_HOST}:{settings.SMTP_PORT}")
+        return smtp
+
+    def _disconnect(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except Exception:
+            self._smtp.close()
+        self._smtp = None
+
+    def _deliver(self, notifications: List[Notification]):
+        """Send one message, reconnecting with exponential backoff on failure."""
+        msg = build_message(notifications)
+        backoff = settings.SMTP_RETRY_BACKOFF
+        for attempt in range(1, settings.SMTP_MAX_RETRIES + 2):
+            reused = self._smtp is not None
+            start = time.perf_counter()
+            try:
+                if self._smtp is None:
+                    self._smtp = self._connect()
+                self._smtp.send_message(msg)
+                SMTP_SEND_SECONDS.observe(time.perf_counter() - start, outcome="ok")
+                self.sent += len(notifications)
+                logger.info(f"Notification sent: {msg['Subject']}")
+                return
+            except Exception as e:
+                SMTP_SEND_SECONDS.observe(time.perf_counter() - start, outcome="error")
+                self._disconnect()
+                if reused and attempt == 1:
+                    # Most likely the server closed an idle session; reconnect straight away
+                    continue
+                if attempt > settings.SMTP_MAX_RETRIES or self._stopping.wait(backoff):
+                    break
+                logger.warning(f"Failed to send notification (attempt {attempt}): {str(e)}; retrying in {backoff}s")
+                backoff = min(backoff * 2, settings.SMTP_RETRY_BACKOFF_MAX)
+
+        self.failed += len(notifications)
+        logger.error(f"Failed to send notification: {msg['Subject']}")
+
+
+notifier = Notifier()
+
+
+def send_notification(event: str, instance_data: Dict[str, Any]) -> bool:
+    """
+    Queue an email notification for an instance lifecycle event.
+
+    Args:
+        event: Event type (create, start, stop, destroy)
+        instance_data: Instance information
+
+    Returns:
+        bool: True if queued for delivery, False otherwise
+    """
+    with span("notify", event=event):
+        if not notifications_configured():
+            logger.warning("Email notifications not configured")
+            return False
+        return notifier.enqueue(event, instance_data)
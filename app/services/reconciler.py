@@ -0,0 +1,114 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+from app.config import settings
+from app.models.instance import ssh_string_for
+from app.services.backends import resolve_backend
+from app.services.db import db
+from app.services.regions import iter_regions
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Reconciler:
+    """Periodically syncs instance state and public IPs from AWS into SQLite."""
+
+    def __init__(self, interval: float = None, backend_name: str = None):
+        self.interval = settings.RECONCILE_INTERVAL_SECONDS if interval is None else interval
+        self.backend_name = backend_name
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Start the background sweep loop (disabled when the interval is 0)."""
+        if self.interval <= 0:
+            logger.info("State reconciler disabled")
+            return
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"State reconciler running every {self.interval}s")
+
+    async def stop(self):
+        """Stop the background sweep loop."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.error(f"Reconcile sweep failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    @staticmethod
+    def diff(record: Dict[str, Any], instance: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return the change to apply if AWS reports a different state or public IP.
+
+        The change carries the record's current values, so it is skipped if the row moved on meanwhile.
+        """
+        state = instance["state"]
+        public_ip = instance["public_ip"] or ""
+        if state == record["state"] and public_ip == (record["public_ip"] or ""):
+            return None
+        return {
+            "id": record["id"],
+            "state": state,
+            "public_ip": public_ip,
+            "ssh_string": ssh_string_for(public_ip),
+            "expected_state": record["state"],
+            "expected_public_ip": record["public_ip"] or "",
+        }
+
+    @staticmethod
+    async def lookup(backend, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Describe records the listing did not return by ID; ones AWS does not know are left out."""
+        results = await asyncio.gather(
+            *(backend.get_instance(record["id"], region=record.get("region")) for record in records),
+            return_exceptions=True,
+        )
+        found = []
+        for record, result in zip(records, results):
+            if isinstance(result, Exception):
+                logger.info(f"Reconcile lookup of {record['id']} failed: {str(result)}")
+            else:
+                found.append(result)
+        return found
+
+    async def reconcile(self) -> int:
+        """Run one sweep: a paged describe stream of every region, an ID-indexed diff, one write transaction."""
+        records = {record["id"]: record for record in db.list_instances()}
+        backend = resolve_backend(self.backend_name)
+        changes = []
+        seen = set()
+        failed: Dict[str, str] = {}
+
+        async for instance in iter_regions(backend, failed=failed):
+            seen.add(instance["id"])
+            record = records.get(instance["id"])
+            if record is None:
+                continue
+            change = self.diff(record, instance)
+            if change:
+                changes.append(change)
+
+        # E.g. launched after its region's pages were read; a failed region is retried on the next sweep instead
+        unseen = [
+            record for instance_id, record in records.items()
+            if instance_id not in seen and (record.get("region") or settings.AWS_DEFAULT_REGION) not in failed
+        ]
+        for instance in await self.lookup(backend, unseen):
+            change = self.diff(records[instance["id"]], instance)
+            if change:
+                changes.append(change)
+
+        if not changes:
+            return 0
+        applied = db.apply_instance_changes(changes)
+        logger.info(f"Reconciled {applied} instance records with AWS")
+        if applied < len(changes):
+            logger.info(f"Skipped {len(changes) - applied} records changed during the sweep")
+        return applied
+
+
+reconciler = Reconciler()
@@ -0,0 +1,60 @@
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional
+from app.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+def resolve_region(region: Optional[str] = None) -> str:
+    """Return the requested region, or the default; raise KeyError if it is not configured."""
+    region = region or settings.AWS_DEFAULT_REGION
+    if region not in settings.AWS_REGIONS and region != settings.AWS_DEFAULT_REGION:
+        raise KeyError(region)
+    return region
+
+
+async def iter_regions(backend, regions: List[str] = None, states: List[str] = None,
+                       tags: Dict[str, str] = None, failed: Dict[str, str] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield instances from every region as their pages arrive, each tagged with its region.
+
+    Regions are described concurrently by up to REGION_FANOUT_WORKERS workers, so a
+    sweep takes about as long as the slowest region rather than the sum of them. A
+    region that fails is logged and skipped, and recorded in failed (region -> error)
+    when given; the others still complete.
+    """
+    regions = regions or settings.AWS_REGIONS
+    pending = asyncio.Queue()
+    # Bounded, so a slow consumer holds back the describe calls instead of buffering every page
+    results: asyncio.Queue = asyncio.Queue(maxsize=settings.LIST_PAGE_SIZE)
+    for region in regions:
+        pending.put_nowait(region)
+
+    async def worker():
+        while not pending.empty():
+            region = pending.get_nowait()
+            try:
+                async for instance in backend.iter_instances(states, tags, region=region):
+                    await results.put({**instance, "region": region})
+            except Exception as e:
+                logger.warning(f"Inventory of {region} failed: {str(e)}")
+                if failed is not None:
+                    failed[region] = str(e)
+        await results.put(_DONE)
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(settings.REGION_FANOUT_WORKERS, len(regions)))]
+    try:
+        remaining = len(workers)
+        while remaining:
+            item = await results.get()
+            if item is _DONE:
+                remaining -= 1
+                continue
+            yield item
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
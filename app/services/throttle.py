@@ -0,0 +1,164 @@
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+from app.config import settings
+from app.services.tracing import span
+import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Error codes EC2 (and the aws CLI, which prints them) uses when an API budget is exhausted
+THROTTLE_CODES = frozenset({"RequestLimitExceeded", "Throttling", "ThrottlingException", "TooManyRequestsException"})
+
+
+class ThrottledError(RuntimeError):
+    """An EC2 call that could not get through its budget in time; retry after retry_after seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_throttled(error: Exception) -> bool:
+    # The parsed EC2 error code (AwsError.code), not the message, which may echo request input
+    return getattr(error, "code", None) in THROTTLE_CODES
+
+
+class TokenBucket:
+    """
+    A token bucket that hands out tokens in arrival order.
+
+    Each caller reserves the next token up front, so callers are served first come,
+    first served without a queue: the balance goes negative and each reservation
+    sleeps until its token has refilled.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, max_wait: float) -> float:
+        """Reserve a token and return how long to wait for it; raise ThrottledError if that exceeds max_wait."""
+        self._refill()
+        wait = max(0.0, (1 - self.tokens) / self.rate)
+        if wait > max_wait:
+            raise ThrottledError(f"would wait {wait:.1f}s for a token", retry_after=wait)
+        self.tokens -= 1
+        return wait
+
+    def refund(self):
+        """Give back a reserved token that was not used."""
+        self.tokens = min(self.burst, self.tokens + 1)
+
+    def drain(self):
+        """Drop any saved-up burst, after AWS told us the account budget is spent."""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+
+class AwsScheduler:
+    """
+    Budgets EC2 calls per action and region, and retries the ones AWS throttles.
+
+    Every backend call goes through call(): it waits for a token from the bucket for
+    its action (describe, run, start, stop, terminate) in its region, rejects the
+    call if the wait would exceed EC2_THROTTLE_MAX_WAIT, and retries throttled calls
+    with full-jitter exponential backoff.
+    """
+
+    def __init__(self, limits: Dict[str, Tuple[float, int]] = None):
+        self.limits = settings.EC2_RATE_LIMITS if limits is None else limits
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._stats: Dict[Tuple[str, str], Dict[str, int]] = {}
+
+    def _bucket(self, action: str, region: str) -> Optional[TokenBucket]:
+        key = (action, region)
+        if key not in self._buckets:
+            rate, burst = self.limits.get(action, (0, 0))
+            # No budget configured for the action: calls go straight through
+            self._buckets[key] = TokenBucket(rate, burst) if rate > 0 else None
+        return self._buckets[key]
+
+    def _stats_for(self, action: str, region: str) -> Dict[str, int]:
+        return self._stats.setdefault((action, region), {"calls": 0, "waiting": 0, "throttled": 0, "rejected": 0})
+
+    def _count(self, action: str, region: str, stat: str):
+        self._stats_for(action, region)[stat] += 1
+
+    def stats(self) -> Dict[Tuple[str, str, str], float]:
+        """Lifetime calls/throttled/rejected, callers waiting and tokens left, per action and region."""
+        values = {}
+        for (action, region), stats in list(self._stats.items()):
+            for stat, value in stats.items():
+                values[(action, region, stat)] = value
+            bucket = self._buckets.get((action, region))
+            if bucket is not None:
+                bucket._refill()
+                values[(action, region, "tokens")] = round(bucket.tokens, 3)
+        return values
+
+    async def acquire(self, action: str, region: str):
+        """Wait for this call's turn in the action's budget."""
+        bucket = self._bucket(action, region)
+        if bucket is None:
+            return
+        try:
+            wait = bucket.reserve(settings.EC2_THROTTLE_MAX_WAIT)
+        except ThrottledError as e:
+            self._count(action, region, "rejected")
+            raise ThrottledError(
+                f"EC2 {action} budget in {region} is exhausted; retry in {e.retry_after:.0f}s",
+                retry_after=e.retry_after,
+            )
+        if wait <= 0:
+            return
+        stats = self._stats_for(action, region)
+        stats["waiting"] += 1
+        try:
+            with span("ec2_budget", action=action, region=region):
+                await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            bucket.refund()
+            raise
+        finally:
+            stats["waiting"] -= 1
+
+    async def call(self, action: str, region: str, operation: Callable[[], Awaitable[T]]) -> T:
+        """Run operation within the action's budget, retrying it while AWS reports throttling."""
+        region = region or settings.AWS_DEFAULT_REGION
+        self._count(action, region, "calls")
+        backoff = settings.EC2_THROTTLE_BACKOFF
+        for attempt in range(1, settings.EC2_THROTTLE_RETRIES + 2):
+            await self.acquire(action, region)
+            try:
+                return await operation()
+            except Exception as e:
+                if not is_throttled(e):
+                    raise
+                self._count(action, region, "throttled")
+                bucket = self._bucket(action, region)
+                if bucket is not None:
+                    # Our budget was too generous for what the account has left; stop bursting
+                    bucket.drain()
+                if attempt > settings.EC2_THROTTLE_RETRIES:
+                    raise ThrottledError(
+                        f"EC2 {action} in {region} still throttled after {attempt} attempts",
+                        retry_after=backoff,
+                    ) from e
+                delay = random.uniform(0, backoff)
+                logger.warning(f"EC2 {action} in {region} throttled (attempt {attempt}); retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                backoff = min(backoff * 2, settings.EC2_THROTTLE_BACKOFF_MAX)
+
+
+aws_scheduler = AwsScheduler()
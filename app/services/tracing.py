@@ -0,0 +1,267 @@
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from app.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Spans kept per request; later ones are only counted, so a runaway loop cannot hold on to memory
+MAX_SPANS = 1000
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_FILE_HEADER = b"x-profile-file"
+
+
+class Trace:
+    """Bookkeeping shared by every span of one request."""
+
+    __slots__ = ("spans", "dropped", "finished")
+
+    def __init__(self):
+        self.spans = 0
+        self.dropped = 0
+        self.finished = False
+
+
+class Span:
+    """One timed step of a request, with the steps it ran nested under it."""
+
+    __slots__ = ("name", "attrs", "trace", "children", "start", "end")
+
+    def __init__(self, name: str, attrs: Dict[str, Any], trace: Trace):
+        self.name = name
+        self.attrs = attrs
+        self.trace = trace
+        self.children: List["Span"] = []
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+
+    def duration(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+    def format(self, origin: float, depth: int = 0) -> List[str]:
+        """One line per span: offset from origin and duration in milliseconds, indented by depth."""
+        attrs = "".join(f" {key}={value}" for key, value in self.attrs.items())
+        unfinished = "" if self.end else " (unfinished)"
+        lines = [
+            f"{'  ' * depth}{self.name}{attrs} "
+            f"+{(self.start - origin) * 1000:.1f}ms {self.duration() * 1000:.1f}ms{unfinished}"
+        ]
+        for child in self.children:
+            lines.extend(child.format(origin, depth + 1))
+        return lines
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class _SpanContext:
+    __slots__ = ("span", "token")
+
+    def __init__(self, span: Span):
+        self.span = span
+
+    def __enter__(self) -> Span:
+        self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, *exc_info):
+        self.span.end = time.perf_counter()
+        _current_span.reset(self.token)
+
+
+class _NoSpan:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        return None
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str, **attrs: Any):
+    """Context manager timing a step of the current request; a no-op outside a traced request."""
+    parent = _current_span.get()
+    if parent is None:
+        return _NO_SPAN
+    trace = parent.trace
+    # A background task started by a request outlives it; its work no longer belongs to the trace
+    if trace.finished:
+        return _NO_SPAN
+    if trace.spans >= MAX_SPANS:
+        trace.dropped += 1
+        return _NO_SPAN
+    trace.spans += 1
+    child = Span(name, attrs, trace)
+    parent.children.append(child)
+    return _SpanContext(child)
+
+
+def _frame_label(code) -> str:
+    filename = "/".join(Path(code.co_filename).parts[-2:])
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Samples the event loop thread's stack every PROFILE_INTERVAL_SECONDS while profiled requests run.
+
+    One sampler thread serves every profiled request in flight and exits when the last
+    one finishes. Samples cover the whole loop thread, so requests running alongside a
+    profiled one show up in its profile too. Profiles are written as folded stacks, the
+    input format of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval: float = None):
+        self.interval = settings.PROFILE_INTERVAL_SECONDS if interval is None else interval
+        # session id -> (thread to sample, stack -> samples)
+        self._sessions: Dict[int, Tuple[int, Counter]] = {}
+        self._labels: Dict[Any, str] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._next_id = 0
+
+    def start(self) -> int:
+        """Start sampling the calling thread; return the session id to pass to stop()."""
+        with self._lock:
+            self._next_id += 1
+            session = self._next_id
+            self._sessions[session] = (threading.get_ident(), Counter())
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+        return session
+
+    def stop(self, session: int) -> Counter:
+        """End a session and return its samples per folded stack."""
+        with self._lock:
+            _, samples = self._sessions.pop(session)
+        return samples
+
+    def _fold(self, frame) -> str:
+        labels = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = _frame_label(code)
+            labels.append(label)
+            frame = frame.f_back
+        return ";".join(reversed(labels))
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._sessions:
+                    self._thread = None
+                    return
+                frames = sys._current_frames()
+                for thread_id, samples in self._sessions.values():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[self._fold(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+    @staticmethod
+    def write(samples: Counter, path: Path):
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "w") as f:
+                for stack, count in samples.most_common():
+                    f.write(f"{stack} {count}\n")
+        except OSError as e:
+            logger.error(f"Failed to write profile {path}: {str(e)}")
+
+
+profiler = SamplingProfiler()
+
+
+def _wants_profile(scope) -> bool:
+    mode = settings.PROFILE_REQUESTS
+    if mode == "all":
+        return True
+    if mode != "header":
+        return False
+    return any(name == PROFILE_HEADER and value.lower() in (b"1", b"true") for name, value in scope["headers"])
+
+
+def _profile_path(scope) -> Path:
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_")[:60] or "root"
+    return Path(settings.PROFILE_DIR) / f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{scope['method']}-{slug}.folded"
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware giving each request a span tree, for the slow-request log and profiles.
+
+    Requests taking SLOW_REQUEST_SECONDS or longer are logged with every span they
+    recorded. Requests selected by PROFILE_REQUESTS are also sampled by the profiler;
+    their span tree is always logged and the profile file is named in X-Profile-File.
+    With SLOW_REQUEST_SECONDS at 0 and no profile asked for, requests pass straight
+    through and span() stays a no-op.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = _wants_profile(scope)
+        if settings.SLOW_REQUEST_SECONDS <= 0 and not profile:
+            await self.app(scope, receive, send)
+            return
+
+        root = Span(f"{scope['method']} {scope['path']}", {}, Trace())
+        token = _current_span.set(root)
+        response = {"status": 500, "event_stream": False}
+        profile_path = _profile_path(scope) if profile else None
+        session = profiler.start() if profile else None
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = message.get("headers") or []
+                response["status"] = message["status"]
+                response["event_stream"] = any(
+                    name == b"content-type" and value.startswith(b"text/event-stream") for name, value in headers
+                )
+                if profile_path is not None:
+                    message = {**message, "headers": [*headers, (PROFILE_FILE_HEADER, str(profile_path).encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            root.end = time.perf_counter()
+            root.trace.finished = True
+            _current_span.reset(token)
+            if session is not None:
+                profiler.write(profiler.stop(session), profile_path)
+
+            duration = root.duration()
+            # Watch streams are long by design
+            slow = 0 < settings.SLOW_REQUEST_SECONDS <= duration and not response["event_stream"]
+            if slow or profile:
+                route = getattr(scope.get("route"), "path", scope["path"])
+                dropped = f", {root.trace.dropped} spans dropped" if root.trace.dropped else ""
+                tree = "\n".join(root.format(root.start))
+                message = (
+                    f"{scope['method']} {route} took {duration:.3f}s "
+                    f"(status {response['status']}{dropped}):\n{tree}"
+                )
+                if slow:
+                    logger.warning(f"Slow request {message}")
+                else:
+                    logger.info(f"Profiled request {message}")
@@ -0,0 +1,201 @@
+import asyncio
+import contextvars
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+from app.config import settings
+from app.services.tracing import span
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Describes the given instance IDs: ids -> [{"id", "state", "public_ip", ...}]
+Describe = Callable[[List[str]], Awaitable[List[Dict[str, str]]]]
+Condition = Callable[[Dict[str, str]], bool]
+
+# States an instance cannot leave towards the target without outside help, as `aws ec2 wait` treats them
+FAILURE_STATES = {
+    "running": {"shutting-down", "terminated", "stopping"},
+    "stopped": {"pending", "terminated"},
+}
+
+# States in which an instance will never get a public IP assigned
+NO_IP_STATES = {"shutting-down", "terminated", "stopping", "stopped"}
+
+
+class _Wait:
+    """One caller waiting for a set of instances to satisfy a condition."""
+
+    def __init__(self, instance_ids: List[str], done: Condition, failed: Optional[Condition],
+                 description: str, timeout: float, raise_on_timeout: bool):
+        loop = asyncio.get_running_loop()
+        self.pending: Set[str] = set(instance_ids)
+        self.results: Dict[str, Dict[str, str]] = {}
+        self.done = done
+        self.failed = failed
+        self.description = description
+        self.raise_on_timeout = raise_on_timeout
+        self.deadline = loop.time() + timeout
+        self.interval = settings.WAITER_INITIAL_INTERVAL
+        self.next_poll = loop.time() + self.interval
+        self.future: asyncio.Future = loop.create_future()
+
+    def update(self, instance: Dict[str, str]):
+        """Record the latest description of one of this wait's instances."""
+        if instance["id"] not in self.pending:
+            return
+        self.results[instance["id"]] = instance
+        if self.done(instance):
+            self.pending.discard(instance["id"])
+        elif self.failed is not None and self.failed(instance):
+            self.finish(RuntimeError(
+                f"Instance {instance['id']} is {instance['state']} while waiting for it to {self.description}"
+            ))
+
+    def finish(self, error: Exception = None):
+        if self.future.done():
+            return
+        if error is not None:
+            self.future.set_exception(error)
+        else:
+            self.future.set_result(self.results)
+
+
+class InstanceWaiter:
+    """
+    Waits for instances on behalf of many callers with one shared poller.
+
+    Every poll describes all pending instance IDs together (in chunks of
+    WAITER_BATCH_SIZE), updates every caller waiting on them, and backs off
+    exponentially per caller from WAITER_INITIAL_INTERVAL to WAITER_MAX_INTERVAL.
+    """
+
+    def __init__(self, describe: Describe, name: str):
+        self.describe = describe
+        self.name = name
+        self._waits: List[_Wait] = []
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.polls = 0
+
+    async def wait_for_state(self, instance_ids: List[str], state: str,
+                             timeout: float = None) -> Dict[str, Dict[str, str]]:
+        """Wait until every instance is in the given state; raise on timeout or a failure state."""
+        failure_states = FAILURE_STATES.get(state, set())
+        return await self._wait(
+            instance_ids,
+            done=lambda instance: instance["state"] == state,
+            failed=lambda instance: instance["state"] in failure_states,
+            description=f"become {state}",
+            timeout=settings.WAITER_STATE_TIMEOUT if timeout is None else timeout,
+            raise_on_timeout=True,
+        )
+
+    async def wait_for_public_ip(self, instance_ids: List[str],
+                                 timeout: float = None) -> Dict[str, Dict[str, str]]:
+        """Wait until every instance has a public IP, or can no longer get one.
+
+        Returns the latest description of each instance seen so far, even if the timeout ran out first.
+        """
+        return await self._wait(
+            instance_ids,
+            done=lambda instance: bool(instance["public_ip"]) or instance["state"] in NO_IP_STATES,
+            failed=None,
+            description="get a public IP",
+            timeout=settings.WAITER_IP_TIMEOUT if timeout is None else timeout,
+            raise_on_timeout=False,
+        )
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "waits": len(self._waits),
+            "instances": len({instance_id for wait in self._waits for instance_id in wait.pending}),
+            "polls": self.polls,
+        }
+
+    async def _wait(self, instance_ids: List[str], done: Condition, failed: Optional[Condition],
+                    description: str, timeout: float, raise_on_timeout: bool) -> Dict[str, Dict[str, str]]:
+        wait = _Wait(instance_ids, done, failed, description, timeout, raise_on_timeout)
+        if not wait.pending:
+            return {}
+        self._waits.append(wait)
+        self._ensure_poller()
+        try:
+            with span("waiter", until=description, instances=len(wait.pending)):
+                return await wait.future
+        finally:
+            # A cancelled caller simply stops being polled for
+            if wait in self._waits:
+                self._waits.remove(wait)
+
+    def _ensure_poller(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            # A fresh context, so the shared poller's describe calls are not traced as this request's
+            self._task = asyncio.create_task(self._poll_loop(), context=contextvars.Context())
+        else:
+            self._wakeup.set()
+
+    async def _poll_loop(self):
+        try:
+            await self._run()
+        except Exception as e:
+            logger.error(f"[{self.name} waiter] poller failed: {str(e)}")
+            for wait in self._waits:
+                wait.finish(e)
+            self._waits = []
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._waits = [wait for wait in self._waits if not wait.future.done()]
+            if not self._waits:
+                self._task = None
+                return
+
+            now = loop.time()
+            delay = min(min(wait.next_poll, wait.deadline) for wait in self._waits) - now
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                # Re-evaluate: a new wait may have arrived with an earlier poll time
+                continue
+
+            due = [wait for wait in self._waits if wait.next_poll <= now and wait.deadline > now]
+            if due:
+                await self._poll(due)
+
+            now = loop.time()
+            for wait in self._waits:
+                if not wait.pending:
+                    wait.finish()
+                elif now >= wait.deadline:
+                    if wait.raise_on_timeout:
+                        wait.finish(RuntimeError(
+                            f"Timed out waiting for {', '.join(sorted(wait.pending))} to {wait.description}"
+                        ))
+                    else:
+                        wait.finish()
+                elif wait in due:
+                    wait.interval = min(wait.interval * 2, settings.WAITER_MAX_INTERVAL)
+                    wait.next_poll = now + wait.interval
+
+    async def _poll(self, due: List[_Wait]):
+        """Describe every pending instance, not just the due ones, since the call costs the same."""
+        instance_ids = sorted({instance_id for wait in self._waits for instance_id in wait.pending})
+        batch_size = settings.WAITER_BATCH_SIZE
+        for start in range(0, len(instance_ids), batch_size):
+            chunk = instance_ids[start:start + batch_size]
+            self.polls += 1
+            try:
+                instances = await self.describe(chunk)
+            except Exception as e:
+                # Often a just-launched ID that describe does not know yet; retry after the backoff
+                logger.warning(f"[{self.name} waiter] describe of {len(chunk)} instances failed: {str(e)}")
+                continue
+            for instance in instances:
+                for wait in self._waits:
+                    wait.update(instance)
+        logger.debug(f"[{self.name} waiter] polled {len(instance_ids)} instances for {len(due)} due waits")
@@ -6,33 +6,48 @@ AMI="${2:?AMI is required}"
 INSTANCE_TYPE="${3:?Instance type is required}"
 STORAGE_GB="${4:?Storage GB is required}"
 
-# Create instance with EBS volume
+# Any further arguments are names for additional instances launched in the
+# same run-instances call (bulk create): NAME AMI TYPE STORAGE [NAME2 ...]
+NAMES=("$NAME" "${@:5}")
+COUNT=${#NAMES[@]}
+
+# Set by the API so a retried run-instances returns the instances the first attempt launched
+CLIENT_TOKEN_ARGS=()
+if [ -n "${CLIENT_TOKEN:-}" ]; then
+  CLIENT_TOKEN_ARGS=(--client-token "$CLIENT_TOKEN")
+fi
+
+# Create instance(s) with EBS volume
 OUTPUT=$(aws ec2 run-instances \
   --image-id "$AMI" \
   --instance-type "$INSTANCE_TYPE" \
+  --count "$COUNT" \
+  ${CLIENT_TOKEN_ARGS[@]+"${CLIENT_TOKEN_ARGS[@]}"} \
   --key-name my_ec2_keypair \
   --block-device-mappings "DeviceName=/dev/xvda,Ebs={VolumeSize=$STORAGE_GB,VolumeType=gp2}" \
   --tag-specifications "ResourceType=instance,Tags=[{Key=Name,Value=$NAME}]" \
-  --query 'Instances[0].[InstanceId,PublicIpAddress]' \
+  --query 'Instances[*].[InstanceId,PublicIpAddress,State.Name]' \
   --output text)
 
-INSTANCE_ID=$(echo "$OUTPUT" | awk '{print $1}')
-PUBLIC_IP=$(echo "$OUTPUT" | awk '{print $2}')
+INSTANCE_IDS=()
+declare -A PUBLIC_IPS
+declare -A STATES
+while read -r INSTANCE_ID PUBLIC_IP STATE; do
+  [ -z "$INSTANCE_ID" ] && continue
+  INSTANCE_IDS+=("$INSTANCE_ID")
+  PUBLIC_IPS[$INSTANCE_ID]="${PUBLIC_IP:-None}"
+  STATES[$INSTANCE_ID]="${STATE:-pending}"
+done <<< "$OUTPUT"
 
-# Wait for instance to have a public IP if not assigned yet
-if [ -z "$PUBLIC_IP" ] || [ "$PUBLIC_IP" == "None" ]; then
-  echo "Waiting for public IP to be assigned..." >&2
-  for i in {1..30}; do
-    PUBLIC_IP=$(aws ec2 describe-instances \
-      --instance-ids "$INSTANCE_ID" \
-      --query 'Reservations[0].Instances[0].PublicIpAddress' \
-      --output text)
-
-    if [ -n "$PUBLIC_IP" ] && [ "$PUBLIC_IP" != "None" ]; then
-      break
-    fi
-    sleep 2
-  done
-fi
+# Every instance was tagged with the first name at launch; rename the rest
+for i in $(seq 1 $((${#INSTANCE_IDS[@]} - 1))); do
+  aws ec2 create-tags \
+    --resources "${INSTANCE_IDS[$i]}" \
+    --tags "Key=Name,Value=${NAMES[$i]}" >&2
+done
 
-echo "$INSTANCE_ID|$PUBLIC_IP"
+# Public IPs that are not assigned yet ("None") are resolved by the API's shared
+# instance waiter, which polls all pending creates together
+for INSTANCE_ID in "${INSTANCE_IDS[@]}"; do
+  echo "$INSTANCE_ID|${PUBLIC_IPS[$INSTANCE_ID]}|${STATES[$INSTANCE_ID]}"
+done
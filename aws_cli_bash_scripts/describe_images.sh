@@ -0,0 +1,26 @@
+#!/bin/bash
+set -euo pipefail
+
+# Free-tier eligible instance types and matching AMIs for one region, as JSON:
+# REGION OWNERS NAME_PATTERN [NAME_PATTERN ...]   (OWNERS is comma-separated)
+REGION="${1:?Region is required}"
+OWNERS="${2:?Owners are required}"
+: "${3:?At least one AMI name pattern is required}"
+shift 2
+PATTERNS=$(IFS=,; echo "$*")
+
+TYPES=$(aws ec2 describe-instance-types \
+  --region "$REGION" \
+  --filters Name=free-tier-eligible,Values=true \
+  --query 'InstanceTypes[].InstanceType' \
+  --output json)
+
+# shellcheck disable=SC2086
+IMAGES=$(aws ec2 describe-images \
+  --region "$REGION" \
+  --owners ${OWNERS//,/ } \
+  --filters "Name=name,Values=$PATTERNS" Name=state,Values=available \
+  --query 'Images[].ImageId' \
+  --output json)
+
+echo "{\"instance_types\": $TYPES, \"amis\": $IMAGES}"
@@ -0,0 +1,10 @@
+#!/bin/bash
+set -euo pipefail
+
+# Describe only the given instance IDs (one or more)
+: "${1:?Instance ID is required}"
+
+aws ec2 describe-instances \
+  --instance-ids "$@" \
+  --query 'Reservations[].Instances[].[InstanceId,State.Name,PublicIpAddress,InstanceType,ImageId,LaunchTime]' \
+  --output json
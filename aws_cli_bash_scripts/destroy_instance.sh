@@ -1,8 +1,10 @@
 #!/bin/bash
 set -euo pipefail
 
-INSTANCE_ID="${1:?Instance ID is required}"
+# Accepts one or more instance IDs; all of them go into a single AWS call
+: "${1:?Instance ID is required}"
+INSTANCE_IDS=("$@")
 
-aws ec2 terminate-instances --instance-ids "$INSTANCE_ID"
+aws ec2 terminate-instances --instance-ids "${INSTANCE_IDS[@]}"
 
-echo "Instance $INSTANCE_ID terminated"
+echo "Instance ${INSTANCE_IDS[*]} terminated"
@@ -1,6 +1,40 @@
 #!/bin/bash
 set -euo pipefail
 
-aws ec2 describe-instances \
-  --query 'Reservations[*].Instances[*].[InstanceId,State.Name,PublicIpAddress,InstanceType,ImageId,LaunchTime]' \
+# Usage: list_instances.sh [--state STATE]... [--tag KEY=VALUE]...
+#                          [--page-size N] [--starting-token TOKEN]
+#
+# Prints one page as {"Instances": [[InstanceId, State, PublicIp, InstanceType,
+# ImageId, LaunchTime], ...], "NextToken": "..."}. Pass NextToken back with
+# --starting-token to fetch the next page; it is null on the last page.
+
+STATES=()
+FILTERS=()
+PAGE_SIZE=1000
+STARTING_TOKEN=""
+
+while [ $# -gt 0 ]; do
+  case "$1" in
+    --state) STATES+=("${2:?--state requires a value}"); shift 2 ;;
+    --tag) FILTERS+=("Name=tag:${2%%=*},Values=${2#*=}"); shift 2 ;;
+    --page-size) PAGE_SIZE="${2:?--page-size requires a value}"; shift 2 ;;
+    --starting-token) STARTING_TOKEN="${2:?--starting-token requires a value}"; shift 2 ;;
+    *) echo "Unknown option: $1" >&2; exit 1 ;;
+  esac
+done
+
+if [ ${#STATES[@]} -gt 0 ]; then
+  FILTERS+=("Name=instance-state-name,Values=$(IFS=,; echo "${STATES[*]}")")
+fi
+
+ARGS=(--max-items "$PAGE_SIZE" --page-size "$PAGE_SIZE")
+if [ ${#FILTERS[@]} -gt 0 ]; then
+  ARGS+=(--filters "${FILTERS[@]}")
+fi
+if [ -n "$STARTING_TOKEN" ]; then
+  ARGS+=(--starting-token "$STARTING_TOKEN")
+fi
+
+aws ec2 describe-instances "${ARGS[@]}" \
+  --query '{Instances: Reservations[].Instances[].[InstanceId,State.Name,PublicIpAddress,InstanceType,ImageId,LaunchTime], NextToken: NextToken}' \
   --output json
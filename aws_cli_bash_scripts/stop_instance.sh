@@ -1,9 +1,11 @@
 #!/bin/bash
 set -euo pipefail
 
-INSTANCE_ID="${1:?Instance ID is required}"
+# Accepts one or more instance IDs; all of them go into a single AWS call
+: "${1:?Instance ID is required}"
+INSTANCE_IDS=("$@")
 
-aws ec2 stop-instances --instance-ids "$INSTANCE_ID"
-aws ec2 wait instance-stopped --instance-ids "$INSTANCE_ID"
+aws ec2 stop-instances --instance-ids "${INSTANCE_IDS[@]}"
+# The API waits for "stopped" with its shared instance waiter, batched across requests
 
-echo "Instance $INSTANCE_ID stopped"
+echo "Instance ${INSTANCE_IDS[*]} stopped"
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Offline load and latency benchmark for the API.
+
+Drives app.main:app in-process through an ASGI client, with a stub `aws`
+executable (fixed latency per call) first on PATH and a throwaway SQLite
+file, so no server, AWS account or network is needed. For each endpoint and
+concurrency level it reports throughput and p50/p95/p99 latency, and writes
+everything to a JSON file that later runs can be compared against.
+
+Run with:
+    python benchmarks/bench_api.py [--concurrency 1,8,32] [--requests 500]
+        [--subprocess-requests 64] [--aws-latency 0.05]
+        [--output bench_api.json] [--baseline old.json]
+
+The stub is a Python script, so each aws call also pays its interpreter
+start-up on top of --aws-latency; subprocess endpoints are further bounded
+by AWS_CLI_MAX_CONCURRENCY.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sqlite3
+import stat
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ENDPOINTS = ["health", "list", "get", "create", "start", "stop", "destroy"]
+
+FREE_TIER = {"ami": "ami-026992d753d5622bc", "instance_type": "t3.micro"}
+
+# Answers just the aws ec2 calls the bash scripts and the instance waiter make, after
+# AWS_STUB_LATENCY seconds; start/stop-instances move instances straight to their final state
+STUB_AWS = '''#!{python}
+import json, os, random, sys, time
+time.sleep(float(os.environ.get("AWS_STUB_LATENCY", "0")))
+args = sys.argv[1:]
+ids = args[args.index("--instance-ids") + 1:] if "--instance-ids" in args else []
+ids = ids[:next((i for i, arg in enumerate(ids) if arg.startswith("--")), len(ids))]
+state_dir = os.environ["AWS_STUB_STATE_DIR"]
+if "run-instances" in args:
+    count = int(args[args.index("--count") + 1]) if "--count" in args else 1
+    for _ in range(count):
+        print(f"i-{{random.randrange(16 ** 17):017x}}\\t10.0.{{random.randrange(256)}}.{{random.randrange(256)}}\\tpending")
+elif "start-instances" in args or "stop-instances" in args:
+    for instance_id in ids:
+        with open(os.path.join(state_dir, instance_id), "w") as f:
+            f.write("running" if "start-instances" in args else "stopped")
+    print("{{}}")
+elif "describe-instances" in args:
+    def state(instance_id):
+        try:
+            with open(os.path.join(state_dir, instance_id)) as f:
+                return f.read()
+        except OSError:
+            return "running"
+    print(json.dumps([[i, state(i), "10.0.0.1", "t3.micro", "ami-x", "2026"] for i in ids]))
+elif "create-tags" not in args:
+    print("{{}}")
+'''
+
+
+def install_stub_aws(directory: str, latency: float):
+    path = os.path.join(directory, "aws")
+    with open(path, "w") as f:
+        f.write(STUB_AWS.format(python=sys.executable))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    os.environ["PATH"] = directory + os.pathsep + os.environ["PATH"]
+    os.environ["AWS_STUB_LATENCY"] = str(latency)
+    os.environ["AWS_STUB_STATE_DIR"] = os.path.join(directory, "state")
+    os.makedirs(os.environ["AWS_STUB_STATE_DIR"])
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def seed_ids(db, count: int, state: str) -> List[str]:
+    ids = [f"i-{random.randrange(16 ** 17):017x}" for _ in range(count)]
+    db.create_instance_records([
+        {"id": instance_id, "name": f"bench-{instance_id}", "state": state, "backend_used": "awscli", **FREE_TIER}
+        for instance_id in ids
+    ])
+    return ids
+
+
+def make_request(endpoint: str, db, count: int) -> Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]]:
+    """Build the request for one endpoint; mutating endpoints get their own fresh instances."""
+    if endpoint == "health":
+        return lambda client, i: client.get("/health")
+    if endpoint == "list":
+        return lambda client, i: client.get("/instances", params={"limit": 100})
+    if endpoint == "get":
+        ids = seed_ids(db, min(count, 1000), "running")
+        return lambda client, i: client.get(f"/instances/{ids[i % len(ids)]}")
+    if endpoint == "create":
+        payload = {"name": "bench", "storage_gb": 8, **FREE_TIER}
+        return lambda client, i: client.post("/instances", json=payload)
+    if endpoint in ("start", "stop"):
+        ids = seed_ids(db, count, "stopped" if endpoint == "start" else "running")
+        return lambda client, i: client.post(f"/instances/{ids[i]}/{endpoint}")
+    if endpoint == "destroy":
+        ids = seed_ids(db, count, "running")
+        return lambda client, i: client.delete(f"/instances/{ids[i]}")
+    raise ValueError(f"Unknown endpoint: {endpoint}")
+
+
+async def run_level(client: httpx.AsyncClient, request: Callable, requests: int, concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    first_error = None
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index, errors, first_error
+        while next_index < requests:
+            i = next_index
+            next_index += 1
+            start = time.perf_counter()
+            response = await request(client, i)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+                first_error = first_error or f"{response.status_code} {response.text[:200]}"
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(requests / elapsed, 1),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "first_error": first_error,
+    }
+
+
+async def run(endpoints: List[str], levels: List[int], requests: int, subprocess_requests: int) -> List[Dict[str, Any]]:
+    from app.main import app
+    from app.services.db import db
+
+    results = []
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            seed_ids(db, 1000, "running")
+            for endpoint in endpoints:
+                count = subprocess_requests if endpoint in ("create", "start", "stop", "destroy") else requests
+                for concurrency in levels:
+                    request = make_request(endpoint, db, count)
+                    if endpoint in ("health", "list", "get"):
+                        await request(client, 0)  # warm up
+                    result = {"endpoint": endpoint, "concurrency": concurrency,
+                              **await run_level(client, request, count, concurrency)}
+                    results.append(result)
+                    print(
+                        f"{endpoint:<9}{concurrency:>6}{result['requests']:>8}{result['errors']:>7}"
+                        f"{result['throughput_rps']:>10,.1f}{result['p50_ms']:>10.2f}"
+                        f"{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+                    )
+    return results
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str):
+    """Print throughput and p95 changes against an earlier results file."""
+    with open(baseline_path) as f:
+        baseline = {(r["endpoint"], r["concurrency"]): r for r in json.load(f)["results"]}
+
+    print(f"\nvs {baseline_path}")
+    print(f"{'endpoint':<9}{'conc':>6}{'rps':>12}{'p95':>12}")
+    for result in results:
+        old = baseline.get((result["endpoint"], result["concurrency"]))
+        if not old:
+            continue
+        rps = (result["throughput_rps"] / old["throughput_rps"] - 1) * 100 if old["throughput_rps"] else 0.0
+        p95 = (result["p95_ms"] / old["p95_ms"] - 1) * 100 if old["p95_ms"] else 0.0
+        print(f"{result['endpoint']:<9}{result['concurrency']:>6}{rps:>+11.1f}%{p95:>+11.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=500, help="requests per level for health/list/get")
+    parser.add_argument("--subprocess-requests", type=int, default=64,
+                        help="requests per level for create/start/stop/destroy, which run the stub aws")
+    parser.add_argument("--aws-latency", type=float, default=0.05, help="seconds per stub aws call")
+    parser.add_argument("--output", default="bench_api.json")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    endpoints = [e for e in args.endpoints.split(",") if e]
+    levels = [int(c) for c in args.concurrency.split(",") if c]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    # Configure the app before importing it: stub aws, throwaway database, no background sweeps or email.
+    # The awscli backend finds its scripts relative to the repository root.
+    args.output = os.path.abspath(args.output)
+    args.baseline = args.baseline and os.path.abspath(args.baseline)
+    os.chdir(ROOT)
+    tmp = tempfile.mkdtemp(prefix="bench_api_")
+    install_stub_aws(tmp, args.aws_latency)
+    os.environ["DATABASE_URL"] = os.path.join(tmp, "bench.db")
+    os.environ["RECONCILE_INTERVAL_SECONDS"] = "0"
+    os.environ["NOTIFICATION_EMAIL"] = ""
+    # The stub reaches the target state at once, so poll as soon as the command returns
+    os.environ["WAITER_INITIAL_INTERVAL"] = "0.01"
+    # Measure the API, not the EC2 call budgets a real account needs
+    for action in ("DESCRIBE", "RUN", "START", "STOP", "TERMINATE"):
+        os.environ[f"EC2_{action}_RATE"] = "0"
+
+    import logging
+    logging.disable(logging.WARNING)
+
+    print(f"{'endpoint':<9}{'conc':>6}{'reqs':>8}{'errs':>7}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    results = asyncio.run(run(endpoints, levels, args.requests, args.subprocess_requests))
+
+    report = {
+        "meta": {
+            "date": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "aws_latency_s": args.aws_latency,
+            "requests": args.requests,
+            "subprocess_requests": args.subprocess_requests,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {args.output}")
+
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for the SQLite Database service.
+
+Compares the previous connect-per-call access pattern (default journal, no
+pooling) with the pooled, WAL-mode Database, without and with the
+write-through record cache, single-threaded and with several threads
+mixing reads and writes.
+
+Run with:
+    python benchmarks/bench_db.py [--rows 2000] [--threads 8]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.db import Database  # noqa: E402
+
+
+class ConnectPerCallDatabase(Database):
+    """The access pattern Database used before pooling: a fresh connection per call."""
+
+    def _ensure_db_exists(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS instances (
+                id TEXT PRIMARY KEY, name TEXT NOT NULL, public_ip TEXT, ami TEXT,
+                instance_type TEXT, state TEXT, ssh_string TEXT, security_group_id TEXT,
+                backend_used TEXT, created_at TIMESTAMP, updated_at TIMESTAMP
+            )
+        """)
+        conn.commit()
+        conn.close()
+
+    def _connection(self):
+        db = self
+
+        class _Conn:
+            def __enter__(self):
+                self.conn = sqlite3.connect(db.db_path)
+                self.conn.row_factory = sqlite3.Row
+                return self.conn
+
+            def __exit__(self, *exc):
+                self.conn.close()
+
+        return _Conn()
+
+
+def run_single(db: Database, rows: int):
+    start = time.perf_counter()
+    for i in range(rows):
+        db.create_instance_record({"id": f"i-{i:08x}", "name": f"bench-{i}", "state": "pending"})
+    for i in range(rows):
+        db.update_instance_state(f"i-{i:08x}", "running")
+    writes = 2 * rows / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(5):
+        for i in range(rows):
+            db.get_instance(f"i-{i:08x}")
+    reads = 5 * rows / (time.perf_counter() - start)
+    return reads, writes
+
+
+def run_concurrent(db: Database, rows: int, threads: int):
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + 3
+
+    def worker(n: int):
+        reads = writes = errors = 0
+        i = 0
+        while time.perf_counter() < deadline:
+            instance_id = f"i-{(n * 7919 + i) % rows:08x}"
+            try:
+                if i % 5 == 0:
+                    db.update_instance_state(instance_id, "stopped" if i % 2 else "running")
+                    writes += 1
+                else:
+                    db.get_instance(instance_id)
+                    reads += 1
+            except sqlite3.OperationalError:
+                errors += 1
+            i += 1
+        with lock:
+            counts["reads"] += reads
+            counts["writes"] += writes
+            counts["errors"] += errors
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return counts["reads"] / elapsed, counts["writes"] / elapsed, counts["errors"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"SQLite {sqlite3.sqlite_version}, {args.rows} rows, {args.threads} threads, {datetime.utcnow().isoformat()}")
+    print(f"{'variant':<18}{'reads/s':>12}{'writes/s':>12}{'mt reads/s':>14}{'mt writes/s':>14}{'locked':>8}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        variants = [
+            ("connect-per-call", ConnectPerCallDatabase, 0),
+            ("pooled+WAL", Database, 0),
+            ("+record cache", Database, args.rows),
+        ]
+        for label, cls, record_cache_size in variants:
+            db = cls(os.path.join(tmp, f"{label}.db"), record_cache_size=record_cache_size)
+            reads, writes = run_single(db, args.rows)
+            mt_reads, mt_writes, errors = run_concurrent(db, args.rows, args.threads)
+            print(f"{label:<18}{reads:>12,.0f}{writes:>12,.0f}{mt_reads:>14,.0f}{mt_writes:>14,.0f}{errors:>8}")
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Per-request CPU time for GET /instances with a large page.
+
+Compares the previous response path (rows copied into dicts, rebuilt as
+InstanceResponse objects, validated again against response_model and
+encoded with jsonable_encoder + json) with the current one (plain row tuples ->
+instance_payload -> FastJSONResponse). Also times the NDJSON export of the
+whole table. Requests go through the ASGI app in-process, so the numbers
+include routing and query time but no network.
+
+Run with:
+    python benchmarks/bench_serialization.py [--rows 10000] [--requests 20]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_legacy_app():
+    """The list handler as it was before the fast path: dict rows, model objects, response_model."""
+    from fastapi import FastAPI
+    from app.models.instance import InstanceListResponse, InstanceResponse
+    from app.services.db import db
+
+    legacy_app = FastAPI()
+
+    @legacy_app.get("/instances", response_model=InstanceListResponse)
+    async def list_instances(limit: int = 100):
+        instances = db.list_instances(limit=limit)
+        return InstanceListResponse(
+            instances=[
+                InstanceResponse(
+                    id=inst["id"],
+                    name=inst["name"],
+                    public_ip=inst["public_ip"],
+                    ssh_string=inst["ssh_string"],
+                    state=inst["state"],
+                    ami=inst["ami"],
+                    instance_type=inst["instance_type"],
+                    backend_used=inst["backend_used"],
+                    created_at=inst["created_at"],
+                )
+                for inst in instances
+            ],
+        )
+
+    return legacy_app
+
+
+def seed(db, rows: int):
+    db.create_instance_records([
+        {
+            "id": f"i-{i:017x}",
+            "name": f"bench-{i}",
+            "public_ip": f"54.0.{i // 256 % 256}.{i % 256}",
+            "ssh_string": f"ssh -i ~/.ssh/your-key.pem ec2-user@54.0.{i // 256 % 256}.{i % 256}",
+            "state": "running",
+            "ami": "ami-026992d753d5622bc",
+            "instance_type": "t3.micro",
+            "backend_used": "awscli",
+        }
+        for i in range(rows)
+    ])
+
+
+async def measure(target, path: str, headers: dict, requests: int):
+    """Return (CPU ms per request, wall ms per request, response bytes)."""
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=target), base_url="http://bench") as client:
+        response = await client.get(path, headers=headers)  # warm up
+        response.raise_for_status()
+        size = len(response.content)
+
+        cpu = time.process_time()
+        wall = time.perf_counter()
+        for _ in range(requests):
+            await client.get(path, headers=headers)
+        cpu = (time.process_time() - cpu) * 1000 / requests
+        wall = (time.perf_counter() - wall) * 1000 / requests
+    return cpu, wall, size
+
+
+async def run(rows: int, requests: int):
+    from app.main import app
+    from app.responses import orjson
+
+    print(f"{rows} rows, {requests} requests per variant, encoder: {'orjson' if orjson else 'json'}")
+    print(f"{'variant':<28}{'cpu ms/req':>12}{'wall ms/req':>13}{'bytes':>12}")
+    variants = [
+        ("legacy response_model", make_legacy_app(), f"/instances?limit={rows}", {}),
+        ("fast path", app, f"/instances?limit={rows}", {}),
+        ("ndjson export", app, "/instances", {"Accept": "application/x-ndjson"}),
+    ]
+    for label, target, path, headers in variants:
+        cpu, wall, size = await measure(target, path, headers, requests)
+        print(f"{label:<28}{cpu:>12.1f}{wall:>13.1f}{size:>12,}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    # Configure the app before importing it: a throwaway database and a page size covering the table
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = os.path.join(tmp, "bench.db")
+    os.environ["LIST_MAX_LIMIT"] = str(max(args.rows, 1000))
+
+    from app.services.db import db
+
+    seed(db, args.rows)
+    asyncio.run(run(args.rows, args.requests))
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -26,6 +26,45 @@ def test_health():
     assert response.status_code == 200, f"Expected 200, got {response.status_code}"
     assert response.json() == {"status": "ok"}, "Unexpected response format"
 
+def test_cache_stats():
+    """Test record cache statistics endpoint"""
+    print("Testing GET /health/cache...")
+    response = requests.get(f"{BASE_URL}/health/cache")
+    print(f"Status: {response.status_code}")
+    print(f"Response: {json.dumps(response.json(), indent=2)}")
+    assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+    assert {"hits", "misses", "size"} <= set(response.json()["records"]), "Expected hit/miss counters"
+
+def test_catalog_stats():
+    """Test free-tier catalog endpoint"""
+    print("\nTesting GET /health/catalog...")
+    response = requests.get(f"{BASE_URL}/health/catalog")
+    print(f"Status: {response.status_code}")
+    print(f"Response: {json.dumps(response.json(), indent=2)}")
+    assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+    assert "t3.micro" in response.json()["regions"]["us-east-1"]["instance_types"], "Expected t3.micro in us-east-1"
+
+def test_backend_breakers():
+    """Test circuit breaker status endpoint"""
+    print("\nTesting GET /health/backends...")
+    response = requests.get(f"{BASE_URL}/health/backends")
+    print(f"Status: {response.status_code}")
+    print(f"Response: {json.dumps(response.json(), indent=2)}")
+    assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+    assert "breakers" in response.json(), "Expected breakers in response"
+
+def test_metrics():
+    """Test Prometheus metrics endpoint"""
+    print("Testing GET /metrics...")
+    requests.get(f"{BASE_URL}/health")
+    response = requests.get(f"{BASE_URL}/metrics")
+    print(f"Status: {response.status_code}")
+    assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+    assert response.headers["content-type"].startswith("text/plain"), "Expected Prometheus text format"
+    assert 'http_request_duration_seconds_count{method="GET",route="/health",status="200"}' in response.text, \
+        "Expected /health latency to be recorded"
+    assert "# TYPE ec2_rate_limiter gauge" in response.text, "Expected EC2 call budget metrics"
+
 def test_list_instances():
     """Test list instances endpoint"""
     print("\nTesting GET /instances...")
@@ -35,6 +74,33 @@ def test_list_instances():
     assert response.status_code == 200, f"Expected 200, got {response.status_code}"
     assert "instances" in response.json(), "Expected 'instances' key in response"
 
+def test_list_instances_paginated():
+    """Test list instances with a page size and filters"""
+    print("\nTesting GET /instances?limit=1&state=running...")
+    response = requests.get(f"{BASE_URL}/instances", params={"limit": 1, "state": "running"})
+    print(f"Status: {response.status_code}")
+    print(f"Response: {json.dumps(response.json(), indent=2)}")
+    assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+    assert len(response.json()["instances"]) <= 1, "Expected at most one instance per page"
+    assert "next_cursor" in response.json(), "Expected 'next_cursor' key in response"
+
+def test_list_instances_invalid_cursor():
+    """Test list instances with a malformed cursor"""
+    print("\nTesting GET /instances?cursor=garbage...")
+    response = requests.get(f"{BASE_URL}/instances", params={"cursor": "garbage"})
+    print(f"Status: {response.status_code}")
+    assert response.status_code == 400, f"Expected 400 for malformed cursor, got {response.status_code}"
+
+def test_list_instances_ndjson_export():
+    """Test streaming export of instances as NDJSON"""
+    print("\nTesting GET /instances with Accept: application/x-ndjson...")
+    response = requests.get(f"{BASE_URL}/instances", headers={"Accept": "application/x-ndjson"})
+    print(f"Status: {response.status_code}")
+    assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+    assert response.headers["content-type"].startswith("application/x-ndjson"), "Expected NDJSON content type"
+    for line in response.text.splitlines():
+        assert "id" in json.loads(line), "Expected one instance object per line"
+
 def test_create_instance_invalid():
     """Test create instance with invalid data (should fail free tier check)"""
     print("\nTesting POST /instances with invalid instance type...")
@@ -63,6 +129,125 @@ def test_create_instance_invalid_ami():
     print(f"Response: {json.dumps(response.json(), indent=2)}")
     assert response.status_code == 400, f"Expected 400 for invalid AMI, got {response.status_code}"
 
+def test_create_instance_unknown_backend():
+    """Test create instance with an unknown backend (should be rejected before any AWS call)"""
+    print("\nTesting POST /instances?backend=bogus...")
+    payload = {
+        "name": "test-instance",
+        "ami": "ami-026992d753d5622bc",
+        "instance_type": "t3.micro",
+        "storage_gb": 8
+    }
+    response = requests.post(f"{BASE_URL}/instances", params={"backend": "bogus"}, json=payload)
+    print(f"Status: {response.status_code}")
+    print(f"Response: {json.dumps(response.json(), indent=2)}")
+    assert response.status_code == 400, f"Expected 400 for unknown backend, got {response.status_code}"
+    assert "ec2api" in response.json()["detail"], "Expected available backends in error detail"
+
+def test_create_instance_unknown_region():
+    """Test create instance in a region that is not configured (should be rejected before any AWS call)"""
+    print("\nTesting POST /instances with an unknown region...")
+    payload = {
+        "name": "test-instance",
+        "ami": "ami-026992d753d5622bc",
+        "instance_type": "t3.micro",
+        "storage_gb": 8,
+        "region": "xx-nowhere-1"
+    }
+    response = requests.post(f"{BASE_URL}/instances", json=payload)
+    print(f"Status: {response.status_code}")
+    print(f"Response: {json.dumps(response.json(), indent=2)}")
+    assert response.status_code == 400, f"Expected 400 for unknown region, got {response.status_code}"
+    assert "xx-nowhere-1" in response.json()["detail"], "Expected the region in error detail"
+
+def test_create_instance_idempotency_key_rejected_request():
+    """Test that a rejected create is not stored under its Idempotency-Key"""
+    print("\nTesting POST /instances with Idempotency-Key and an invalid AMI...")
+    payload = {
+        "name": "test-instance",
+        "ami": "ami-invalid",
+        "instance_type": "t3.micro",
+        "storage_gb": 8
+    }
+    headers = {"Idempotency-Key": "test-rejected-request"}
+    for _ in range(2):
+        response = requests.post(f"{BASE_URL}/instances", json=payload, headers=headers)
+        print(f"Status: {response.status_code}")
+        assert response.status_code == 400, f"Expected 400 for invalid AMI, got {response.status_code}"
+        assert "Idempotent-Replayed" not in response.headers, "Rejected request should not be replayed"
+
+def test_batch_stop_unknown_instances():
+    """Test batch stop with unknown IDs (each should be reported as failed, no AWS call)"""
+    print("\nTesting POST /instances/batch/stop with unknown IDs...")
+    payload = {"instance_ids": ["i-doesnotexist1", "i-doesnotexist2"]}
+    response = requests.post(f"{BASE_URL}/instances/batch/stop", json=payload)
+    print(f"Status: {response.status_code}")
+    print(f"Response: {json.dumps(response.json(), indent=2)}")
+    assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+    results = response.json()["results"]
+    assert [r["id"] for r in results] == payload["instance_ids"], "Expected one result per ID, in order"
+    assert not any(r["success"] for r in results), "Expected every unknown instance to fail"
+
+def test_bulk_create_invalid():
+    """Test bulk create with invalid instance type (free tier check runs once for the batch)"""
+    print("\nTesting POST /instances/bulk with invalid instance type...")
+    payload = {
+        "name_template": "cohort-{index}",
+        "count": 3,
+        "ami": "ami-026992d753d5622bc",
+        "instance_type": "t2.large",  # Not free tier
+        "storage_gb": 8
+    }
+    response = requests.post(f"{BASE_URL}/instances/bulk", json=payload)
+    print(f"Status: {response.status_code}")
+    print(f"Response: {json.dumps(response.json(), indent=2)}")
+    assert response.status_code == 400, f"Expected 400 for invalid instance type, got {response.status_code}"
+
+def test_watch_instances():
+    """Test the instance change stream opens as Server-Sent Events"""
+    print("\nTesting GET /instances/watch...")
+    with requests.get(f"{BASE_URL}/instances/watch", params={"after": 0}, stream=True, timeout=5) as response:
+        print(f"Status: {response.status_code}")
+        assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+        assert response.headers["content-type"].startswith("text/event-stream"), "Expected an event stream"
+        first_line = next(response.iter_lines(decode_unicode=True))
+        assert first_line.startswith("retry:"), f"Expected a retry hint first, got {first_line!r}"
+
+def test_list_instances_not_modified():
+    """Test conditional GET /instances answers 304 while nothing has changed"""
+    print("\nTesting GET /instances with If-None-Match...")
+    response = requests.get(f"{BASE_URL}/instances")
+    etag = response.headers.get("etag")
+    assert etag, "Expected an ETag on the instance list"
+    response = requests.get(f"{BASE_URL}/instances", headers={"If-None-Match": etag})
+    print(f"Status: {response.status_code}")
+    assert response.status_code == 304, f"Expected 304 for an unchanged list, got {response.status_code}"
+    assert response.headers.get("etag") == etag, "Expected the same ETag on the 304"
+
+def test_get_unknown_instance_with_current_etag():
+    """Test a current ETag replayed against an unknown instance ID still gets 404, not 304"""
+    print("\nTesting GET /instances/{instance_id} with If-None-Match and an unknown ID...")
+    etag = requests.get(f"{BASE_URL}/instances").headers.get("etag")
+    response = requests.get(f"{BASE_URL}/instances/i-doesnotexist", headers={"If-None-Match": etag})
+    print(f"Status: {response.status_code}")
+    assert response.status_code == 404, f"Expected 404 for an unknown instance, got {response.status_code}"
+
+def test_profile_request_ignored_by_default():
+    """Test X-Profile does nothing unless PROFILE_REQUESTS is enabled on the server"""
+    print("\nTesting GET /health with X-Profile...")
+    response = requests.get(f"{BASE_URL}/health", headers={"X-Profile": "1"})
+    print(f"Status: {response.status_code}")
+    assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+    assert "x-profile-file" not in response.headers, "Expected no profile with PROFILE_REQUESTS off"
+
+def test_get_unknown_job():
+    """Test job lookup for an unknown job ID"""
+    print("\nTesting GET /jobs/{job_id} with unknown ID...")
+    response = requests.get(f"{BASE_URL}/jobs/doesnotexist")
+    print(f"Status: {response.status_code}")
+    print(f"Response: {json.dumps(response.json(), indent=2)}")
+    assert response.status_code == 404, f"Expected 404 for unknown job, got {response.status_code}"
+
 def test_swagger_docs():
     """Test Swagger/OpenAPI docs"""
     print("\nTesting GET /docs (Swagger UI)...")
@@ -0,0 +1,177 @@
+"""
+Unit tests for the backend circuit breakers in app/services/breaker.py (no server or AWS needed).
+"""
+import asyncio
+import time
+import pytest
+from app.config import settings
+from app.services import aws_cli as aws_cli_module
+from app.services.aws_cli import AwsCliBackend
+from app.services.breaker import (
+    CLOSED, HALF_OPEN, OPEN, AwsError, BreakerOpenError, CircuitBreakers, parse_cli_error_code,
+)
+from app.services.throttle import ThrottledError
+
+REGION = "us-east-1"
+
+
+@pytest.fixture(autouse=True)
+def breaker_settings(monkeypatch):
+    monkeypatch.setattr(settings, "BREAKER_FAILURE_THRESHOLD", 2)
+    monkeypatch.setattr(settings, "BREAKER_RESET_SECONDS", 0.05)
+    monkeypatch.setattr(settings, "BREAKER_HALF_OPEN_TRIALS", 1)
+    monkeypatch.setattr(settings, "BREAKER_HUNG_CALL_SECONDS", 0.05)
+
+
+async def _succeed():
+    return "ok"
+
+
+async def _fail():
+    raise RuntimeError("Could not connect to the endpoint URL")
+
+
+def _call(breakers: CircuitBreakers, operation):
+    """Run one call through the breaker, returning its result or the exception it raised."""
+    try:
+        return asyncio.run(breakers.call("awscli", REGION, operation))
+    except Exception as e:
+        return e
+
+
+def _trip(breakers: CircuitBreakers):
+    for _ in range(settings.BREAKER_FAILURE_THRESHOLD):
+        _call(breakers, _fail)
+
+
+def test_breaker_opens_after_consecutive_failures():
+    """Test the breaker opens at the threshold and then rejects calls without running them"""
+    breakers = CircuitBreakers()
+    _call(breakers, _fail)
+    assert breakers.get("awscli", REGION).state == CLOSED
+    _call(breakers, _fail)
+    assert breakers.get("awscli", REGION).state == OPEN
+
+    ran = []
+
+    async def operation():
+        ran.append(1)
+
+    error = _call(breakers, operation)
+    assert isinstance(error, BreakerOpenError)
+    assert error.retry_after > 0
+    assert not ran, "Expected an open breaker to reject the call without running it"
+    assert ("awscli", REGION) in breakers.stale_keys()
+
+
+def test_breaker_half_open_success_closes():
+    """Test a successful probe after the reset period closes the breaker"""
+    breakers = CircuitBreakers()
+    _trip(breakers)
+    time.sleep(settings.BREAKER_RESET_SECONDS)
+
+    breaker = breakers.get("awscli", REGION)
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(BreakerOpenError):
+        breaker.before_call()
+    breaker.record_success()
+
+    assert breaker.state == CLOSED
+    assert _call(breakers, _succeed) == "ok"
+    assert not breakers.stale_keys()
+
+
+def test_breaker_failed_trial_reopens():
+    """Test a failed probe opens the breaker again for another reset period"""
+    breakers = CircuitBreakers()
+    _trip(breakers)
+    time.sleep(settings.BREAKER_RESET_SECONDS)
+
+    _call(breakers, _fail)
+    breaker = breakers.get("awscli", REGION)
+    assert breaker.state == OPEN
+    assert isinstance(_call(breakers, _succeed), BreakerOpenError)
+
+
+def test_client_errors_do_not_count():
+    """Test errors about the request itself, recognised by EC2 error code, leave the breaker closed"""
+    breakers = CircuitBreakers()
+
+    async def not_found():
+        raise AwsError("Script failed: ...", code="InvalidInstanceID.NotFound")
+
+    async def unavailable():
+        # The code decides, not text that happens to look like a client error
+        raise AwsError("Script failed: InvalidInstanceID mentioned in passing", code="Unavailable")
+
+    for _ in range(5):
+        _call(breakers, not_found)
+    assert breakers.get("awscli", REGION).state == CLOSED
+
+    breakers = CircuitBreakers()
+    for _ in range(settings.BREAKER_FAILURE_THRESHOLD):
+        _call(breakers, unavailable)
+    assert breakers.get("awscli", REGION).state == OPEN
+
+
+def test_parse_cli_error_code():
+    """Test the EC2 error code is read from aws CLI stderr"""
+    stderr = "An error occurred (IncorrectInstanceState) when calling the StartInstances operation: nope"
+    assert parse_cli_error_code(stderr) == "IncorrectInstanceState"
+    assert parse_cli_error_code("Could not connect to the endpoint URL") is None
+
+
+def test_throttled_and_quick_cancelled_calls_are_neutral():
+    """Test throttling and a client giving up early say nothing about backend health"""
+    breakers = CircuitBreakers()
+
+    async def throttled():
+        raise ThrottledError("budget exhausted", retry_after=1)
+
+    async def cancelled_quickly():
+        task = asyncio.create_task(breakers.call("awscli", REGION, lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    for _ in range(3):
+        _call(breakers, throttled)
+        asyncio.run(cancelled_quickly())
+    assert breakers.get("awscli", REGION).failures == 0
+
+
+def test_hung_calls_cancelled_by_clients_count_as_failures():
+    """Test calls cancelled after BREAKER_HUNG_CALL_SECONDS trip the breaker"""
+    breakers = CircuitBreakers()
+
+    async def hang_then_disconnect():
+        task = asyncio.create_task(breakers.call("awscli", REGION, lambda: asyncio.sleep(10)))
+        await asyncio.sleep(settings.BREAKER_HUNG_CALL_SECONDS + 0.02)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    for _ in range(settings.BREAKER_FAILURE_THRESHOLD):
+        asyncio.run(hang_then_disconnect())
+    breaker = breakers.get("awscli", REGION)
+    assert breaker.state == OPEN
+    assert "hanging" in breaker.last_error
+
+
+def test_catalog_failures_leave_instance_breaker_closed(monkeypatch):
+    """Test describe-images failures open the catalog breaker, not the one instance calls use"""
+    backend = AwsCliBackend()
+    breakers = CircuitBreakers()
+
+    async def unauthorized(script_name, *args):
+        raise AwsError("Script failed: ...", code="UnauthorizedOperation")
+
+    monkeypatch.setattr(aws_cli_module, "circuit_breakers", breakers)
+    monkeypatch.setattr(backend, "_exec_script", unauthorized)
+    for _ in range(settings.BREAKER_FAILURE_THRESHOLD):
+        with pytest.raises(AwsError):
+            asyncio.run(backend.describe_free_tier(REGION, "amazon", ["al2023-ami-*"]))
+
+    assert breakers.get("awscli-catalog", REGION).state == OPEN
+    assert breakers.get("awscli", REGION).state == CLOSED
+    assert ("awscli", REGION) not in breakers.stale_keys()
@@ -0,0 +1,58 @@
+"""
+Unit tests for the TTL/LRU cache in app/services/cache.py (no server or AWS needed).
+"""
+import asyncio
+from app.services.cache import MISSING, TTLCache
+
+
+def test_concurrent_loads_share_one_call():
+    """Test concurrent lookups of one key run the loader once and later ones hit the cache"""
+    cache = TTLCache(maxsize=10, ttl=60)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"id": "i-1", "state": "running"}
+
+    async def run():
+        results = await asyncio.gather(*(cache.get_or_load("i-1", loader) for _ in range(5)))
+        results.append(await cache.get_or_load("i-1", loader))
+        return results
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(result == {"id": "i-1", "state": "running"} for result in results)
+
+
+def test_invalidation_during_load_is_not_cached():
+    """Test a load that an invalidation raced with is returned but not stored"""
+    cache = TTLCache(maxsize=10, ttl=60)
+
+    async def run():
+        async def loader():
+            await asyncio.sleep(0.01)
+            return "stale"
+
+        task = asyncio.ensure_future(cache.get_or_load("i-1", loader))
+        await asyncio.sleep(0)
+        cache.invalidate("i-1")
+        return await task
+
+    assert asyncio.run(run()) == "stale"
+    assert cache.peek("i-1") is MISSING
+
+
+def test_lru_eviction_and_expiry():
+    """Test the least recently used entry is evicted when full and expired entries miss"""
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1
+
+    expiring = TTLCache(maxsize=2, ttl=0)
+    expiring.set("a", 1)
+    assert expiring.get("a") is MISSING
@@ -0,0 +1,211 @@
+"""
+Unit tests for the in-process EC2 API backend in app/services/ec2_api.py.
+
+Requests go to a local EC2 stand-in served through httpx.MockTransport, which checks
+each request's SigV4 signature and answers in the EC2 Query API's XML (no server or AWS needed).
+"""
+import asyncio
+import hashlib
+import hmac
+import re
+from typing import Dict, List
+from urllib.parse import parse_qsl
+import httpx
+import pytest
+from app.config import settings
+from app.services import ec2_api as ec2_api_module
+from app.services.breaker import CLOSED, OPEN, AwsError, CircuitBreakers
+from app.services.ec2_api import Ec2ApiBackend
+
+ENDPOINT = "http://ec2.local:4566"
+REGION = "us-east-1"
+NAMESPACE = "http://ec2.amazonaws.com/doc/2016-11-15/"
+
+_AUTHORIZATION = re.compile(
+    r"AWS4-HMAC-SHA256 Credential=(?P<key>[^/]+)/(?P<date>\d{8})/(?P<region>[^/]+)/ec2/aws4_request, "
+    r"SignedHeaders=(?P<signed>[^,]+), Signature=(?P<signature>[0-9a-f]{64})"
+)
+
+
+@pytest.fixture(autouse=True)
+def ec2_settings(monkeypatch):
+    monkeypatch.setattr(settings, "AWS_ACCESS_KEY_ID", "AKIDEXAMPLE")
+    monkeypatch.setattr(settings, "AWS_SECRET_ACCESS_KEY", "wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY")
+    monkeypatch.setattr(settings, "AWS_SESSION_TOKEN", "")
+    monkeypatch.setattr(settings, "BREAKER_FAILURE_THRESHOLD", 2)
+    monkeypatch.setattr(ec2_api_module, "circuit_breakers", CircuitBreakers())
+
+
+def _signature_matches(request: httpx.Request, secret: str) -> bool:
+    """Recompute the SigV4 signature from the request as the stand-in received it."""
+    match = _AUTHORIZATION.fullmatch(request.headers.get("authorization", ""))
+    if match is None or match["key"] != "AKIDEXAMPLE":
+        return False
+    signed = match["signed"].split(";")
+    canonical_request = "\n".join([
+        request.method,
+        request.url.path or "/",
+        request.url.query.decode(),
+        "".join(f"{name}:{request.headers[name].strip()}\n" for name in signed),
+        match["signed"],
+        hashlib.sha256(request.content).hexdigest(),
+    ])
+    scope = f"{match['date']}/{match['region']}/ec2/aws4_request"
+    string_to_sign = "\n".join([
+        "AWS4-HMAC-SHA256",
+        request.headers["x-amz-date"],
+        scope,
+        hashlib.sha256(canonical_request.encode()).hexdigest(),
+    ])
+    key = f"AWS4{secret}".encode()
+    for part in (match["date"], match["region"], "ec2", "aws4_request"):
+        key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+    expected = hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+    return "host" in signed and hmac.compare_digest(expected, match["signature"])
+
+
+def _item(instance_id: str, state: str, public_ip: str = "") -> str:
+    ip = f"<ipAddress>{public_ip}</ipAddress>" if public_ip else ""
+    return (
+        f"<item><instanceId>{instance_id}</instanceId><imageId>ami-123</imageId>"
+        f"<instanceState><code>16</code><name>{state}</name></instanceState>"
+        f"<instanceType>t3.micro</instanceType><launchTime>2026-01-01T00:00:00.000Z</launchTime>{ip}</item>"
+    )
+
+
+def _response(action: str, body: str, status_code: int = 200) -> httpx.Response:
+    return httpx.Response(
+        status_code, text=f'<{action}Response xmlns="{NAMESPACE}"><requestId>r-1</requestId>{body}</{action}Response>',
+    )
+
+
+def _error(status_code: int, code: str, message: str) -> httpx.Response:
+    return httpx.Response(
+        status_code,
+        text=f"<Response><Errors><Error><Code>{code}</Code><Message>{message}</Message></Error></Errors>"
+             f"<RequestID>r-1</RequestID></Response>",
+    )
+
+
+class FakeEC2Endpoint:
+    """A small EC2 stand-in: verifies signatures, records calls and answers a few actions."""
+
+    def __init__(self, secret: str = None):
+        self.secret = secret or settings.AWS_SECRET_ACCESS_KEY
+        self.calls: List[Dict[str, str]] = []
+        self.errors: Dict[str, httpx.Response] = {}
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        if not _signature_matches(request, self.secret):
+            return _error(403, "SignatureDoesNotMatch", "The request signature we calculated does not match")
+        params = dict(parse_qsl(request.content.decode()))
+        self.calls.append(params)
+        action = params["Action"]
+        if action in self.errors:
+            return self.errors[action]
+        if action == "DescribeInstances" and "InstanceId.1" in params:
+            ids = [value for key, value in sorted(params.items()) if key.startswith("InstanceId.")]
+            items = "".join(_item(instance_id, "running", "54.1.2.3") for instance_id in ids)
+            return _response(
+                action, f"<reservationSet><item><instancesSet>{items}</instancesSet></item></reservationSet>",
+            )
+        if action == "DescribeInstances":
+            # Two pages of one instance each
+            if "NextToken" in params:
+                page, token = _item("i-2", "stopped"), ""
+            else:
+                page, token = _item("i-1", "running", "54.1.2.3"), "<nextToken>page-2</nextToken>"
+            return _response(
+                action, f"<reservationSet><item><instancesSet>{page}</instancesSet></item></reservationSet>{token}",
+            )
+        if action == "RunInstances":
+            count = int(params["MinCount"])
+            items = "".join(_item(f"i-new{n}", "pending", f"54.0.0.{n}") for n in range(count))
+            return _response(action, f"<instancesSet>{items}</instancesSet>")
+        return _response(action, "<return>true</return>")
+
+
+def _run(endpoint: FakeEC2Endpoint, call):
+    """Run call(backend) against the stand-in endpoint."""
+    async def run():
+        backend = Ec2ApiBackend(endpoint_url=ENDPOINT)
+        backend._client = httpx.AsyncClient(transport=httpx.MockTransport(endpoint.handle))
+        try:
+            return await call(backend)
+        finally:
+            await backend.close()
+
+    return asyncio.run(run())
+
+
+def test_requests_carry_a_valid_sigv4_signature(monkeypatch):
+    """Test the stand-in accepts the backend's signature, and rejects it once the secret differs"""
+    endpoint = FakeEC2Endpoint()
+    instances = _run(endpoint, lambda backend: backend.describe_instances(["i-1"], region=REGION))
+    assert instances[0]["id"] == "i-1"
+    assert endpoint.calls[0]["Version"] == "2016-11-15"
+
+    monkeypatch.setattr(settings, "AWS_SECRET_ACCESS_KEY", "not-the-secret")
+    with pytest.raises(AwsError) as excinfo:
+        _run(endpoint, lambda backend: backend.describe_instances(["i-1"], region=REGION))
+    assert excinfo.value.code == "SignatureDoesNotMatch"
+
+
+def test_describe_pages_and_filters_are_parsed():
+    """Test paged DescribeInstances follows nextToken, sends filters and parses namespaced XML"""
+    endpoint = FakeEC2Endpoint()
+    instances = _run(endpoint, lambda backend: backend.list_instances(
+        states=["running", "stopped"], tags={"team": "infra"}, region=REGION,
+    ))
+
+    assert [instance["id"] for instance in instances] == ["i-1", "i-2"]
+    assert instances[0] == {
+        "id": "i-1", "state": "running", "public_ip": "54.1.2.3", "instance_type": "t3.micro",
+        "ami": "ami-123", "launch_time": "2026-01-01T00:00:00.000Z",
+    }
+    assert instances[1]["public_ip"] == ""
+    first, second = endpoint.calls
+    assert first["Filter.1.Name"] == "instance-state-name"
+    assert (first["Filter.1.Value.1"], first["Filter.1.Value.2"]) == ("running", "stopped")
+    assert (first["Filter.2.Name"], first["Filter.2.Value.1"]) == ("tag:team", "infra")
+    assert "NextToken" not in first and second["NextToken"] == "page-2"
+
+
+def test_run_instances_sends_one_call_and_renames_the_rest():
+    """Test a bulk create is one RunInstances with the client token, then CreateTags for later names"""
+    endpoint = FakeEC2Endpoint()
+    instances = _run(endpoint, lambda backend: backend.create_many(
+        ["web-1", "web-2"], "ami-123", "t3.micro", 8, region=REGION, client_token="token-1",
+    ))
+
+    assert [(instance["id"], instance["name"], instance["public_ip"]) for instance in instances] == [
+        ("i-new0", "web-1", "54.0.0.0"), ("i-new1", "web-2", "54.0.0.1"),
+    ]
+    run, tags = endpoint.calls
+    assert run["Action"] == "RunInstances"
+    assert (run["MinCount"], run["MaxCount"], run["ClientToken"]) == ("2", "2", "token-1")
+    assert run["TagSpecification.1.Tag.1.Value"] == "web-1"
+    assert (tags["Action"], tags["ResourceId.1"], tags["Tag.1.Value"]) == ("CreateTags", "i-new1", "web-2")
+
+
+def test_error_responses_map_to_codes_and_breaker_outcomes():
+    """Test EC2 error codes reach AwsError, client errors leave the breaker closed and outages open it"""
+    endpoint = FakeEC2Endpoint()
+    breakers = ec2_api_module.circuit_breakers
+
+    endpoint.errors["TerminateInstances"] = _error(400, "InvalidInstanceID.NotFound", "The instance ID does not exist")
+    for _ in range(3):
+        with pytest.raises(AwsError) as excinfo:
+            _run(endpoint, lambda backend: backend.destroy_many(["i-gone"], region=REGION))
+        assert excinfo.value.code == "InvalidInstanceID.NotFound"
+    assert breakers.get("ec2api", REGION).state == CLOSED
+
+    endpoint.errors["TerminateInstances"] = httpx.Response(502, text="<html>Bad Gateway</html")
+    with pytest.raises(RuntimeError, match="unparseable response \\(HTTP 502\\)"):
+        _run(endpoint, lambda backend: backend.destroy_many(["i-1"], region=REGION))
+
+    endpoint.errors["TerminateInstances"] = _error(503, "Unavailable", "The service is unavailable")
+    with pytest.raises(AwsError) as excinfo:
+        _run(endpoint, lambda backend: backend.destroy_many(["i-1"], region=REGION))
+    assert excinfo.value.code == "Unavailable"
+    assert breakers.get("ec2api", REGION).state == OPEN
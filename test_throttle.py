@@ -0,0 +1,105 @@
+"""
+Unit tests for the EC2 call budgets in app/services/throttle.py (no server or AWS needed).
+"""
+import asyncio
+import pytest
+from app.config import settings
+from app.services.breaker import AwsError
+from app.services.throttle import AwsScheduler, ThrottledError, TokenBucket
+
+
+def test_bucket_reservations_wait_in_arrival_order():
+    """Test each reservation waits one refill interval longer than the one before it"""
+    bucket = TokenBucket(rate=10, burst=1)
+    waits = [bucket.reserve(max_wait=10) for _ in range(4)]
+    assert waits[0] == 0
+    assert waits == sorted(waits), f"Expected increasing waits, got {waits}"
+    assert waits[3] == pytest.approx(0.3, abs=0.02)
+
+
+def test_scheduler_serves_calls_fifo(monkeypatch):
+    """Test queued calls run in the order they asked for a token"""
+    monkeypatch.setattr(settings, "EC2_THROTTLE_MAX_WAIT", 10)
+    scheduler = AwsScheduler({"stop": (50, 1)})
+    order = []
+
+    async def run():
+        async def call(n):
+            async def operation():
+                order.append(n)
+            await scheduler.call("stop", "us-east-1", operation)
+
+        await asyncio.gather(*(call(n) for n in range(6)))
+
+    asyncio.run(run())
+    assert order == list(range(6))
+
+
+def test_scheduler_rejects_when_wait_exceeds_max(monkeypatch):
+    """Test a call that would wait longer than EC2_THROTTLE_MAX_WAIT fails with ThrottledError"""
+    monkeypatch.setattr(settings, "EC2_THROTTLE_MAX_WAIT", 0.05)
+    scheduler = AwsScheduler({"run": (1, 1)})
+
+    async def run():
+        await scheduler.acquire("run", "us-east-1")
+        with pytest.raises(ThrottledError) as excinfo:
+            await scheduler.acquire("run", "us-east-1")
+        return excinfo.value
+
+    error = asyncio.run(run())
+    assert error.retry_after == pytest.approx(1, abs=0.05)
+    assert scheduler.stats()[("run", "us-east-1", "rejected")] == 1
+
+
+def test_cancelled_reservation_is_refunded(monkeypatch):
+    """Test cancelling a caller waiting for a token gives the token back"""
+    monkeypatch.setattr(settings, "EC2_THROTTLE_MAX_WAIT", 10)
+    scheduler = AwsScheduler({"start": (1, 1)})
+
+    async def run():
+        await scheduler.acquire("start", "us-east-1")
+        waiter = asyncio.create_task(scheduler.acquire("start", "us-east-1"))
+        await asyncio.sleep(0.01)
+        bucket = scheduler._bucket("start", "us-east-1")
+        bucket._refill()
+        assert bucket.tokens < -0.9, "Expected the waiting caller to hold a reserved token"
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        bucket._refill()
+        return bucket.tokens
+
+    tokens = asyncio.run(run())
+    assert tokens > -0.1, f"Expected the reserved token back, bucket holds {tokens}"
+
+
+def test_throttled_calls_are_retried(monkeypatch):
+    """Test a call AWS throttles is retried with backoff until it succeeds"""
+    monkeypatch.setattr(settings, "EC2_THROTTLE_BACKOFF", 0.01)
+    scheduler = AwsScheduler({})
+    attempts = []
+
+    async def operation():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise AwsError("An error occurred (RequestLimitExceeded) when calling the StopInstances operation",
+                           code="RequestLimitExceeded")
+        return "ok"
+
+    assert asyncio.run(scheduler.call("stop", "us-east-1", operation)) == "ok"
+    assert len(attempts) == 3
+    assert scheduler.stats()[("stop", "us-east-1", "throttled")] == 2
+
+
+def test_throttling_is_detected_by_error_code(monkeypatch):
+    """Test an error that only mentions a throttling code, e.g. in an echoed tag value, is not retried"""
+    monkeypatch.setattr(settings, "EC2_THROTTLE_BACKOFF", 0.01)
+    scheduler = AwsScheduler({})
+    attempts = []
+
+    async def operation():
+        attempts.append(1)
+        raise AwsError("Tag value 'Throttling test' is invalid", code="InvalidParameterValue")
+
+    with pytest.raises(AwsError):
+        asyncio.run(scheduler.call("run", "us-east-1", operation))
+    assert len(attempts) == 1
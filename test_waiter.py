@@ -0,0 +1,71 @@
+"""
+Unit tests for the shared instance waiter in app/services/waiter.py (no server or AWS needed).
+"""
+import asyncio
+from typing import Dict, List
+import pytest
+from app.config import settings
+from app.services.waiter import InstanceWaiter
+
+
+@pytest.fixture(autouse=True)
+def waiter_settings(monkeypatch):
+    monkeypatch.setattr(settings, "WAITER_INITIAL_INTERVAL", 0.01)
+    monkeypatch.setattr(settings, "WAITER_MAX_INTERVAL", 0.02)
+
+
+class FakeEC2:
+    """Describes instances from a dict of id -> (state, public_ip), recording every call."""
+
+    def __init__(self, instances: Dict[str, tuple]):
+        self.instances = instances
+        self.calls: List[List[str]] = []
+
+    async def describe(self, instance_ids: List[str]) -> List[Dict[str, str]]:
+        self.calls.append(list(instance_ids))
+        return [
+            {"id": instance_id, "state": self.instances[instance_id][0], "public_ip": self.instances[instance_id][1]}
+            for instance_id in instance_ids
+        ]
+
+
+def test_concurrent_waits_share_describe_calls():
+    """Test waits from several callers are answered by one multi-ID describe per poll"""
+    ec2 = FakeEC2({"i-1": ("stopped", ""), "i-2": ("stopped", ""), "i-3": ("running", "1.2.3.4")})
+    waiter = InstanceWaiter(ec2.describe, "test")
+
+    async def run():
+        return await asyncio.gather(
+            waiter.wait_for_state(["i-1"], "stopped", timeout=1),
+            waiter.wait_for_state(["i-2"], "stopped", timeout=1),
+            waiter.wait_for_public_ip(["i-3"], timeout=1),
+        )
+
+    first, second, third = asyncio.run(run())
+    assert first["i-1"]["state"] == "stopped"
+    assert second["i-2"]["state"] == "stopped"
+    assert third["i-3"]["public_ip"] == "1.2.3.4"
+    assert ec2.calls == [["i-1", "i-2", "i-3"]], f"Expected one merged describe, got {ec2.calls}"
+    assert waiter.polls == 1
+
+
+def test_ip_wait_returns_partial_results_on_timeout():
+    """Test an IP wait that runs out of time returns the latest description instead of raising"""
+    ec2 = FakeEC2({"i-1": ("running", "1.2.3.4"), "i-2": ("pending", "")})
+    waiter = InstanceWaiter(ec2.describe, "test")
+
+    results = asyncio.run(waiter.wait_for_public_ip(["i-1", "i-2"], timeout=0.05))
+    assert results["i-1"]["public_ip"] == "1.2.3.4"
+    assert results["i-2"] == {"id": "i-2", "state": "pending", "public_ip": ""}
+    assert waiter.stats()["waits"] == 0
+
+
+def test_state_wait_times_out_and_fails_fast():
+    """Test a state wait raises on timeout, and at once if the instance reaches a failure state"""
+    ec2 = FakeEC2({"i-1": ("pending", ""), "i-2": ("terminated", "")})
+    waiter = InstanceWaiter(ec2.describe, "test")
+
+    with pytest.raises(RuntimeError, match="Timed out waiting for i-1"):
+        asyncio.run(waiter.wait_for_state(["i-1"], "running", timeout=0.05))
+    with pytest.raises(RuntimeError, match="i-2 is terminated"):
+        asyncio.run(waiter.wait_for_state(["i-2"], "running", timeout=1))